@@ -0,0 +1,554 @@
+# coding=utf-8
+import warnings
+import numpy as np
+import pandas as pd
+from util.querystats import traced
+
+
+class Metric(object):
+    '''按时间粒度聚合的指标定义'''
+
+    HOWS = ('sum', 'mean', 'min', 'max', 'count', 'value_counts', 'bler')
+
+    def __init__(self, cols, how, filters=None, dropna=False, slot=255, ratio=False):
+        '''初始化指标
+
+            Args:
+                cols: 参与聚合的列名列表，bler为[AckInfo列, DemTime列]
+                how: 聚合方式，'sum', 'mean', 'min', 'max', 'count', 'value_counts', 'bler'
+                filters: 过滤条件，字典格式{'列名': [值, ]}
+                dropna: 是否丢弃cols及过滤列中任一列为空的行
+                slot: 仅对bler有效，255(不区分子帧), <20(特定slot)
+                ratio: 仅对value_counts有效，是否计算比例
+        '''
+        assert(how in self.HOWS)
+        self._cols = list(cols)
+        self._how = how
+        self._filters = filters or {}
+        self._dropna = dropna
+        self._slot = slot
+        self._ratio = ratio
+
+    @property
+    def cols(self):
+        return self._cols
+
+    @property
+    def how(self):
+        return self._how
+
+    @property
+    def slot(self):
+        return self._slot
+
+    @property
+    def ratio(self):
+        return self._ratio
+
+    def replace(self, filters=None, slot=None, ratio=None):
+        '''返回修改了过滤条件、slot或ratio的新指标，filters中的列覆盖原有的同名条件'''
+        return Metric(self._cols, self._how, dict(self._filters, **(filters or {})), self._dropna,
+                      self._slot if slot is None else slot, self._ratio if ratio is None else ratio)
+
+    @property
+    def usecols(self):
+        '''计算该指标需要读取的列'''
+        return list(dict.fromkeys(self._cols + list(self._filters)))
+
+    def mask(self, data):
+        '''满足过滤条件的行'''
+        mask = np.ones(len(data.index), dtype=bool)
+        if self._filters:
+            mask &= data[list(self._filters)].isin(self._filters).all(1).values
+        if self._dropna:
+            mask &= data[self.usecols].notna().all(1).values
+        return mask
+
+    def evaluate(self, data, codes, nbins):
+        '''按时间粒度编号聚合
+
+            Args:
+                data: 已过滤的数据
+                codes: 每行的时间粒度编号
+                nbins: 时间粒度个数
+            Returns:
+                DataFrame，索引为时间粒度编号0..nbins-1
+        '''
+        bins = pd.RangeIndex(nbins)
+        if self._how in ('sum', 'count'):
+            return data[self._cols].groupby(codes).agg(self._how).reindex(bins, fill_value=0)
+        if self._how in ('mean', 'min', 'max'):
+            return data[self._cols].groupby(codes).agg(self._how).reindex(bins)
+        if self._how == 'value_counts':
+            return self._value_counts(data[self._cols[0]], codes, bins)
+        return self._bler(data, codes, bins)
+
+    def _value_counts(self, values, codes, bins):
+        notna = values.notna().values
+        values, codes = values.values[notna], codes[notna]
+        if values.dtype.kind == 'f' and (values == np.round(values)).all():
+            values = values.astype(np.int64)
+        counts, categories = count_matrix(codes, values, len(bins))
+        rlt = pd.DataFrame(counts, index=bins, columns=categories)
+        if self._ratio:
+            rlt = rlt.div(rlt.sum(axis=1).replace(0, np.nan), axis=0)
+        return rlt
+
+    def _bler(self, data, codes, bins):
+        ack, demtime = data[self._cols[0]].values, data[self._cols[1]].values
+        if self._slot < 20:
+            selected = demtime.astype(int) % 256 == self._slot
+            ack, codes = ack[selected], codes[selected]
+        counts, categories = count_matrix(codes, ack.astype(int), len(bins))
+        return pd.DataFrame({'bler': bler_of_counts(pd.DataFrame(counts, index=bins, columns=categories))})
+
+
+def time_bins(times, time_bin):
+    '''计算每行所属时间粒度的编号，分组方式与resample(str(time_bin)+'S')一致
+
+        Args:
+            times: datetime64数组
+            time_bin: 时间粒度(s)
+        Returns:
+            (codes, index)，codes为每行的编号，从0开始，时间为空的行为-1；index为各编号对应的起始时间
+    '''
+    times = np.asarray(times, dtype='datetime64[ns]')
+    valid = ~np.isnat(times)
+    if not valid.any():
+        return np.full(len(times), -1, dtype=np.int64), pd.DatetimeIndex([])
+
+    bin_ns = int(round(time_bin * 1e9))
+    origin = times[valid].min().astype('datetime64[D]').astype('datetime64[ns]').astype(np.int64)
+    raw = (times.astype(np.int64) - origin) // bin_ns
+    first, last = raw[valid].min(), raw[valid].max()
+    codes = np.where(valid, raw - first, -1)
+    index = pd.date_range(pd.Timestamp(origin + first * bin_ns), periods=last - first + 1,
+                          freq=pd.Timedelta(bin_ns, unit='ns'))
+    return codes, index
+
+
+def count_matrix(codes, values, nbins):
+    '''按(时间粒度编号, 取值编号)一次bincount完成分组计数，不对每个时间粒度调用Python函数
+
+        Args:
+            codes: 每行的时间粒度编号，0..nbins-1
+            values: 每行的取值，不能为空
+            nbins: 时间粒度个数
+        Returns:
+            (counts, categories)，counts为nbins行、len(categories)列的int64矩阵，categories为升序的取值
+    '''
+    value_codes, categories = pd.factorize(values, sort=True)
+    flat = np.bincount(np.asarray(codes, dtype=np.int64) * len(categories) + value_codes,
+                       minlength=nbins * len(categories))
+    return flat.reshape(nbins, len(categories)), categories
+
+
+def count_by_time(times, values, time_bin=1):
+    '''按时间粒度统计各取值的出现次数
+
+        Args:
+            times: datetime64数组
+            values: 取值数组，空值不参与统计
+            time_bin: 时间粒度(s)
+        Returns:
+            DataFrame，行为时间粒度(与resample一致，从第一行到最后一行，没有数据的时间粒度为0)，列为升序的取值
+    '''
+    codes, index = time_bins(times, time_bin)
+    values = np.asarray(values)
+    valid = (codes >= 0) & pd.notna(values)
+    counts, categories = count_matrix(codes[valid], values[valid], len(index))
+    return pd.DataFrame(counts, index=index.rename('LocalTime'), columns=categories)
+
+
+def bler_of_counts(counts):
+    '''由AckInfo各取值的次数计算bler(%)，0和2计为错误，1为正确，没有数据的时间粒度为0
+
+        Args:
+            counts: DataFrame，列为AckInfo取值，值为次数
+        Returns:
+            Series，索引与counts一致
+    '''
+    counts = counts.reindex(columns=[0, 1, 2], fill_value=0)
+    total = counts.sum(axis=1)
+    return (counts[0] + counts[2]) * 100 / total.where(total != 0, 1)
+
+
+def sparse_counts(counts):
+    '''转换为resample后逐个时间粒度value_counts的格式：只保留有数据的时间粒度，没有出现的取值为空'''
+    return counts[counts.sum(axis=1) > 0].replace(0, np.nan)
+
+
+class Partial(object):
+    '''可合并的部分聚合结果，用于分块流式聚合
+
+       每个数据块按时间粒度分别聚合，只保留每个时间粒度的sum、count、min、max(value_counts为每个取值的次数)，
+       各块的部分结果先保存在列表中，取结果时一次合并，内存占用与时间粒度数成正比、与数据量无关；
+       结果与对全部数据resample(str(time_bin)+'S')后聚合一致。
+       时间粒度的起点取第一个数据块所在日期的零点，要求数据块按时间顺序给出。
+    '''
+
+    # 各聚合方式需要保存的部分结果，以及合并部分结果的方式
+    STATS = {'sum': ['sum'], 'count': ['count'], 'mean': ['sum', 'count'], 'min': ['min'], 'max': ['max'],
+             'value_counts': ['counts']}
+    MERGE = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max', 'counts': 'sum'}
+
+    def __init__(self, cols, how, time_bin=1):
+        '''初始化部分聚合结果
+
+            Args:
+                cols: 参与聚合的列名列表，value_counts只统计第一列
+                how: 聚合方式，'sum', 'count', 'mean', 'min', 'max', 'value_counts'
+                time_bin: 时间粒度(s)
+        '''
+        assert(how in self.STATS)
+        self._cols = list(cols)
+        self._how = how
+        self._time_bin = time_bin
+        self._bin_ns = int(round(time_bin * 1e9))
+        self._origin = None
+        # {统计量: [部分结果]}，由_reduced合并
+        self._parts = {}
+
+    def _codes(self, times):
+        '''每行所属时间粒度的编号，时间为空的行不参与聚合'''
+        times = np.asarray(times, dtype='datetime64[ns]')
+        valid = ~np.isnat(times)
+        if self._origin is None and valid.any():
+            self._origin = times[valid].min().astype('datetime64[D]').astype('datetime64[ns]').astype(np.int64)
+        return (times[valid].astype(np.int64) - (self._origin or 0)) // self._bin_ns, valid
+
+    def update(self, data):
+        '''聚合一个数据块并合并到已有结果中
+
+            Args:
+                data: DataFrame，包含LocalTime(已格式化)及cols列
+        '''
+        codes, valid = self._codes(data['LocalTime'].values)
+        if not valid.any():
+            return
+        if self._how == 'value_counts':
+            values = data[self._cols[0]].values[valid]
+            notna = pd.notna(values)
+            counts = pd.Series(codes[notna]).groupby([codes[notna], values[notna]]).size()
+            self._merge('counts', counts)
+            return
+        grouped = data[self._cols][valid].groupby(codes)
+        for stat in self.STATS[self._how]:
+            self._merge(stat, grouped.agg(stat))
+
+    def merge(self, other):
+        '''合并另一个部分聚合结果，例如另一个目录中的数据，时间粒度的起点取两者中较早的一个
+
+            两者的起点(所在日期的零点)之差需为时间粒度的整数倍，时间粒度能整除一天时总是满足
+        '''
+        assert(other._how == self._how and other._bin_ns == self._bin_ns and other._cols == self._cols)
+        if other._origin is None:
+            return
+        origin = other._origin if self._origin is None else min(self._origin, other._origin)
+        offsets = [(owner._origin - origin) if owner._origin is not None else 0 for owner in (self, other)]
+        assert(all(offset % self._bin_ns == 0 for offset in offsets)), '时间粒度不能整除两者起点之差'
+        self._parts = {name: [_shift(part, offsets[0] // self._bin_ns) for part in parts]
+                       for name, parts in self._parts.items()}
+        self._origin = origin
+        for name in list(other._parts):
+            self._merge(name, _shift(other._reduced(name), offsets[1] // self._bin_ns))
+
+    def _merge(self, name, part):
+        self._parts.setdefault(name, []).append(part)
+
+    def _reduced(self, name):
+        '''一次合并某统计量的所有部分结果，合并后只保留一份，没有结果时返回None'''
+        parts = self._parts.get(name)
+        if not parts:
+            return None
+        if len(parts) > 1:
+            levels = list(range(parts[0].index.nlevels))
+            parts[:] = [pd.concat(parts).groupby(level=levels).agg(self.MERGE[name])]
+        return parts[0]
+
+    def result(self):
+        '''汇总结果，格式与resample后聚合的结果一致'''
+        if self._how == 'value_counts':
+            return self._counts_result()
+        if not self._parts:
+            return pd.DataFrame(columns=self._cols, index=pd.DatetimeIndex([], name='LocalTime'))
+        first = self._reduced(self.STATS[self._how][0])
+        bins = pd.RangeIndex(first.index.min(), first.index.max() + 1)
+        if self._how in ('sum', 'count'):
+            rlt = first.reindex(bins, fill_value=0)
+        elif self._how == 'mean':
+            count = self._reduced('count').reindex(bins, fill_value=0)
+            rlt = self._reduced('sum').reindex(bins, fill_value=0) / count.where(count > 0)
+        else:
+            rlt = first.reindex(bins)
+        rlt.index = self._index(bins)
+        return rlt[self._cols]
+
+    def _index(self, bins):
+        start = pd.Timestamp(self._origin + bins[0] * self._bin_ns)
+        return pd.date_range(start, periods=len(bins), freq=str(self._time_bin) + 'S', name='LocalTime')
+
+    def _counts_result(self):
+        '''各时间粒度各取值的次数，格式与count_by_time一致'''
+        counts = self._reduced('counts')
+        if counts is None or not len(counts):
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='LocalTime'), dtype=np.int64)
+        rlt = counts.unstack(fill_value=0)
+        bins = pd.RangeIndex(rlt.index.min(), rlt.index.max() + 1)
+        rlt = rlt.reindex(bins, fill_value=0).astype(np.int64)
+        columns = rlt.columns.values
+        if columns.dtype.kind in 'iu' or (columns.dtype.kind == 'f' and (columns == np.round(columns)).all()):
+            rlt.columns = columns.astype(np.int64)
+        rlt.index = self._index(bins)
+        return rlt
+
+
+def _shift(part, offset):
+    '''部分结果的时间粒度编号(索引的第一级)加上offset'''
+    if offset == 0:
+        return part
+    part = part.copy()
+    if isinstance(part.index, pd.MultiIndex):
+        part.index = part.index.set_levels(part.index.levels[0] + offset, level=0)
+    else:
+        part.index = part.index + offset
+    return part
+
+
+class Incremental(object):
+    '''增量计算的指标
+
+       每次只聚合新增的数据并合并到已有结果中，计算量与新增数据量成正比；
+       sum/count/mean/min/max保存Partial，value_counts及bler保存各取值的次数
+    '''
+
+    def __init__(self, metric, time_bin=1, id_filter=None):
+        '''初始化增量指标
+
+            Args:
+                metric: Metric实例
+                time_bin: 时间粒度(s)
+                id_filter: 标识过滤条件，例如{'CellId': [1]}
+        '''
+        self._metric = metric
+        self._id_filter = id_filter or {}
+        if metric.how in ('value_counts', 'bler'):
+            self._partial = Partial(metric.cols[:1], 'value_counts', time_bin)
+        else:
+            self._partial = Partial(metric.cols, metric.how, time_bin)
+
+    @property
+    def metric(self):
+        return self._metric
+
+    @property
+    def usecols(self):
+        '''更新该指标需要读取的列'''
+        return list(dict.fromkeys(['LocalTime'] + self._metric.usecols + list(self._id_filter)))
+
+    def update(self, data):
+        '''加入新的数据
+
+            Args:
+                data: DataFrame，包含usecols中的列，LocalTime已格式化
+        '''
+        mask = self._metric.mask(data)
+        if self._id_filter:
+            mask &= data[list(self._id_filter)].isin(self._id_filter).all(1).values
+        data = data[mask]
+        if self._metric.how == 'bler':
+            data = data[data[self._metric.cols[0]].notna().values]
+            if self._metric.slot < 20:
+                data = data[data[self._metric.cols[1]].values.astype(int) % 256 == self._metric.slot]
+        self._partial.update(data)
+
+    def merge(self, other):
+        '''合并同一指标的另一个增量结果，例如另一个目录中的数据'''
+        self._partial.merge(other._partial)
+
+    def result(self):
+        '''当前结果，行为时间，列与compute中该指标的字段一致'''
+        rlt = self._partial.result()
+        if self._metric.how == 'bler':
+            return pd.DataFrame({'bler': bler_of_counts(rlt)})
+        if self._metric.how == 'value_counts' and self._metric.ratio:
+            rlt = rlt.div(rlt.sum(axis=1).replace(0, np.nan), axis=0)
+        return rlt
+
+
+def resolve(metrics, registry):
+    '''把指标名解析为(指标名, Metric)'''
+    named = []
+    for metric in metrics:
+        if isinstance(metric, tuple):
+            named.append(metric)
+        else:
+            assert(metric in registry), '不支持的指标: %s' % metric
+            named.append((metric, registry[metric]))
+    return named
+
+
+def compute(log, metrics, time_bin=1, registry=None):
+    '''读取一次数据，计算多个指标
+
+        Args:
+            log: NrFile实例
+            metrics: 列表，每项为registry中的指标名或(指标名, Metric)
+            time_bin: 时间粒度(s)
+            registry: 指标名到Metric的映射
+        Returns:
+            DataFrame，行为时间，列为(指标名, 字段)两级索引；
+            sum/count/value_counts在没有数据的时间粒度上为0，mean/min/max为空
+    '''
+    metrics = resolve(metrics, registry or {})
+    cols = list(dict.fromkeys(['LocalTime'] + [col for _, metric in metrics for col in metric.usecols]))
+    data = log.get_data_of_cols(cols, format_time=True)
+    codes, index = time_bins(data['LocalTime'].values, time_bin)
+
+    parts = []
+    for name, metric in metrics:
+        mask = metric.mask(data) & (codes >= 0)
+        part = metric.evaluate(data[mask], codes[mask], len(index))
+        part.index = index
+        part.columns = pd.MultiIndex.from_product([[name], list(part.columns)])
+        parts.append(part)
+
+    rlt = pd.concat(parts, axis=1)
+    rlt.index.name = 'LocalTime'
+    rlt.columns.names = ['metric', 'field']
+    return rlt
+
+
+def available(metrics, registry, header):
+    '''解析指标，只保留所需列均在表头中的指标，用于默认指标列表'''
+    return [(name, metric) for name, metric in resolve(metrics, registry)
+            if all(col in header for col in metric.usecols)]
+
+
+def panel(log, metrics, time_bin=1, registry=None):
+    '''读取一次数据，按(UEGID, 时间粒度)计算多个指标，用于比较同一小区中的各UE
+
+        UE与时间粒度组合编号后由Metric.evaluate一次分组完成，不需要逐个UE读取数据
+        Args:
+            log: NrFile实例，通常为小区的Log
+            metrics: 列表，每项为registry中的指标名或(指标名, Metric)
+            time_bin: 时间粒度(s)
+            registry: 指标名到Metric的映射
+        Returns:
+            (values, rows)：values为DataFrame，行为时间，列为(指标名, 字段, UEGID)三级索引，
+            UE没有数据的时间粒度与compute一致；rows为各UE在各时间粒度的行数，列为UEGID
+    '''
+    metrics = resolve(metrics, registry or {})
+    cols = list(dict.fromkeys(['LocalTime', 'UEGID'] + [col for _, metric in metrics for col in metric.usecols]))
+    data = log.get_data_of_cols(cols, format_time=True)
+    codes, index = time_bins(data['LocalTime'].values, time_bin)
+    ue_codes, uegids = pd.factorize(data['UEGID'], sort=True)
+    nbins, nues = len(index), len(uegids)
+    valid = (codes >= 0) & (ue_codes >= 0)
+    # UE在前，结果可以直接还原为(UE, 时间粒度)矩阵
+    combined = ue_codes * nbins + codes
+    index = index.rename('LocalTime')
+    counts = np.bincount(combined[valid], minlength=nues * nbins).reshape(nues, nbins).T
+    rows = pd.DataFrame(counts, index=index, columns=pd.Index(uegids, name='UEGID'))
+
+    parts = []
+    for name, metric in metrics:
+        mask = metric.mask(data) & valid
+        part = metric.evaluate(data[mask], combined[mask], nues * nbins)
+        values = part.values.reshape(nues, nbins, len(part.columns)).transpose(1, 2, 0).reshape(nbins, -1)
+        columns = pd.MultiIndex.from_product([[name], list(part.columns), list(uegids)])
+        parts.append(pd.DataFrame(values, index=index, columns=columns))
+
+    values = pd.concat(parts, axis=1)
+    values.columns.names = ['metric', 'field', 'UEGID']
+    return values, rows
+
+
+def summarize(values, rows, metrics, percentiles=(5, 50, 95)):
+    '''按UE汇总panel的结果
+
+        Args:
+            values, rows: panel的结果
+            metrics: (指标名, Metric)列表，sum、count指标另外汇总total
+            percentiles: 百分位数
+        Returns:
+            DataFrame，行为UEGID，列为(指标名, 字段, 统计量)：rows的total、bins为行数及有数据的时间粒度数；
+            各指标的mean及百分位数只统计UE有数据的时间粒度
+    '''
+    active = rows.reindex(columns=values.columns.get_level_values(2)).values > 0
+    data = np.where(active, values.values.astype(np.float64), np.nan)
+    with warnings.catch_warnings():
+        # 没有数据的UE结果为空
+        warnings.simplefilter('ignore', RuntimeWarning)
+        stats = {'total': np.nansum(data, axis=0), 'mean': np.nanmean(data, axis=0)}
+        for q in percentiles:
+            stats['p%g' % q] = np.nanpercentile(data, q, axis=0)
+    table = pd.DataFrame(stats, index=values.columns).stack(dropna=False)
+    table.index.names = ['metric', 'field', 'UEGID', 'stat']
+
+    # total只对sum、count指标有意义
+    summable = [name for name, metric in metrics if metric.how in ('sum', 'count')]
+    stat, metric = table.index.get_level_values(3), table.index.get_level_values(0)
+    table = table[(stat != 'total') | metric.isin(summable)]
+    rlt = table.unstack(['metric', 'field', 'stat'])
+    rlt = rlt.reindex(columns=table.index.droplevel(2).unique())
+
+    rlt.insert(0, ('rows', 'rows', 'bins'), (rows > 0).sum().reindex(rlt.index))
+    rlt.insert(0, ('rows', 'rows', 'total'), rows.sum().reindex(rlt.index))
+    rlt.columns.names = ['metric', 'field', 'stat']
+    return rlt
+
+
+@traced
+class MetricsMixin(object):
+    '''调度分析类的批量指标接口，子类提供METRICS以及NrFile实例self._log'''
+
+    METRICS = {}
+
+    def compute(self, metrics, time_bin=1):
+        '''读取一次Log，同时计算多个指标
+
+            Args:
+                metrics: 指标列表，元素为METRICS中的指标名，或者(指标名, Metric)自定义指标
+                time_bin：统计粒度，默认为1s
+            Returns：
+                DataFrame，行为时间，列为(指标名, 字段)两级索引
+        '''
+        return compute(self._log, metrics, time_bin, self.METRICS)
+
+
+@traced
+class UePanelMixin(object):
+    '''小区调度分析类的按UE指标接口，子类提供METRICS、UE_METRICS以及小区的NrFile实例self._log'''
+
+    # 按UE比较的默认指标，表头中没有所需列的指标跳过
+    UE_METRICS = []
+
+    def ue_panel(self, metrics=None, time_bin=1):
+        '''读取一次本小区的Log，按UE计算各时间粒度的指标，不需要逐个获取UE实例
+
+            Args:
+                metrics: 指标列表，同compute，默认为UE_METRICS
+                time_bin：统计粒度，默认为1s
+            Returns：
+                DataFrame，行为时间，列为(指标名, 字段, UEGID)三级索引
+        '''
+        if metrics is None:
+            metrics = available(self.UE_METRICS, self.METRICS, self._log.header)
+        return panel(self._log, metrics, time_bin, self.METRICS)[0]
+
+    def ue_summary(self, metrics=None, time_bin=1, percentiles=(5, 50, 95)):
+        '''读取一次本小区的Log，按UE汇总各时间粒度指标的总量及分布，用于公平性及异常UE分析
+
+            Args:
+                metrics: 指标列表，同compute，默认为UE_METRICS
+                time_bin：统计粒度，默认为1s
+                percentiles: 百分位数
+            Returns：
+                DataFrame，行为UEGID，列为(指标名, 字段, 统计量)，见summarize
+        '''
+        if metrics is None:
+            metrics = available(self.UE_METRICS, self.METRICS, self._log.header)
+        metrics = resolve(metrics, self.METRICS)
+        values, rows = panel(self._log, metrics, time_bin)
+        return summarize(values, rows, metrics, percentiles)
@@ -0,0 +1,39 @@
+# coding=utf-8
+'''NrFile.get_data_of_cols加载耗时随文件数的变化
+
+   用法: python bench/bench_load.py [每个文件行数]
+   在临时目录中生成不同数量的CSV文件，分别统计加载耗时以及平均每个文件的耗时，
+   结果合并为线性时间后每个文件的耗时应基本不随文件数变化。
+'''
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import const
+from nrlog import NrFile
+from util.gen_ttilog import generate
+
+
+def bench(rows=20000, file_counts=(10, 20, 40, 80)):
+    cols = ['LocalTime', 'UEGID', 'SCHD.u32TbSize']
+    rlt = pd.DataFrame(columns=['rows', 'seconds', 'ms_per_file'])
+    with tempfile.TemporaryDirectory() as directory:
+        names = generate(directory, cells=3, ues=64, files=max(file_counts), rows=rows,
+                         filetypes=[const.NR_FILE_DLSCHD])[const.NR_FILE_DLSCHD]
+        for num_of_files in file_counts:
+            logfile = NrFile('CMAC_dlUeTtiInfo', directory, names[:num_of_files], id_filter={'CellId': [1]})
+            logfile.get_data_of_cols(cols, format_time=True)
+            start = time.perf_counter()
+            data = logfile.get_data_of_cols(cols, format_time=True)
+            seconds = time.perf_counter() - start
+            rlt.loc[num_of_files] = [len(data.index), seconds, seconds * 1000 / num_of_files]
+    rlt['rows'] = rlt['rows'].astype(int)
+    rlt.index.name = 'num_of_files'
+    return rlt
+
+
+if __name__ == '__main__':
+    print(bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
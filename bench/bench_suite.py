@@ -0,0 +1,126 @@
+# coding=utf-8
+'''主要分析路径的性能基准
+
+   用法: python bench/bench_suite.py [规模名 ...] [--json 结果文件]
+   按不同规模生成模拟Log(util.gen_ttilog)，分别统计NrLog创建(无缓存/有缓存)、get_cell、get_ue、
+   DlSchd/UlSchd的每个指标、批量计算以及按时间范围查询的耗时、每秒处理的行数以及进程的峰值内存。
+   每个规模在单独的子进程中运行，峰值内存互不影响；峰值内存为到该步骤为止的最大值(Linux)。
+'''
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import warnings
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import const
+from util.gen_ttilog import generate
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 规模：小区数、每小区UE数、每种类型的文件数、每个文件的行数
+SCALES = {
+    'small': dict(cells=2, ues=16, files=2, rows=20000),
+    'medium': dict(cells=3, ues=32, files=4, rows=100000),
+    'large': dict(cells=4, ues=64, files=8, rows=250000),
+}
+
+
+def peak_rss():
+    '''进程的峰值内存(MB)，不支持时返回None'''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS为字节，Linux为KB
+    return rss / 1e6 if sys.platform == 'darwin' else rss / 1e3
+
+
+class Timer(object):
+    '''逐步骤记录耗时、行数、峰值内存'''
+
+    def __init__(self, scale):
+        self._scale = scale
+        self._records = []
+
+    def run(self, stage, func, rows=0):
+        start = time.perf_counter()
+        rlt = func()
+        seconds = time.perf_counter() - start
+        self._records.append({'scale': self._scale, 'stage': stage, 'seconds': seconds, 'rows': rows,
+                              'rows_per_s': rows / seconds if rows and seconds else None,
+                              'peak_rss_mb': peak_rss()})
+        return rlt
+
+    @property
+    def records(self):
+        return self._records
+
+
+def bench_scale(scale, params):
+    '''在临时目录中生成一个规模的Log并逐步骤计时，在子进程中执行'''
+    warnings.filterwarnings('ignore')
+    import matplotlib
+    matplotlib.use('Agg')
+    from nrlog import NrLog
+
+    timer = Timer(scale)
+    with tempfile.TemporaryDirectory() as directory:
+        lines = params['files'] * params['rows']
+        timer.run('generate', lambda: generate(directory, **params), lines * len(const.NR_FILE_TYPES))
+
+        timer.run('NrLog(cold)', lambda: NrLog(directory), lines * len(const.NR_FILE_TYPES))
+        log = timer.run('NrLog(cached)', lambda: NrLog(directory), lines * len(const.NR_FILE_TYPES))
+        cell = timer.run('get_cell', lambda: log.get_cell(1))
+        ids = log.get_cell_and_ue_ids()
+        uegid = ids[ids['CellId'] == 1]['UEGID'].min()
+        timer.run('get_ue', lambda: cell.get_ue(uegid))
+        timer.run('get_ue(all cells)', lambda: log.get_ue(uegid))
+
+        for name, schd in (('dl', cell.dl), ('ul', cell.ul)):
+            rows = schd.log.lines
+            for metric in schd.METRICS:
+                # 第一次读取时解析CSV并写入缓存，计时的是之后从缓存读取的耗时
+                getattr(schd, metric)()
+                timer.run('%s.%s' % (name, metric), getattr(schd, metric), rows)
+            timer.run('%s.compute(all)' % name, lambda: schd.compute(list(schd.METRICS)), rows)
+
+        times = log.get_dlschd_logfile().times
+        middle = times[0] + (times[1] - times[0]) / 2
+        interval = [str(middle), str(middle + pd.Timedelta(seconds=10))]
+        sub = timer.run('NrLog(time_interval)', lambda: NrLog(directory, time_interval=interval))
+        subcell = sub.get_cell(1)
+        timer.run('interval dl.throuput', subcell.dl.throuput, subcell.dl.log.lines)
+        timer.run('interval ul.bler_of_slot', subcell.ul.bler_of_slot, subcell.ul.log.lines)
+    return timer.records
+
+
+def run(scales, params=SCALES):
+    '''依次在子进程中运行各规模的基准
+
+        Returns:
+            DataFrame，每个规模的每个步骤一行
+    '''
+    records = []
+    context = multiprocessing.get_context('spawn')
+    for scale in scales:
+        with context.Pool(1) as pool:
+            records.extend(pool.apply(bench_scale, (scale, params[scale])))
+    return pd.DataFrame(records).set_index(['scale', 'stage'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='svinsight性能基准')
+    parser.add_argument('scales', nargs='*', default=['small', 'medium'], choices=list(SCALES))
+    parser.add_argument('--json', help='以JSON lines格式保存结果，便于比较不同版本')
+    args = parser.parse_args()
+    rlt = run(args.scales)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(rlt)
+    if args.json:
+        rlt.reset_index().to_json(args.json, orient='records', lines=True)
@@ -3,11 +3,14 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import const
+from aggregate import sparse_counts
 from dlschd import DlSchdCell
 from ue import Ue
 from ulschd import UlSchdCell
+from util.querystats import traced
 
 
+@traced
 class Cell(object):
     '''小区实例'''
 
@@ -18,20 +21,12 @@ class Cell(object):
 
             Args:
                 cellid: 小区Id
+            上下行调度分析实例在第一次访问dl、ul时创建，UEGID在第一次使用时统计
         '''
         self._cellid = cellid
         self._log = log
-
-        dl_log = log.get_dlschd_logfile(cellid=cellid)
-        if dl_log is not None:
-            self._dl = DlSchdCell(dl_log, self)
-
-        ul_log = log.get_ulschd_logfile(cellid=cellid)
-        if ul_log is not None:
-            self._ul = UlSchdCell(ul_log, self)
-
         self._ues = {}
-        self._uegids = self._get_uegids()
+        self._uegids = None
 
     @property
     def cellid(self):
@@ -43,21 +38,37 @@ class Cell(object):
 
     @property
     def dl(self):
-        return getattr(self, '_dl', None)
+        '''下行调度分析实例，没有下行Log时为None'''
+        if not hasattr(self, '_dl'):
+            dl_log = self._log.get_dlschd_logfile(cellid=self._cellid)
+            self._dl = DlSchdCell(dl_log, self) if dl_log is not None else None
+        return self._dl
 
     @property
     def ul(self):
-        return getattr(self, '_ul', None)
+        '''上行调度分析实例，没有上行Log时为None'''
+        if not hasattr(self, '_ul'):
+            ul_log = self._log.get_ulschd_logfile(cellid=self._cellid)
+            self._ul = UlSchdCell(ul_log, self) if ul_log is not None else None
+        return self._ul
 
     @property
     def ni(self):
         return getattr(self, '_ni', None)
 
+    @property
+    def uegids(self):
+        '''本小区下的所有UEGID'''
+        if self._uegids is None:
+            self._uegids = self._get_uegids()
+        return self._uegids
+
     def _get_uegids(self):
-        '''获取本小区下的所有UEGID'''
-        dluegid = self._dl.log.uegids if hasattr(self, '_dl') else set()
-        uluegid = self._ul.log.uegids if hasattr(self, '_ul') else set()
-        return set.union(dluegid, uluegid)
+        '''获取本小区下的所有UEGID，取自Log的(CellId, UEGID)组合，不需要读取本小区的数据'''
+        ids = self._log.get_cell_and_ue_ids()
+        if ids.empty:
+            return set()
+        return set(ids.loc[ids['CellId'] == self._cellid, 'UEGID'])
 
     def get_ue(self, uegid=None):
         '''获取小区实例
@@ -67,23 +78,28 @@ class Cell(object):
                 如果uegid不为None，返回对应的UE实例，否则返回Log中的所有uegid
         '''
         if uegid is None:
-            return '所有UEGID：{uegids}. 请使用get_ue(uegid)获取对应的UE实例'.format(uegids=self._uegids)
+            return '所有UEGID：{uegids}. 请使用get_ue(uegid)获取对应的UE实例'.format(uegids=self.uegids)
 
-        if uegid in self._uegids:
-            dllog = self.log.get_dlschd_logfile(self.cellid, uegid)
-            ullog = self.log.get_ulschd_logfile(self.cellid, uegid)
-            self._ues[uegid] = Ue(ullog, dllog, self, uegid)
+        if uegid in self.uegids:
+            if uegid not in self._ues:
+                dllog = self.log.get_dlschd_logfile(self.cellid, uegid)
+                ullog = self.log.get_ulschd_logfile(self.cellid, uegid)
+                self._ues[uegid] = Ue(ullog, dllog, self, uegid)
             return self._ues[uegid]
         else:
             return '非法uegid值，此ue不存在'
 
+    def residency(self, gap=1):
+        '''本小区中UE的驻留区间表(residency.Residency)，取自Log的驻留区间表，不需要重新读取数据'''
+        return self._log.residency(gap).of_cell(self._cellid)
+
     def show_ue_livetime(self, time_bin=1):
         cols = ['LocalTime', 'UEGID']
 
         logs = []
-        if hasattr(self, '_dl'):
+        if self.dl is not None:
             logs.append(self.dl.log)
-        if hasattr(self, '_ul'):
+        if self.ul is not None:
             logs.append(self.ul.log)
 
         if 0 == len(logs):
@@ -91,19 +107,18 @@ class Cell(object):
 
         rlt = pd.DataFrame()
         for log in logs:
-            data = log.get_data_of_cols(cols,format_time=True)
-            data = data[data[cols[1]] <= 1600]
-            rlt = pd.concat([rlt, data])
-        
-        rlt = rlt.set_index(cols[0])
-        rlt = rlt.resample(str(time_bin)+'S').apply(lambda x: x.value_counts()).unstack()
+            counts = log.count_of_values(cols[1], time_bin=time_bin)
+            rlt = rlt.add(counts.loc[:, counts.columns <= 1600], fill_value=0)
+
+        rlt = sparse_counts(rlt.fillna(0))
+        rlt.columns.name = cols[1]
         rlt.plot()
         return rlt
 
     def describle(self):
         '''小区整体信息描述'''
         rlt = pd.Series(name='小区整体信息描述')
-        rlt['TotUeNum'] = len(self._uegids)
-        rlt['dlschd_log_lines'] = self._dl.log.lines if hasattr(self, '_dl') else 0
-        rlt['ulschd_log_lines'] = self._ul.log.lines if hasattr(self, '_ul') else 0
+        rlt['TotUeNum'] = len(self.uegids)
+        rlt['dlschd_log_lines'] = self.dl.log.lines if self.dl is not None else 0
+        rlt['ulschd_log_lines'] = self.ul.log.lines if self.ul is not None else 0
         return rlt.astype(np.uint32)
@@ -3,10 +3,32 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import const
+from aggregate import Metric, MetricsMixin, UePanelMixin, bler_of_counts, count_by_time, sparse_counts
+from util.querystats import traced
 
-class DlSchd():
+@traced
+class DlSchd(MetricsMixin):
     '''下行调度分析类'''
 
+    # 可批量计算的指标，与同名方法的统计口径一致
+    METRICS = {
+        'throuput': Metric(['SCHD.u32TbSize'], 'sum'),
+        'schd_rbnum': Metric(['SCHD.u16RbNum'], 'sum'),
+        'schd_ue_cnt': Metric(['SCHD.u8HarqId'], 'count'),
+        'dtx_cnt': Metric(['ACK.u8AckInfo'], 'count', filters={'ACK.u8AckInfo': [2]}),
+        'harqfail_cnt': Metric(['ACK.u8IsHarqFail'], 'count', filters={'ACK.u8IsHarqFail': [1]}),
+        'selfmaintain_cnt': Metric(['ACK.u8IsSelfMainTain'], 'count', filters={'ACK.u8IsSelfMainTain': [1]}),
+        'bler_of_slot': Metric(['ACK.u8AckInfo', 'ACK.u32DemTime'], 'bler', dropna=True),
+        'mimo_layers': Metric(['SCHD.u8Layers'], 'value_counts', dropna=True, ratio=True),
+        'amc': Metric(['AMC.s16InnerSinr', 'AMC.s16DeltaSinr', 'AMC.u8SchdMcs'], 'mean',
+                      filters={'SCHD.u8Layers': [1]}, dropna=True),
+        'rpt_csi': Metric(['CSI.u8RptRI', 'CSI.u8RptWideCqi'], 'count', filters={'CSI.u8RptRI': [1]}, dropna=True),
+        'schdfail_reasons': Metric(['SCHD_FAIL_RSN.u32UeSchdFailRsn'], 'value_counts'),
+    }
+
+    # 方法参数对应的指标过滤列，联合Log计算指标时把参数转换为过滤条件
+    METRIC_FILTERS = {'ri': 'CSI.u8RptRI', 'layer': 'SCHD.u8Layers'}
+
     def __init__(self, log, cell, uegid=None):
         self._type = const.NR_FILE_DLSCHD
         self._log = log
@@ -14,7 +36,7 @@ class DlSchd():
         self._cell = cell
         if cell:
             self._id_filter['CellId'] = [cell.cellid]
-        if uegid:
+        if uegid is not None:
             self._id_filter['UEGID'] = [uegid]
 
     @property
@@ -37,17 +59,13 @@ class DlSchd():
         
         cols = ['LocalTime', 'ACK.u8AckInfo', 'ACK.u32DemTime']
         rlt = self._log.get_data_of_cols(cols, format_time=True).dropna(how='any')
-        rlt = rlt.set_index(cols[0]).astype(int)
-        rlt = rlt[rlt[cols[2]]%256 == slot] if slot < 20 else rlt
-        rlt = rlt[cols[1]]
+        times, ack = rlt[cols[0]].values, rlt[cols[1]].values.astype(int)
+        if slot < 20:
+            selected = rlt[cols[2]].values.astype(int) % 256 == slot
+            times, ack = times[selected], ack[selected]
+        rlt = bler_of_counts(count_by_time(times, ack, time_bin))
         rlt.name = 'bler_of_slot'
-
-        def bler(data):
-            vc = data.value_counts().reindex([0,1,2],fill_value=0)
-            total = vc[0] + vc[1] + vc[2]
-            return (vc[0] + vc[2]) * 100 / total if total != 0 else (vc[0] + vc[2]) * 100 / (total + 1)
-
-        return rlt.resample(str(time_bin)+'S').apply(bler)
+        return rlt
 
     def mimo_layers(self, time_bin=1, ratio=True):
         '''MIMO自适应layer统计
@@ -58,13 +76,11 @@ class DlSchd():
                 趋势图：x轴为时间粒度，y轴为各传输方案比例
         '''
 
-        cols = ['LocalTime','SCHD.u8Layers']
-        rlt = self._log.get_data_of_cols(cols, format_time=True).dropna(how='any')
-        rlt = rlt.set_index(cols[0]).astype(int)
-        rlt = rlt[cols[1]]
-        rlt = rlt.resample(str(time_bin)+'S').apply(lambda x: x.value_counts()).unstack()
+        col_name = 'SCHD.u8Layers'
+        rlt = sparse_counts(self._log.count_of_values(col_name, time_bin=time_bin))
+        rlt.columns = rlt.columns.astype(int)
         if ratio:
-            rlt = rlt.apply(lambda x: x/x.sum(), axis=1)
+            rlt = rlt.div(rlt.sum(axis=1), axis=0)
         rlt.index.name = 'mimo_layers'
         return rlt
 
@@ -190,9 +206,13 @@ class DlSchd():
 
         
     
-class DlSchdCell(DlSchd):
+@traced
+class DlSchdCell(DlSchd, UePanelMixin):
     '''下行调度分析类'''
 
+    UE_METRICS = ['throuput', 'schd_rbnum', ('schd_mcs', Metric(['AMC.u8SchdMcs'], 'mean')), 'bler_of_slot',
+                  ('rlc_bsr', Metric(['LCH_SCHD.u32RlcRptBsr'], 'mean'))]
+
     def __init__(self, log, cell):
         super(DlSchdCell, self).__init__(log, cell)
 
@@ -209,6 +229,7 @@ class DlSchdCell(DlSchd):
             rlt.plot.scatter(x=cols[2], y=col,figsize=(15,5))
         return rlt
 
+@traced
 class DlSchdUe(DlSchd):
     '''下行调度UE分析类'''
 
@@ -0,0 +1,362 @@
+# coding=utf-8
+import functools
+import glob
+import inspect
+import os
+import pandas as pd
+import const
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from aggregate import resolve
+from dlschd import DlSchdCell, DlSchdUe
+from nrlog import METRICS, NrLog
+from ulschd import UlSchdCell, UlSchdUe
+
+# 各类型调度Log在小区、UE级别的分析类，用于解析指标方法的参数以及单目录方法
+SCHDS = {const.NR_FILE_DLSCHD: (DlSchdCell, DlSchdUe), const.NR_FILE_ULSCHD: (UlSchdCell, UlSchdUe)}
+
+# 各目录的NrLog实例，进程池中的每个进程各自保存，池在MultiLog的生命周期内保持，同一目录不重复创建
+_logs = {}
+
+
+def _expand(directories):
+    '''目录列表或glob模式展开为按名称排序的目录列表'''
+    if isinstance(directories, str):
+        directories = [directories]
+    rlt = []
+    for pattern in directories:
+        matched = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+        rlt.extend(name for name in matched if os.path.isdir(name))
+    return sorted(set(rlt))
+
+
+def _key(directory, options):
+    return directory, repr(sorted(options.items()))
+
+
+def _log_of(directory, options):
+    '''本进程中目录的NrLog实例，第一次使用时创建'''
+    key = _key(directory, options)
+    if key not in _logs:
+        _logs[key] = NrLog(directory, **options)
+    return _logs[key]
+
+
+def _index_directory(directory, options):
+    '''扫描单个目录：转换EI文件、生成清单，返回(CellId, UEGID)组合及文件概况'''
+    log = _log_of(directory, options)
+    return log.get_cell_and_ue_ids(), log.describle()
+
+
+def _refresh_directory(directory, options, min_age):
+    '''加入目录中新增的文件，返回(CellId, UEGID)组合及文件概况'''
+    _log_of(directory, options).refresh(min_age)
+    return _index_directory(directory, options)
+
+
+def _partials_of_directory(directory, options, metrics, filetype, time_bin, cellid, uegid):
+    '''计算单个目录中多个指标的可合并结果'''
+    return _log_of(directory, options).partials(metrics, filetype, time_bin, cellid, uegid)
+
+
+class MultiLog(object):
+    ''' 多个Log目录的联合分析接口类，例如连续多天的抓包
+
+        各目录在子进程中并行扫描，指标在各目录中分别计算可合并的部分结果后再合并，
+        不需要把原始数据合并到一起；获取小区、UE以及指标的接口与NrLog一致。
+        进程池及各目录的NrLog实例在close之前一直保持，可以用with语句自动关闭
+    '''
+
+    def __init__(self, directories, time_interval=None, cache=True, executor='process', max_workers=None,
+                 **options):
+        '''初始化联合Log实例
+
+           Args:
+               directories: 目录列表，或glob模式，例如'EI_Log/log-2021-*'
+               time_interval: 时间范围[start, end],格式为yyyy/mm/dd/ hh:mm:ss，对每个目录生效
+               cache: 是否使用列式缓存，使用时各目录的扫描结果保存在目录中，计算指标时不再重复扫描
+               executor: 目录的处理方式，'process'进程池，'thread'线程池
+               max_workers: 同时处理的最大目录数，默认为CPU核数
+               options: 创建各目录NrLog实例的其他参数，例如chunksize、compact
+        '''
+        assert(executor in ('thread', 'process'))
+        self._directories = _expand(directories)
+        assert(self._directories), '没有找到Log目录: %s' % (directories,)
+        self._options = dict(options, time_interval=time_interval, cache=cache)
+        self._executor = executor
+        self._max_workers = max_workers or os.cpu_count()
+        self._pool = None
+        self._cells = {}
+        self._ues = {}
+        self._index(self._map(_index_directory, self._directories, [self._options] * len(self._directories)))
+
+    def _index(self, indexed):
+        self._ids = dict(zip(self._directories, [ids for ids, _ in indexed]))
+        self._descs = dict(zip(self._directories, [desc for _, desc in indexed]))
+        ids = [ids for ids in self._ids.values() if not ids.empty]
+        self._cell_and_ue_ids = pd.concat(ids).sort_index().drop_duplicates() if ids else pd.DataFrame()
+        self._cellids = set(self._cell_and_ue_ids['CellId']) if ids else set()
+
+    def _map(self, func, *iterables):
+        '''用进程池或线程池按目录并行执行func，结果顺序与输入一致，池在第一次使用时创建'''
+        if self._pool is None:
+            pool_class = ProcessPoolExecutor if self._executor == 'process' else ThreadPoolExecutor
+            self._pool = pool_class(max_workers=self._max_workers)
+        return list(self._pool.map(func, *iterables))
+
+    def close(self):
+        '''关闭进程池，释放各目录的NrLog实例'''
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for directory in self._directories:
+            _logs.pop(_key(directory, self._options), None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def refresh(self, min_age=2):
+        '''各目录加入新增的文件，同NrLog.refresh，之后的指标包含新文件的数据'''
+        n = len(self._directories)
+        self._index(self._map(_refresh_directory, self._directories, [self._options] * n, [min_age] * n))
+        self._cells = {}
+        self._ues = {}
+
+    @property
+    def directories(self):
+        return self._directories
+
+    def log(self, directory):
+        '''单个目录的NrLog实例，用于查看原始数据；使用线程池时与计算指标的实例相同'''
+        assert(directory in self._directories), '不在联合Log中的目录: %s' % directory
+        return _log_of(directory, self._options)
+
+    def describle(self, by_directory=False):
+        '''所有目录的Log文件总体描述，格式与NrLog.describle一致
+
+            Args:
+                by_directory: 为True时按(目录, 文件类型)分别列出
+        '''
+        if by_directory:
+            return pd.concat(self._descs, names=['directory'])
+        descs = [desc for desc in self._descs.values() if not desc.empty]
+        if not descs:
+            return pd.DataFrame()
+        data = pd.concat(descs)
+        rlt = data.groupby(level=0, sort=False).agg({'size': 'sum', 'num_of_files': 'sum', 'num_of_lines': 'sum',
+                                                     'starttime': 'min', 'endtime': 'max'})
+        rlt.index.name = 'filename'
+        return rlt
+
+    def get_cell_and_ue_ids(self):
+        '''所有目录中的CellId,UeId'''
+        return self._cell_and_ue_ids
+
+    def get_cell(self, cellid):
+        '''获取联合小区实例
+            Args：
+                cellid：小区id
+            Returns:
+                对应的小区实例
+        '''
+        if cellid not in self._cellids:
+            return '非法CellId值，此小区不存在'
+        if cellid not in self._cells:
+            self._cells[cellid] = MultiCell(self, cellid)
+        return self._cells[cellid]
+
+    def get_ue(self, uegid, cellid=None):
+        '''获取联合UE实例
+            Args：
+                uegid：uegid
+                cellid: 小区id，None表示所有小区
+            Returns:
+                对应的UE实例
+        '''
+        ids = self._cell_and_ue_ids
+        if ids.empty or not ((ids['UEGID'] == uegid) &
+                             ((ids['CellId'] == cellid) if cellid is not None else True)).any():
+            return '非法cellid, uegId值，此小区或ue不存在'
+        if (cellid, uegid) not in self._ues:
+            self._ues[(cellid, uegid)] = MultiUe(self, uegid, cellid)
+        return self._ues[(cellid, uegid)]
+
+    def partials(self, metrics, filetype=const.NR_FILE_DLSCHD, time_bin=1, cellid=None, uegid=None):
+        '''各目录并行计算指标的可合并结果后合并，参数同NrLog.partials
+
+            Returns:
+                {指标名: Incremental}
+        '''
+        named = resolve(metrics, METRICS.get(filetype, {}))
+        n = len(self._directories)
+        parts = self._map(_partials_of_directory, self._directories, [self._options] * n, [named] * n,
+                          [filetype] * n, [time_bin] * n, [cellid] * n, [uegid] * n)
+        rlt = parts[0]
+        for part in parts[1:]:
+            for name, incremental in part.items():
+                rlt[name].merge(incremental)
+        return rlt
+
+    def compute(self, metrics, filetype=const.NR_FILE_DLSCHD, time_bin=1, cellid=None, uegid=None):
+        '''计算合并后时间线上的多个指标
+
+            Returns:
+                DataFrame，行为时间，列为(指标名, 字段)两级索引
+        '''
+        partials = self.partials(metrics, filetype, time_bin, cellid, uegid)
+        rlt = pd.concat({name: incremental.result() for name, incremental in partials.items()}, axis=1)
+        rlt.columns.names = ['metric', 'field']
+        if len(rlt.index):
+            # 与NrLog中compute一致：时间连续，sum/count/bler/value_counts在没有数据的时间粒度上为0
+            rlt = rlt.reindex(pd.date_range(rlt.index[0], rlt.index[-1], freq=str(time_bin)+'S', name='LocalTime'))
+            for name, incremental in partials.items():
+                metric = incremental.metric
+                if metric.how in ('sum', 'count', 'bler') or (metric.how == 'value_counts' and not metric.ratio):
+                    rlt[name] = rlt[name].fillna(0)
+        return rlt
+
+
+class MultiSchd(object):
+    '''联合Log中某类调度Log的分析
+
+       METRICS中的每个指标均可作为方法调用，参数与单个Log中的同名方法一致，例如dl.throuput(time_bin=10)、
+       dl.bler_of_slot(slot=3)、ul.rpt_maxbsr(lchgrp=3)，各目录分别计算后合并；
+       其他方法(例如find_harqfail)在每个目录中分别调用，返回{目录: 结果}
+    '''
+
+    def __init__(self, multilog, filetype, cellid=None, uegid=None):
+        self._multilog = multilog
+        self._type = filetype
+        self._cellid = cellid
+        self._uegid = uegid
+        # 单个Log中对应的分析类
+        self._class = SCHDS[filetype][0 if uegid is None else 1]
+
+    @property
+    def type(self):
+        return self._type
+
+    def compute(self, metrics, time_bin=1):
+        '''同时计算多个指标，各目录只读取一次
+
+            Args:
+                metrics: 指标列表，元素为METRICS中的指标名，或者(指标名, Metric)自定义指标
+                time_bin：统计粒度，默认为1s
+            Returns：
+                DataFrame，行为时间，列为(指标名, 字段)两级索引
+        '''
+        return self._multilog.compute(metrics, self._type, time_bin, self._cellid, self._uegid)
+
+    def _metric_of(self, name, args, kwargs):
+        '''按单个Log中同名方法的参数修改指标：slot、ratio直接替换，METRIC_FILTERS中的参数替换过滤条件
+
+            Returns:
+                (Metric, time_bin)
+        '''
+        method = getattr(self._class, name, None)
+        if method is None:
+            # 没有同名方法的指标只有时间粒度参数
+            signature = inspect.Signature([inspect.Parameter('self', inspect.Parameter.POSITIONAL_ONLY)])
+        else:
+            signature = inspect.signature(method)
+        params = list(signature.parameters.values())
+        if 'time_bin' not in signature.parameters:
+            # 单个Log中不分时间粒度的方法，联合计算时同样可以指定粒度
+            params.append(inspect.Parameter('time_bin', inspect.Parameter.KEYWORD_ONLY, default=1))
+        bound = signature.replace(parameters=params).bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        options, filters = {}, {}
+        for param in params[1:]:
+            value = bound.arguments[param.name]
+            if param.name in ('slot', 'ratio'):
+                options[param.name] = value
+            elif param.name in self._class.METRIC_FILTERS:
+                filters[self._class.METRIC_FILTERS[param.name]] = [value]
+            elif param.name != 'time_bin' and value != param.default:
+                raise TypeError('%s的参数%s不支持联合计算' % (name, param.name))
+        return METRICS[self._type][name].replace(filters=filters, **options), bound.arguments['time_bin']
+
+    def metric(self, name, *args, **kwargs):
+        '''计算单个指标，参数与单个Log中的同名方法一致，结果与compute中该指标的字段一致'''
+        metric, time_bin = self._metric_of(name, args, kwargs)
+        return self._multilog.partials([(name, metric)], self._type, time_bin, self._cellid,
+                                       self._uegid)[name].result()
+
+    def per_directory(self, name, *args, **kwargs):
+        '''在每个目录中分别调用单个Log中的同名方法，没有该小区或UE的目录跳过
+
+            Returns:
+                {目录: 结果}
+        '''
+        rlt = {}
+        for directory in self._multilog.directories:
+            log = self._multilog.log(directory)
+            owner = log.get_cell(self._cellid) if self._uegid is None else log.get_ue(self._uegid, self._cellid)
+            schd = getattr(owner, 'dl' if self._type == const.NR_FILE_DLSCHD else 'ul', None)
+            if schd is not None:
+                rlt[directory] = getattr(schd, name)(*args, **kwargs)
+        return rlt
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in METRICS[self._type]:
+            return functools.partial(self.metric, name)
+        if callable(getattr(self._class, name, None)):
+            return functools.partial(self.per_directory, name)
+        raise AttributeError('%s没有方法%s' % (self._class.__name__, name))
+
+
+class MultiCell(object):
+    '''联合Log中的小区实例'''
+
+    def __init__(self, multilog, cellid):
+        self._multilog = multilog
+        self._cellid = cellid
+        self._dl = MultiSchd(multilog, const.NR_FILE_DLSCHD, cellid)
+        self._ul = MultiSchd(multilog, const.NR_FILE_ULSCHD, cellid)
+
+    @property
+    def cellid(self):
+        return self._cellid
+
+    @property
+    def dl(self):
+        return self._dl
+
+    @property
+    def ul(self):
+        return self._ul
+
+    @property
+    def uegids(self):
+        '''本小区在所有目录中的UEGID'''
+        ids = self._multilog.get_cell_and_ue_ids()
+        return set(ids.loc[ids['CellId'] == self._cellid, 'UEGID'])
+
+    def get_ue(self, uegid):
+        '''获取本小区下的联合UE实例'''
+        return self._multilog.get_ue(uegid, self._cellid)
+
+
+class MultiUe(object):
+    '''联合Log中的UE实例'''
+
+    def __init__(self, multilog, uegid, cellid=None):
+        self._uegid = uegid
+        self._dl = MultiSchd(multilog, const.NR_FILE_DLSCHD, cellid, uegid)
+        self._ul = MultiSchd(multilog, const.NR_FILE_ULSCHD, cellid, uegid)
+
+    @property
+    def uegid(self):
+        return self._uegid
+
+    @property
+    def dl(self):
+        return self._dl
+
+    @property
+    def ul(self):
+        return self._ul
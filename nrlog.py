@@ -3,11 +3,25 @@ import numpy as np
 import pandas as pd
 import datetime
 import os
+import time
 import const
-import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from ue import Ue
 from cell import Cell
 from util.ei2csv import ei2csv
+from util import colstore, rollup
+from util.manifest import Manifest, make_entry, make_rowindex
+from util.memcache import ColumnCache, DEFAULT_BUDGET
+from util.querystats import Profiler, QueryLog, summary
+from util.sqlstore import SqlStore
+import residency
+from aggregate import Incremental, Metric, Partial, count_by_time, resolve, sparse_counts
+from dlschd import DlSchd
+from ulschd import UlSchd
+
+# 可按名称注册为增量指标的指标
+METRICS = {const.NR_FILE_DLSCHD: DlSchd.METRICS, const.NR_FILE_ULSCHD: UlSchd.METRICS}
 
 class NrLog(object):
     ''' NR调度模块Log分析接口类
@@ -19,13 +33,29 @@ class NrLog(object):
         要求所有文件命名符合EI命名格式：子系统_时间.csv
     '''
 
-    def __init__(self, directory, time_interval=None):
+    def __init__(self, directory, time_interval=None, cache=True, executor='thread', max_workers=None,
+                 memory_budget=DEFAULT_BUDGET, chunksize=None, compact=False, converter=None, rollup=False):
         '''初始化Log实例,把所有Log按照类型分类
 
            Args:
                directory: Log所在目录
                time_interval: 时间范围[start, end],格式为yyyy/mm/dd/ hh:mm:ss
+               cache: 是否使用列式缓存，缓存保存在Log目录下的.svinsight目录中
+               executor: 文件加载方式，'thread'线程池，'process'进程池(解析、时间转换、过滤均在子进程中完成)
+               max_workers: 同时加载的最大文件数，默认为CPU核数
+               memory_budget: 共享列缓存的内存预算(字节)，所有小区、UE实例共用，0表示不使用
+               chunksize: 按时间粒度聚合时每次读取的最大行数，None表示一次读取全部数据；
+                          指定后mean/sum/min/max/cnt_of_cols及value_count_of_col分块流式聚合
+               compact: 读取的数据是否使用紧凑类型：按字段名前缀(u8/u16/u32/s8/s16/s32)使用最窄的整数类型，
+                        含空值的列为pandas可空整数类型；为False时与pd.read_csv的类型一致。
+                        无论是否指定，列式缓存及共享列缓存中均保存紧凑格式
+               converter: EI文件转换方式(util.ei2csv.Converter)，默认由util.ei2csv.default_converter()按环境变量选择
+               rollup: 是否使用预聚合(util.rollup)，使用列式缓存时有效：第一次访问某类型的Log时计算各文件
+                       100ms/1s/10s/1min的预聚合结果，时间粒度为其整数倍的标准指标不再读取原始数据
+           初始化时只查找文件，某类型的EI文件转换及清单加载在第一次访问该类型的Log时进行，
+           CellId、UEGID在第一次获取小区、UE时统计
         '''
+        assert(executor in ('thread', 'process'))
         if time_interval:
             assert(len(time_interval)==2)
             assert(pd.to_datetime(time_interval[0]) <= pd.to_datetime(time_interval[1]))
@@ -33,46 +63,146 @@ class NrLog(object):
         self._directory = directory
         self._logfiles={}
         self._time_interval = pd.to_datetime(time_interval) if time_interval else None
+        self._cache = cache
+        self._manifest = Manifest(directory, persist=cache)
+        self._executor = executor
+        self._max_workers = max_workers
+        self._memcache = ColumnCache(memory_budget) if memory_budget else None
+        self._chunksize = chunksize
+        self._compact = compact
+        self._converter = converter
+        self._rollup = rollup
         self._cells = {}
-        self._cellids = set()
+        self._cellids = None
         self._ues = {}
-        self._cell_and_ue_ids = pd.DataFrame()
+        self._cell_and_ue_ids = None
+        self._tracked = {}
+        self._querylog = QueryLog()
+        self._sqlstore = None
+        self._residencies = {}
+
+        # 各类型的文件名，尚未转换的EI文件以转换后的CSV文件名表示
+        self._filenames = {}
+        for filetype in const.NR_FILE_TYPES:
+            filenames = self._filenames_of_type(filetype, eifiles=True)
+            if filenames:
+                self._filenames[filetype] = filenames
+
+    def _logfile(self, filetype):
+        '''获取该类型的Log文件实例，第一次访问时转换该类型的EI文件并加载，没有数据时返回None'''
+        if filetype not in self._logfiles:
+            logfile = None
+            if filetype in self._filenames:
+                self._convert_eifiles(filetype=filetype)
+                names = set(os.listdir(self._directory))
+                files = [name for name in self._filenames[filetype] if name in names]
+                logfile = self._new_logfile(filetype, files=files)
+                if logfile.lines == 0:
+                    logfile = None
+                elif self._rollup:
+                    logfile.build_rollups()
+            self._logfiles[filetype] = logfile
+        return self._logfiles[filetype]
+
+    def _all_logfiles(self):
+        '''所有有数据的Log文件实例，字典格式{类型: 实例}'''
+        logfiles = {}
+        for filetype in const.NR_FILE_TYPES:
+            logfile = self._logfile(filetype)
+            if logfile is not None:
+                logfiles[filetype] = logfile
+        return logfiles
+
+    def _convert_eifiles(self, min_age=None, filetype=None):
+        '''转换还没有对应CSV文件的EI文件
 
-        files = pd.Series(os.listdir(self._directory))
-        eifiles = files[files.apply(lambda x: x.endswith(r'.ei') and x.rsplit('.')[0]+r'.csv' not in os.listdir(self._directory))]   
+            Args:
+                min_age: 只转换最后修改时间距今不少于min_age秒的文件，None表示全部转换
+                filetype: 只转换初始化时找到的该类型的文件，None表示全部文件
+        '''
+        names = os.listdir(self._directory)
+        files = pd.Series(names)
+        eifiles = files[files.apply(lambda x: x.endswith(r'.ei') and x.rsplit('.')[0]+r'.csv' not in names)]
+        if filetype is not None:
+            known = set(self._filenames.get(filetype, []))
+            eifiles = eifiles[eifiles.apply(lambda x: x.rsplit('.')[0]+r'.csv' in known)]
+        if min_age is not None:
+            eifiles = eifiles[eifiles.apply(lambda x: self._settled(x, min_age))]
         if eifiles.size:
-            if time_interval:
+            # 指定类型时文件名已按时间范围筛选过
+            if self._time_interval is not None and filetype is None:
                 start = eifiles.apply(lambda x: pd.to_datetime(x.rsplit('.')[0].rsplit('_')[-1]))
                 start = start.sort_values().reset_index(drop=True)
                 end = pd.concat([start[1:],start[-1:]]).reset_index(drop=True)
                 eifiles = eifiles[(start <= self._time_interval[1]) & (end >= self._time_interval[0])]
-            ei2csv(directory,list(eifiles)) 
+            ei2csv(self._directory, list(eifiles), converter=self._converter)
 
-        for filetype in const.NR_FILE_TYPES:
-            filenames = self._filenames_of_type(filetype)
-            if filenames:
-                logfile = NrFile(filetype, directory, filenames, time_interval=self._time_interval)
-                if logfile.lines == 0:
-                    continue
-                self._logfiles[filetype] = logfile
-                self._cellids = set.union(self._cellids, logfile.cellids)
-                self._cell_and_ue_ids = pd.concat([logfile._cell_and_ue_ids, self._cell_and_ue_ids]).drop_duplicates()
+    def _settled(self, name, min_age):
+        '''文件最后修改时间距今不少于min_age秒，认为已写入完成'''
+        return time.time() - os.path.getmtime(os.path.join(self._directory, name)) >= min_age
+
+    def _update_ids(self):
+        '''根据各类型的Log文件统计CellId以及(CellId, UEGID)组合，已统计时不再重复'''
+        if self._cellids is not None:
+            return
+        self._cellids = set()
+        self._cell_and_ue_ids = pd.DataFrame()
+        ids = []
+        for logfile in self._all_logfiles().values():
+            self._cellids = set.union(self._cellids, logfile.cellids)
+            ids.insert(0, logfile.cell_and_ue_ids)
+        if ids:
+            self._cell_and_ue_ids = pd.concat(ids).drop_duplicates()
 
     @property
     def directory(self):
         return self._directory
 
-    def _filenames_of_type(self, filetype):
+    @property
+    def cache(self):
+        return self._cache
+
+    def cache_stats(self):
+        '''共享列缓存的命中、未命中、淘汰次数以及内存占用'''
+        return self._memcache.stats() if self._memcache is not None else None
+
+    def stats(self, by_caller=False):
+        '''各小区、UE实例的查询记录
+
+            Args:
+                by_caller: 为True时按(来源方法, 查询)汇总，按总耗时降序排列
+            Returns:
+                DataFrame，每次查询一行：查询名、文件类型、列、总耗时(seconds)、各阶段耗时(阶段_s)、
+                读取及保留的行数、解析的文件数及字节数、缓存命中等，caller为发起查询的分析方法
+        '''
+        if by_caller:
+            return summary(self._querylog.entries)
+        return self._querylog.to_frame()
+
+    def profile(self, filename=None):
+        '''收集with块中所有查询记录的上下文管理器，filename不为None时退出时以JSON lines格式追加写入
+
+            with log.profile('stats.jsonl') as profiler:
+                cell.dl.throuput()
+            profiler.summary()
+        '''
+        return Profiler(filename)
+
+    def _filenames_of_type(self, filetype, eifiles=False):
         '''获取指定文件类型的所有文件名
             Args：
                 filetype：文件类型
                 time_interval: 时间范围[start, end],格式为yyyymmddhhmmss
+                eifiles: 是否包含尚未转换的EI文件，以转换后的CSV文件名表示
             Returns:
                 文件名列表
         '''
         names_of_filetype = []
 
-        csvfiles = pd.Series(np.sort(os.listdir(self._directory)))
+        names = os.listdir(self._directory)
+        if eifiles:
+            names = set(names).union([x.rsplit('.')[0] + r'.csv' for x in names if x.endswith(r'.ei')])
+        csvfiles = pd.Series(np.sort(list(names)))
         csvfiles = csvfiles[csvfiles.apply(lambda x: x.endswith(r'.csv'))]
         csvfiles = csvfiles[csvfiles.apply(lambda x: -1 != x.find(filetype))]
         csvfiles = list(csvfiles)
@@ -96,7 +226,7 @@ class NrLog(object):
            输出文件名，大小，行数，时间范围，airtime范围等，每个Log文件一列
         '''
         df = pd.DataFrame()
-        for type, logfile in self._logfiles.items():
+        for type, logfile in self._all_logfiles().items():
             df.at[type, 'size'] = logfile.size
             df.at[type, 'num_of_files'] = len(logfile.files)
             df.at[type, 'num_of_lines'] = logfile.lines
@@ -112,7 +242,7 @@ class NrLog(object):
             Returns:
                 对应的小区实例
         '''
-        
+        self._update_ids()
         if cellid in self._cellids:
             if cellid not in self._cells.keys():
                 self._cells[cellid] = Cell(cellid, self)
@@ -127,18 +257,20 @@ class NrLog(object):
             Returns:
                 对应的UE实例
         '''
-        
-        if cellid:
+        self._update_ids()
+        if cellid is not None:
             if (cellid == self._cell_and_ue_ids['CellId']).any():
-                self._cells[cellid] = Cell(cellid, self)
+                if cellid not in self._cells:
+                    self._cells[cellid] = Cell(cellid, self)
                 return self._cells[cellid].get_ue(uegid)
             else:
                 return '非法cellid, uegId值，此小区或ue不存在'
         else:
             if (uegid == self._cell_and_ue_ids['UEGID']).any():
-                dllog = self.get_dlschd_logfile(uegid=uegid)
-                ullog = self.get_ulschd_logfile(uegid=uegid)
-                self._ues[uegid] = Ue(ullog, dllog, None, uegid)
+                if uegid not in self._ues:
+                    dllog = self.get_dlschd_logfile(uegid=uegid)
+                    ullog = self.get_ulschd_logfile(uegid=uegid)
+                    self._ues[uegid] = Ue(ullog, dllog, None, uegid)
                 return self._ues[uegid]
             else:
                 return '非法ueId值，此小区不存在'
@@ -150,99 +282,569 @@ class NrLog(object):
             Returns:
                 Log中的所有CellId,UeId
         '''
-
+        self._update_ids()
         return self._cell_and_ue_ids
 
 
+    def _new_logfile(self, filetype, id_filter=None, files=None):
+        '''按照当前Log的配置创建Log文件实例，同一类型的实例共用表头
+
+            Args:
+                files: 文件名列表，默认为已加入的该类型的全部文件
+        '''
+        logfile = self._logfiles.get(filetype)
+        if files is None:
+            files = logfile.files if logfile is not None else self._filenames_of_type(filetype)
+        # 只有文件都在已有实例中时表头才相同，新增的文件可能带有新的列
+        header = logfile.header if logfile is not None and set(files) <= set(logfile.files) else None
+        return NrFile(filetype, self._directory, files, id_filter=id_filter,
+                      time_interval=self._time_interval, cache=self._cache, manifest=self._manifest,
+                      executor=self._executor, max_workers=self._max_workers, memcache=self._memcache,
+                      chunksize=self._chunksize, compact=self._compact, header=header, querylog=self._querylog,
+                      rollup=self._rollup)
+
     def _get_schd_logfile(self, filetype, cellid=None, uegid=None):
         '''获取Log文件实例'''
 
-        if filetype not in self._logfiles:
+ 
+        if self._logfile(filetype) is None:
             return None
         
         id_filter = {}     
-        if cellid:
+        if cellid is not None:
             id_filter.update({'CellId': [cellid]})     
-        if uegid:
+        if uegid is not None:
             id_filter.update({'UEGID': [uegid]})
          
-        return NrFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter, time_interval=self._time_interval)
+        return self._new_logfile(filetype, id_filter)
 
     def get_dlschd_logfile(self, cellid=None, uegid=None):
         '''获取Log文件实例'''
-        
-        filetype = const.NR_FILE_DLSCHD
-        if filetype not in self._logfiles:
-            return None         
-        id_filter = {}     
-        if cellid:
-            id_filter.update({'CellId': [cellid]})     
-        if uegid:
-            id_filter.update({'UEGID': [uegid]})
-         
-        return NrFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter, time_interval=self._time_interval)
+        return self._get_schd_logfile(const.NR_FILE_DLSCHD, cellid, uegid)
 
     def get_ulschd_logfile(self, cellid=None, uegid=None):
         '''获取Log文件实例'''
-        
-        filetype = const.NR_FILE_ULSCHD
-        if filetype not in self._logfiles:
-            return None          
-        id_filter = {}     
-        if cellid:
-            id_filter.update({'CellId': [cellid]})     
-        if uegid:
-            id_filter.update({'UEGID': [uegid]})
-         
-        return NrFile(filetype, self._directory, self._filenames_of_type(filetype), id_filter=id_filter, time_interval=self._time_interval)
-        
+        return self._get_schd_logfile(const.NR_FILE_ULSCHD, cellid, uegid)
+
+    def residency(self, gap=1):
+        '''UE驻留区间表(residency.Residency)，由上下行Log一次扫描得到，可按小区、UE查询首末出现时间、中断及切换
+
+            Args:
+                gap: 同一小区中相邻两次出现的间隔超过gap(s)时认为中间离开过
+            结果按gap缓存，加入新文件后重新计算
+        '''
+        if gap not in self._residencies:
+            self._residencies[gap] = residency.build(self._all_logfiles().values(), gap)
+        return self._residencies[gap]
+
+    def sql(self, query, params=None):
+        '''用SQL查询Log，每类Log为一张表，表名为文件类型，见util.sqlstore
+
+            例如查询上行SINR低于-5且MCS大于20的UE：
+                log.sql('SELECT UEGID, COUNT(*) AS cnt FROM CMAC_ulUeTtiInfo '
+                        'WHERE "PUSCH_SINR.s16SingleRbSINR" < -5 AND "TB.u8Mcs" > ? GROUP BY UEGID', [20])
+            Args:
+                query: SQL语句，含有'.'的列名需要加双引号
+                params: 查询参数，对应语句中的?占位符
+            Returns:
+                DataFrame
+        '''
+        if self._sqlstore is None:
+            self._sqlstore = SqlStore(self._logfile, const.NR_FILE_TYPES)
+        start = time.perf_counter()
+        rlt = self._sqlstore.query(query, params)
+        self._querylog.record({'query': 'sql', 'filetype': None, 'cols': None,
+                               'seconds': time.perf_counter() - start, 'sql': query})
+        return rlt
+
+    def track(self, name, metric, filetype=const.NR_FILE_DLSCHD, cellid=None, time_bin=1):
+        '''注册增量指标，立即按已加入的文件计算，之后每次refresh只计算新增的文件
+
+            Args:
+                name: 指标名，用于获取结果
+                metric: Metric实例，或者该类型Log的METRICS中的指标名，例如'throuput', 'bler_of_slot'
+                filetype: Log类型
+                cellid: 只统计指定小区，None表示全部小区
+                time_bin: 时间粒度(s)
+            Returns:
+                Incremental实例
+        '''
+        if not isinstance(metric, Metric):
+            assert(metric in METRICS.get(filetype, {})), '不支持的指标: %s' % metric
+            metric = METRICS[filetype][metric]
+        incremental = Incremental(metric, time_bin, {'CellId': [cellid]} if cellid is not None else None)
+        self._tracked[name] = (filetype, incremental)
+        if self._logfile(filetype) is not None:
+            self._update_tracked(filetype, self._logfile(filetype).files, [incremental])
+        return incremental
+
+    def _update_tracked(self, filetype, files, incrementals):
+        '''读取一次指定文件，更新多个增量指标'''
+        if not incrementals:
+            return
+        self._update_incrementals(self._new_logfile(filetype, files=files), incrementals)
+
+    def _update_incrementals(self, logfile, incrementals):
+        '''逐文件(指定chunksize时逐块)读取一次数据，更新多个增量指标'''
+        cols = list(dict.fromkeys([col for incremental in incrementals for col in incremental.usecols]))
+        for data in logfile.gen_of_cols(cols, format_time=True, chunksize=self._chunksize):
+            for incremental in incrementals:
+                incremental.update(data)
+
+    def partials(self, metrics, filetype=const.NR_FILE_DLSCHD, time_bin=1, cellid=None, uegid=None):
+        '''读取一次数据，计算多个指标的可合并结果，用于合并多个Log目录的指标
+
+            Args:
+                metrics: 列表，每项为该类型Log的METRICS中的指标名或(指标名, Metric)
+                filetype: Log类型
+                time_bin: 时间粒度(s)
+                cellid: 只统计指定小区，None表示全部小区
+                uegid: 只统计指定UE，None表示全部UE
+            Returns:
+                {指标名: Incremental}，可通过Incremental.merge合并，通过result获取结果
+        '''
+        named = resolve(metrics, METRICS.get(filetype, {}))
+        incrementals = {name: Incremental(metric, time_bin) for name, metric in named}
+        logfile = self._get_schd_logfile(filetype, cellid, uegid)
+        if logfile is not None and logfile.lines and incrementals:
+            self._update_incrementals(logfile, list(incrementals.values()))
+        return incrementals
+
+    def tracked(self, name=None):
+        '''增量指标的当前结果
+
+            Args:
+                name: 指标名，None表示全部指标
+            Returns:
+                DataFrame，行为时间，name为None时列为(指标名, 字段)两级索引
+        '''
+        if name is not None:
+            return self._tracked[name][1].result()
+        if not self._tracked:
+            return pd.DataFrame()
+        rlt = pd.concat({name: incremental.result() for name, (_, incremental) in self._tracked.items()}, axis=1)
+        rlt.columns.names = ['metric', 'field']
+        return rlt
+
+    def refresh(self, min_age=2):
+        '''跟踪模式：重新扫描目录，只加入新增的文件(EI文件先转换)，并用新增的文件更新增量指标
+
+            Args:
+                min_age: 最后修改时间距今不足min_age秒的文件认为仍在写入，留到下次加入
+            Returns:
+                新增的文件名列表
+        '''
+        # 先加载尚未访问的类型，其中的文件按初始化时的状态处理
+        logfiles = {filetype: self._logfile(filetype) for filetype in const.NR_FILE_TYPES}
+        self._convert_eifiles(min_age)
+        names = set(os.listdir(self._directory))
+        added = []
+        for filetype, logfile in logfiles.items():
+            known = set(logfile.files) if logfile is not None else set()
+            # 由EI文件转换得到的CSV文件已经完整，不需要等待
+            filenames = [name for name in self._filenames_of_type(filetype) if name in known
+                         or name.rsplit('.')[0] + '.ei' in names or self._settled(name, min_age)]
+            new = [name for name in filenames if name not in known]
+            if not new:
+                continue
+            logfile = self._new_logfile(filetype, files=filenames)
+            if logfile.lines == 0:
+                continue
+            if self._rollup:
+                logfile.build_rollups()
+            self._logfiles[filetype] = logfile
+            self._filenames[filetype] = filenames
+            added.extend(new)
+            incrementals = [incremental for type, incremental in self._tracked.values() if type == filetype]
+            self._update_tracked(filetype, new, incrementals)
+
+        if added:
+            # 已创建的小区、UE实例只包含原有文件，重新获取时按新的文件创建
+            self._cells = {}
+            self._ues = {}
+            self._cellids = None
+            self._cell_and_ue_ids = None
+            self._residencies = {}
+        return added
+
+    def follow(self, interval=10, callback=None, min_age=2, rounds=None):
+        '''跟踪模式：周期性扫描目录，有新增文件时调用callback(self, added)
+
+            Args:
+                interval: 扫描间隔(s)
+                callback: 有新增文件时的回调函数，例如刷新增量指标的图表
+                min_age: 同refresh
+                rounds: 扫描次数，None表示一直扫描，直到被中断
+        '''
+        count = 0
+        while rounds is None or count < rounds:
+            added = self.refresh(min_age)
+            if added and callback is not None:
+                callback(self, added)
+            count += 1
+            if rounds is None or count < rounds:
+                time.sleep(interval)
+
+
+def _read_file(directory, name, usecols=None, format_time=False, cache=True, rows=None, memcache=None,
+               compact=False, stats=None):
+    '''读取单个文件的指定列
+
+        Args:
+            directory: 文件所在目录
+            name: 文件名
+            usecols: 列名列表，None表示全部列
+            format_time: 是否转换LocalTime，转换结果同样缓存，再次读取时无需转换
+            cache: 是否使用列式缓存
+            rows: 行范围slice(start, stop)或升序行号数组，None表示全部行
+            memcache: 共享的内存列缓存
+            compact: 整数列是否使用紧凑类型
+            stats: ParseStats，记录解析量
+        Returns:
+            数据，DataFrame格式
+    '''
+    converters = None
+    if format_time:
+        converters = {'LocalTime': _time_converter(name)}
+    filename = os.path.join(directory, name)
+    data = colstore.read_csv(filename, usecols=_present_cols(filename, usecols, cache), na_values='-', cache=cache,
+                             converters=converters, rows=rows, memcache=memcache, compact=compact, stats=stats)
+    return _with_absent(data, usecols)
+
+
+def _iter_file(directory, name, chunksize, usecols=None, format_time=False, cache=True, rows=None, compact=False,
+               stats=None):
+    '''分块读取单个文件的指定列，每块最多chunksize行，其他参数同_read_file'''
+    converters = None
+    if format_time:
+        converters = {'LocalTime': _time_converter(name)}
+    filename = os.path.join(directory, name)
+    for data in colstore.iter_csv(filename, chunksize, usecols=_present_cols(filename, usecols, cache), na_values='-',
+                                  cache=cache, converters=converters, rows=rows, compact=compact, stats=stats):
+        yield _with_absent(data, usecols)
+
+
+def _header_of(filename, cache=True):
+    '''文件的所有列名'''
+    if cache:
+        return colstore.ColStore(filename).header
+    return list(pd.read_csv(filename, nrows=0).columns)
+
+
+def _present_cols(filename, usecols, cache=True):
+    '''usecols中该文件存在的列，同一类型的文件表头可能不同，例如版本升级后新增了列'''
+    if usecols is None:
+        return None
+    header = set(_header_of(filename, cache))
+    return [col for col in usecols if col in header]
+
+
+def _with_absent(data, usecols):
+    '''补齐文件中不存在的列，取值为空，列顺序与usecols一致'''
+    if usecols is None or len(data.columns) == len(usecols):
+        return data
+    return data.reindex(columns=usecols)
+
+
+def _time_converter(name):
+    '''LocalTime转换函数，日期取自文件名'''
+    datestr = name.rsplit('.')[0].rsplit('_')[-1]
+    return ('datetime', lambda times: NrFile._decode_time(times, datestr))
+
+
+def _rows_of_interval(directory, name, time_interval, cache=True):
+    '''在按时间排序的文件中二分查找时间范围对应的行范围
+
+        使用缓存时LocalTime列以内存映射方式访问，只读取查找过程中用到的少量数据
+        Returns:
+            slice(start, stop)
+    '''
+    if cache:
+        store = colstore.ColStore(os.path.join(directory, name))
+        times = store.column('LocalTime', converters={'LocalTime': _time_converter(name)})
+    else:
+        times = _read_file(directory, name, usecols=['LocalTime'], format_time=True, cache=False)['LocalTime'].values
+    start = np.searchsorted(times, time_interval[0].to_datetime64(), 'left')
+    stop = np.searchsorted(times, time_interval[1].to_datetime64(), 'right')
+    return slice(int(start), int(stop))
+
+
+def _scan_file(directory, name, cache=True, time_interval=None, rows=None):
+    '''扫描单个文件，生成清单条目
+
+        Args:
+            directory: 文件所在目录
+            name: 文件名
+            cache: 是否使用列式缓存
+            time_interval: 时间范围[start, end]，只统计范围内的行
+            rows: 行范围slice(start, stop)，None表示全部行
+        Returns:
+            清单条目，字典格式
+    '''
+    cols = ['LocalTime', 'CellId', 'UEGID']
+    data = _read_file(directory, name, usecols=cols, format_time=True, cache=cache, rows=rows)
+    if time_interval is not None:
+        data = data[(time_interval[0] <= data[cols[0]]) & (data[cols[0]] <= time_interval[1])]
+    elif cache and rows is None:
+        colstore.ColStore(os.path.join(directory, name)).save_array('rowindex', make_rowindex(data))
+    return make_entry(data[cols])
+
+
+def _rows_of_ids(directory, name, entry, matched):
+    '''通过行索引获取指定(CellId, UEGID)组合在文件中的行号
+
+        Args:
+            entry: 文件的完整清单条目
+            matched: 匹配的组合在entry['pairs']中的序号
+        Returns:
+            升序行号数组
+    '''
+    store = colstore.ColStore(os.path.join(directory, name))
+    rowindex = store.load_array('rowindex')
+    if rowindex is None or len(rowindex) != entry['rows']:
+        rowindex = make_rowindex(_read_file(directory, name, usecols=['CellId', 'UEGID']))
+        store.save_array('rowindex', rowindex)
+
+    offsets = np.cumsum([0] + [pair[2] for pair in entry['pairs']])
+    rows = np.concatenate([rowindex[offsets[i]:offsets[i + 1]] for i in matched])
+    return np.sort(rows)
+
+
+def _filter_data(data, time_interval, filters, cols, stats=None):
+    '''按时间范围及过滤条件筛选行，只保留请求的列
+
+        Args:
+            data: 按规划读取的数据，包含请求的列、过滤条件列以及时间列
+            time_interval: 时间范围[start, end]，None表示不限
+            filters: 过滤条件，字典格式{'colname': [val1,]}
+            cols: 请求的列名列表，None表示全部列
+            stats: ParseStats，记录过滤耗时及保留的行数
+        Returns:
+            数据，DataFrame格式
+    '''
+    with colstore.timed(stats, 'filter'):
+        if time_interval is not None and 'LocalTime' in data:
+            data = data[(time_interval[0] <= data['LocalTime']) & (data['LocalTime'] <= time_interval[1])]
+
+        if filters:
+            data = data[data[list(filters.keys())].isin(filters).all(1)]
+
+        if cols is not None and (filters or len(data.columns) != len(set(cols))):
+            data = data[cols]
+    if stats is not None:
+        stats.add(rows_kept=len(data.index))
+    return data
+
+
+def _load_file(directory, name, usecols, format_time, cache, time_interval, filters, cols, rows=None, memcache=None,
+               compact=False, stats=None, packed=False):
+    '''加载单个文件：解析、时间转换、时间范围及条件过滤
+
+        Args:
+            rows: 行范围slice(start, stop)或升序行号数组，None表示全部行
+            memcache: 共享的内存列缓存，进程池中为None
+            compact: 整数列是否使用紧凑类型
+            stats: ParseStats，记录解析量
+            packed: 为True时返回(列名, 索引, 各列数组, ParseStats)，用于进程池中减少传输开销
+        Returns:
+            数据，DataFrame格式
+    '''
+    if packed:
+        stats = colstore.ParseStats()
+    data = _read_file(directory, name, usecols=usecols, format_time=format_time, cache=cache, rows=rows,
+                      memcache=memcache, compact=compact, stats=stats)
+    data = _filter_data(data, time_interval, filters, cols, stats)
+
+    if packed:
+        return list(data.columns), data.index.values, [data[col].values for col in data.columns], stats
+    return data
+
+
+def _build_rollup(directory, name, filetype):
+    '''计算单个文件各级粒度的预聚合结果，保存在列式缓存中'''
+    store = colstore.ColStore(os.path.join(directory, name))
+    values, categories = rollup.columns_of(filetype, store.header)
+    data = _read_file(directory, name, usecols=['LocalTime', 'CellId', 'UEGID'] + values + categories,
+                      format_time=True)
+    for level, table in rollup.build(data, filetype).items():
+        store.save_table(rollup.table_name(level), table)
+
+
+def _load_file_packed(args):
+    '''进程池入口'''
+    return _load_file(*args, packed=True)
+
+
 class NrFile(object):
     '''Log文件接口类'''
 
-    def __init__(self, filetype, directory, files, id_filter=None, time_interval=None):
+    def __init__(self, filetype, directory, files, id_filter=None, time_interval=None, cache=True, manifest=None,
+                 executor='thread', max_workers=None, memcache=None, chunksize=None, compact=False, header=None,
+                 querylog=None, rollup=False):
         '''初始化Log实例,把所有Log按照类型分类
 
            Args:
                file: 文件名
                filetype: log类型
+               cache: 是否使用列式缓存
+               manifest: 目录清单，为None时新建
+               executor: 文件加载方式，'thread'线程池，'process'进程池
+               max_workers: 同时加载的最大文件数，默认为CPU核数
+               memcache: 共享的内存列缓存(ColumnCache)，进程池方式下不使用
+               chunksize: 按时间粒度聚合时每次读取的最大行数，None表示一次读取全部数据
+               compact: 读取的数据是否使用紧凑类型
+               header: 该类型文件的表头，为None时由各文件的表头合并得到
+               querylog: 查询记录(util.querystats.QueryLog)，为None时新建
+               rollup: 是否由预聚合结果计算时间粒度聚合，需要使用列式缓存，不支持紧凑类型及time_interval
+           清单在第一次访问行数、时间范围、ID等元数据或读取数据时才加载
         '''
         self._files = files
-        self._type = type
+        self._type = filetype
         self._directory = directory
         self._id_filter = id_filter
         self._time_filter = None
-        self._size = sum([os.path.getsize(os.path.join(directory, file)) for file in files])
         self._times = [-1, -1]
         self._lines = 0
         self._cellids = set()
         self._uegids = set()
         self._cell_and_ue_ids = pd.DataFrame()
         self._time_interval = time_interval
+        self._cache = cache
+        self._manifest = manifest if manifest is not None else Manifest(directory, persist=cache)
+        self._executor = executor
+        self._max_workers = max_workers or os.cpu_count()
+        self._memcache = memcache
+        self._chunksize = chunksize
+        self._compact = compact
+        self._header = header
+        self._parse_stats = colstore.ParseStats()
+        self._querylog = querylog if querylog is not None else QueryLog()
+        self._querying = False
+        self._rows = {}
+        self._loaded = False
+        self._rollup = rollup
+        self._rollups = {}
+
+    def _load(self):
+        '''第一次访问元数据或读取数据时加载清单：按时间范围及id_filter确定读取的文件和行，
+            统计行数、时间范围以及CellId、UEGID
+        '''
+        if self._loaded:
+            return
+        self._loaded = True
+        entries = self._file_entries()
+        self._size = sum([self._manifest.get(file)['size'] for file in self._files])
+        if self._id_filter:
+            self._select_rows_of_ids(entries)
 
-        cols = ['LocalTime', 'CellId', 'UEGID']
-        data = self.get_data_of_cols(cols,format_time=True)
-        if len(data.index):
-            self._lines = len(data.index)
-            self._times[0] = data.iat[0, 0]
-            self._times[1] = data.iat[-1, 0]
-            self._cellids = set.union(self._cellids, set(data[cols[1]]))
-            self._uegids = set.union(self._uegids, set(data[cols[2]]))
-            data = data.set_index(cols[0])
-            self._cell_and_ue_ids = pd.concat([data[cols[1:]].drop_duplicates(), self._cell_and_ue_ids]).drop_duplicates()
+        pairs = []
+        for entry in entries:
+            for cellid, uegid, rows, first, last in entry['pairs']:
+                if self._match_ids(cellid, uegid):
+                    pairs.append([first, last, rows, cellid, uegid])
+
+        if pairs:
+            cols = ['LocalTime', 'LastTime', 'Rows', 'CellId', 'UEGID']
+            pairs = pd.DataFrame(pairs, columns=cols)
+            self._lines = int(pairs[cols[2]].sum())
+            self._times[0] = pd.Timestamp(pairs[cols[0]].iat[0])
+            self._times[1] = pd.Timestamp(pairs[cols[1]].max())
+            self._cellids = set(pairs[cols[3]])
+            self._uegids = set(pairs[cols[4]])
+            pairs[cols[0]] = pd.to_datetime(pairs[cols[0]])
+            self._cell_and_ue_ids = pairs.set_index(cols[0])[cols[3:]].drop_duplicates()
+
+    def _match_ids(self, cellid, uegid):
+        '''判断(CellId, UEGID)是否满足id_filter'''
+        if not self._id_filter:
+            return True
+        if 'CellId' in self._id_filter and cellid not in self._id_filter['CellId']:
+            return False
+        if 'UEGID' in self._id_filter and uegid not in self._id_filter['UEGID']:
+            return False
+        return True
+
+    def _select_rows_of_ids(self, entries):
+        '''按id_filter确定每个文件需要读取的行
+
+            没有匹配行的文件不再读取；使用缓存时通过行索引只读取匹配的行，
+            与时间范围对应的行范围取交集
+        '''
+        files = []
+        for name, entry in zip(self._files, entries):
+            if not any(self._match_ids(pair[0], pair[1]) for pair in entry['pairs']):
+                continue
+            files.append(name)
+            if not self._cache:
+                continue
+
+            full_entry = self._manifest.get(name)
+            matched = [i for i, pair in enumerate(full_entry['pairs']) if self._match_ids(pair[0], pair[1])]
+            if len(matched) == len(full_entry['pairs']):
+                continue
+            rows = _rows_of_ids(self._directory, name, full_entry, matched)
+            if name in self._rows:
+                rows = rows[(self._rows[name].start <= rows) & (rows < self._rows[name].stop)]
+            self._rows[name] = rows
+        self._files = files
+
+    def _map_files(self, func, *iterables):
+        '''用线程池或进程池按文件并行执行func，结果顺序与输入一致'''
+        if self._executor == 'process':
+            pool = ProcessPoolExecutor(max_workers=self._max_workers)
+        else:
+            pool = ThreadPoolExecutor(max_workers=self._max_workers)
+        with pool:
+            return list(pool.map(func, *iterables))
+
+    def _file_entries(self):
+        '''按文件顺序获取每个文件的清单条目
+
+            清单中不存在或已过期的文件并行扫描后写回清单；
+            指定了time_interval时，按清单中的时间范围剔除无关文件，
+            部分重叠的文件通过二分查找确定行范围，只统计范围内的行
+        '''
+        stale = [name for name in self._files if self._manifest.get(name) is None]
+        if stale:
+            n = len(stale)
+            for name, entry in zip(stale, self._map_files(_scan_file, [self._directory] * n, stale, [self._cache] * n)):
+                self._manifest.update(name, entry)
+            self._manifest.save()
+
+        entries, files = [], []
+        for name in np.sort(self._files):
+            entry = self._manifest.get(name)
+            if self._time_interval is not None and entry['rows']:
+                start, end = self._time_interval[0].value, self._time_interval[1].value
+                if entry['tmax'] < start or entry['tmin'] > end:
+                    continue
+                if entry['tmin'] < start or entry['tmax'] > end:
+                    if entry['sorted']:
+                        self._rows[name] = _rows_of_interval(self._directory, name, self._time_interval, self._cache)
+                    entry = _scan_file(self._directory, name, self._cache, self._time_interval, self._rows.get(name))
+            files.append(name)
+            entries.append(entry)
+
+        # 只保留与时间范围有重叠的文件
+        self._files = files
+        return entries
 
     @property
     def cellids(self):
         '''获取所有小区ID'''
+        self._load()
         return self._cellids
 
     @property
     def uegids(self):
         '''获取所有UEGID'''
+        self._load()
         return self._uegids
     
     @property
     def cell_and_ue_ids(self):
         '''获取所有UEGID,CellGid'''
+        self._load()
         return self._cell_and_ue_ids
 
     @property
@@ -251,41 +853,237 @@ class NrFile(object):
 
     @property
     def files(self):
+        self._load()
         return self._files
 
     @property
     def size(self):
+        self._load()
         return self._size
 
     @property
     def id_filter(self):
         return self._id_filter
 
+    @property
+    def chunksize(self):
+        return self._chunksize
+
+    @property
+    def compact(self):
+        return self._compact
+
+    @property
+    def header(self):
+        '''该类型所有文件列名的并集，按首个文件的顺序，其他文件新增的列依次排在后面，读取一次后缓存'''
+        if self._header is None:
+            header = {}
+            for name in self._files:
+                header.update(dict.fromkeys(_header_of(os.path.join(self._directory, name), self._cache)))
+            self._header = list(header)
+        return self._header
+
+    def select(self, id_filter=None, time_interval=None):
+        '''在当前选择的基础上按id_filter及时间范围进一步选择，返回新的Log文件实例，只读取匹配的文件和行
+
+            Args:
+                id_filter: {'CellId': [..], 'UEGID': [..]}，与已有的条件取交集
+                time_interval: [start, end]，pd.Timestamp，与已有的时间范围取交集
+        '''
+        merged = dict(self._id_filter or {})
+        for col, vals in (id_filter or {}).items():
+            merged[col] = [val for val in vals if col not in merged or val in merged[col]]
+        interval = self._time_interval
+        if time_interval is not None:
+            interval = time_interval if interval is None else [max(interval[0], time_interval[0]),
+                                                               min(interval[1], time_interval[1])]
+        return NrFile(self._type, self._directory, self.files, id_filter=merged, time_interval=interval,
+                      cache=self._cache, manifest=self._manifest, executor=self._executor,
+                      max_workers=self._max_workers, memcache=self._memcache, chunksize=self._chunksize,
+                      compact=self._compact, header=self.header, querylog=self._querylog, rollup=self._rollup)
+
+    @property
+    def parse_stats(self):
+        '''最近一次查询的读取统计，见colstore.ParseStats'''
+        return self._parse_stats.to_series()
+
+    @property
+    def querylog(self):
+        return self._querylog
+
+    @contextmanager
+    def _query(self, name, cols):
+        '''一次查询：重置读取统计，结束时把总耗时及读取统计写入查询记录；
+            查询中的嵌套查询(例如聚合时读取数据)并入外层查询
+        '''
+        if self._querying:
+            yield self._parse_stats
+            return
+        self._querying = True
+        self._parse_stats = stats = colstore.ParseStats()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            self._querying = False
+            entry = {'query': name, 'filetype': self._type, 'cols': list(cols) if cols is not None else None,
+                     'seconds': time.perf_counter() - start}
+            entry.update(stats.to_dict())
+            self._querylog.record(entry)
+
+    def build_rollups(self):
+        '''并行计算尚未预聚合的文件，结果保存在列式缓存中，随源文件变化一起失效'''
+        if not self._rollup or not self._cache:
+            return
+        self._load()
+        names = [rollup.table_name(level) for level in rollup.LEVELS]
+        stale = []
+        for file in self._files:
+            tables = colstore.ColStore(os.path.join(self._directory, file)).meta.get('tables', {})
+            if not all(name in tables for name in names):
+                stale.append(file)
+        if stale:
+            n = len(stale)
+            self._map_files(_build_rollup, [self._directory] * n, stale, [self._type] * n)
+
+    def _rollup_tables(self, level):
+        '''各文件该粒度的预聚合结果
+
+            Returns:
+                (预聚合结果列表, 原始数据中为int64的列, 所有文件均有的数值列, 所有文件均有的取值列)，
+                不可用时返回None
+        '''
+        if level not in self._rollups:
+            self.build_rollups()
+            tables, int_cols, values, categories = [], None, None, None
+            for file in self._files:
+                store = colstore.ColStore(os.path.join(self._directory, file))
+                table = store.load_table(rollup.table_name(level))
+                if table is None:
+                    self._rollups[level] = None
+                    return None
+                tables.append(table)
+                ints = {col for col, entry in store.meta['columns'].items()
+                        if entry['dtype'][1] in 'iu' and not entry['na']}
+                file_values, file_categories = rollup.columns_of(self._type, store.header)
+                int_cols = ints if int_cols is None else int_cols & ints
+                values = set(file_values) if values is None else values & set(file_values)
+                categories = set(file_categories) if categories is None else categories & set(file_categories)
+            self._rollups[level] = (tables, int_cols, values, categories)
+        return self._rollups[level]
+
+    def _from_rollup(self, how, cols, time_bin, filters, stats):
+        '''由预聚合结果计算时间粒度聚合，不满足条件时返回None，由调用者读取原始数据
+
+            Args:
+                how: 'mean', 'sum', 'min', 'max', 'count'，或'value_counts'(count_of_values)
+                cols: 列名列表
+                time_bin: 时间粒度(s)，需要是某一级预聚合粒度的整数倍
+                filters: 过滤条件，只支持count时对所统计的取值列本身过滤
+        '''
+        if not self._rollup or not self._cache or self._compact or self._time_interval is not None:
+            return None
+        level = rollup.level_of(time_bin)
+        if level is None:
+            return None
+        self._load()
+        if not self._files:
+            return None
+        loaded = self._rollup_tables(level)
+        if loaded is None:
+            return None
+        tables, int_cols, values, categories = loaded
+
+        filters = filters or {}
+        counted = None
+        if how == 'value_counts':
+            if filters or len(cols) != 1 or cols[0] not in categories:
+                return None
+        elif how == 'count' and (filters or not set(cols) <= values):
+            if not set(cols) <= categories or len(cols) != 1 or not set(filters) <= set(cols):
+                return None
+            counted = {cols[0]: filters.get(cols[0])}
+        elif how != 'count' and (filters or not set(cols) <= values):
+            return None
+
+        with stats.timed('rollup'):
+            table = rollup.select(tables, self._id_filter)
+            if how == 'value_counts':
+                return rollup.count_of_values(table, level, time_bin, cols[0], cols[0] in int_cols)
+            return rollup.resample(table, level, time_bin, how, cols, int_cols, counted)
+
+    def _plan_cols(self, cols, filters, format_time):
+        '''规划需要读取的列：请求的列、过滤条件列以及时间列，先按表头校验，再按文件中的顺序返回
+
+            Args:
+                cols: 请求的列名列表，None表示全部列
+                filters: 过滤条件，字典格式{'colname': [val1,]}
+                format_time: 是否需要LocalTime列
+            Returns:
+                列名列表，cols为None时返回None
+        '''
+        needed = list(dict.fromkeys(list(cols or []) + list(filters) + (['LocalTime'] if format_time else [])))
+        header = self.header
+        if header:
+            missing = [col for col in needed if col not in header]
+            if missing:
+                raise KeyError('%s中不存在的列: %s' % (self._type, missing))
+        if cols is None:
+            return None
+        return [col for col in header if col in set(needed)] if header else needed
+
     @property
     def lines(self):
         '''获取文件总行数'''
+        self._load()
         return self._lines
 
     @property
     def times(self):
         '''PC时间范围'''
+        self._load()
         return tuple(self._times)
 
 
+    @staticmethod
+    def _decode_time(times, datestr):
+        '''把hh:mm:ss:ms格式的LocalTime列批量转换为datetime64[ns]
+
+            Log中同一时刻的行很多，只对去重后的字符串做解析，再按编码还原到每一行
+            Args:
+                times: LocalTime列，字符串格式，可能含有空格
+                datestr: 文件名中的日期，yyyymmdd...
+            Returns:
+                numpy datetime64[ns]数组
+        '''
+        codes, uniques = pd.factorize(times)
+        day = np.datetime64('%s-%s-%s' % (datestr[:4], datestr[4:6], datestr[6:8]), 'ns')
+
+        # 按字符位置逐列扫描，数字累加到当前字段，遇到':'切换到下一字段，空格忽略
+        chars = np.asarray(uniques, dtype='S').view(np.uint8).reshape(len(uniques), -1)
+        fields = np.zeros((len(uniques), 4), dtype=np.int64)
+        field_idx = np.zeros(len(uniques), dtype=np.int64)
+        for pos in range(chars.shape[1]):
+            char = chars[:, pos]
+            rows = np.nonzero((char >= ord('0')) & (char <= ord('9')))[0]
+            fields[rows, field_idx[rows]] = fields[rows, field_idx[rows]] * 10 + (char[rows] - ord('0'))
+            field_idx += (char == ord(':'))
+        ms = ((fields[:, 0] * 60 + fields[:, 1]) * 60 + fields[:, 2]) * 1000 + fields[:, 3]
+        rlt = np.append(day + ms.astype('timedelta64[ms]'), np.datetime64('NaT', 'ns'))
+        return rlt[codes]
+
     def _format_time(self, data, datestr):
         col = 'LocalTime'
-        def __retime(timestr):
-            y, m ,d = datestr[:4], datestr[4:6], datestr[6:8]
-            h, mi, s, ms = timestr.replace(' ', '').split(":")
-            return datetime.datetime(int(y), int(m), int(d), int(h), int(mi), int(s), int(ms)*1000)
-        data[col] = data[col].apply(__retime)
+        if not np.issubdtype(data[col].dtype, np.datetime64):
+            data[col] = self._decode_time(data[col], datestr)
         return data
 
-    def gen_of_cols(self, cols=None, val_filter=None, format_time=False):
+    def gen_of_cols(self, cols=None, val_filter=None, format_time=False, chunksize=None):
         '''获取指定列的生成器
             Args：
                 cols: 列名列表，如果为None，表示获取全部列
                 col_val_filter: 过滤条件，字典格式{'colname': [val1,]}
+                chunksize: 每次最多读取的行数，None表示每次读取一个文件
             Yields:
                 生成器格式
         '''
@@ -293,36 +1091,34 @@ class NrFile(object):
         if format_time:
             assert('LocalTime' in cols)
 
+        if self._time_interval is not None:
+            format_time = True
+
         filters = {}
         if val_filter:
             filters.update(val_filter)
         if self._id_filter:
             filters.update(self._id_filter)
 
-        filter_cols = None
-        if cols is not None:
-            filter_cols = list(set.union(set(filters), set(cols)))
+        self._load()
+        usecols = self._plan_cols(cols, filters, format_time)
+        with self._query('gen_of_cols', cols) as stats:
+            for data in self._gen_of_files(usecols, format_time, chunksize):
+                yield _filter_data(data, self._time_interval, filters, cols, stats)
 
+    def _gen_of_files(self, usecols, format_time, chunksize):
+        '''按文件顺序读取数据，指定chunksize时大文件分块读取'''
         for file in self._files:
-            filename = os.path.join(self._directory, file)
-            data = pd.read_csv(filename, na_values='-', usecols=filter_cols)
-            if format_time:
-                datestr = file.rsplit('.')[0].rsplit('_')[-1]
-                self._format_time(data, datestr)
-
-            if 'LocalTime' in cols and self._time_interval is not None:
-                data = data[(self._time_interval[0] <= data['LocalTime']) & (data['LocalTime'] <= self._time_interval[1])]
-
-            if not filters:
-                yield data
-                continue
-
-            mask = data[list(filters.keys())].isin(filters).all(1)
-            if cols is not None:
-                yield data[mask][cols]
+            if chunksize:
+                for data in _iter_file(self._directory, file, chunksize, usecols=usecols, format_time=format_time,
+                                       cache=self._cache, rows=self._rows.get(file), compact=self._compact,
+                                       stats=self._parse_stats):
+                    yield data
             else:
-                yield data[mask]
-            
+                yield _read_file(self._directory, file, usecols=usecols, format_time=format_time, cache=self._cache,
+                                 rows=self._rows.get(file), memcache=self._memcache, compact=self._compact,
+                                 stats=self._parse_stats)
+
     def get_data_of_cols(self, cols, val_filter=None, format_time=False):
         '''获取指定cols的数据
             Args：
@@ -344,47 +1140,55 @@ class NrFile(object):
         if self._id_filter:
             filters.update(self._id_filter)
         
-        filter_cols = None
-        if cols is not None:
-            filter_cols = list(set.union(set(filters), set(cols)))
-            if format_time and 'LocalTime' not in cols:
-                filter_cols = filter_cols.append('LocalTime')
-           
-        thread_data = {}
-        def __readcsv(threadid, filename, na_values,usecols):
-            tdata = pd.read_csv(filename, na_values=na_values, usecols=usecols)
-            if format_time:     
-                datestr = name.rsplit('.')[0].rsplit('_')[-1]
-                self._format_time(tdata, datestr)
-
-            if 'LocalTime' in cols and self._time_interval is not None:
-                tdata = tdata[(self._time_interval[0] <= tdata['LocalTime']) & (tdata['LocalTime'] <= self._time_interval[1])]
-
-            thread_data.update({threadid: tdata})
-        
-        threads = {}
-        for threadid, name in enumerate(np.sort(self._files)):
-            filename = os.path.join(self._directory, name)
-            thread = threading.Thread(target=__readcsv, args=(threadid, filename), kwargs={'na_values':'-', 'usecols' : filter_cols})
-            threads.update({threadid: thread})
-            thread.start()
-        
-        rlt = pd.DataFrame()
-        for threadid, name in enumerate(np.sort(self._files)):
-            threads[threadid].join()
-            #print('Load %d of total %d files' %(threadid + 1, len(self._files)))
-            data = thread_data[threadid]
-            if not filters:
-                rlt = pd.concat([rlt, data])
-                continue
-
-            mask = data[list(filters.keys())].isin(filters).all(1)
-            if cols is not None:
-                rlt = pd.concat([rlt, data[mask][cols]])
+        # 只解析规划的列，列不存在时在读取文件之前报错
+        self._load()
+        usecols = self._plan_cols(cols, filters, format_time)
+        with self._query('get_data_of_cols', cols) as stats:
+            files = list(np.sort(self._files))
+            memcache, thread_stats = (self._memcache, stats) if self._executor == 'thread' else (None, None)
+            args = [(self._directory, name, usecols, format_time, self._cache, self._time_interval, filters, cols,
+                     self._rows.get(name), memcache, self._compact, thread_stats) for name in files]
+            if self._executor == 'process':
+                pieces = []
+                for columns, index, values, file_stats in self._map_files(_load_file_packed, args):
+                    pieces.append(pd.DataFrame(dict(zip(columns, values)), index=index, columns=columns))
+                    stats.merge(file_stats)
             else:
-                rlt = pd.concat([rlt, data[mask]])
+                pieces = self._map_files(_load_file, *zip(*args))
 
-        return rlt
+            # 各文件结果一次性合并，避免逐个concat带来的重复拷贝
+            with stats.timed('concat'):
+                return pd.concat(pieces) if pieces else pd.DataFrame()
+
+    def _resample_of_cols(self, cols, how, time_bin, filters):
+        '''按照时间粒度聚合指定列，指定了chunksize时分块读取，合并各块的部分聚合结果
+
+            Args:
+                cols: 待汇总的列名，可以包含LocalTime，不会修改调用者的列表
+                how: 聚合方式，'mean', 'sum', 'min', 'max', 'count'
+                time_bin：时间粒度（s)
+                filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
+        '''
+        time_col = 'LocalTime'
+        value_cols = [col for col in cols if col != time_col]
+        with self._query('%s_of_cols' % how, value_cols) as stats:
+            rlt = self._from_rollup(how, value_cols, time_bin, filters, stats)
+            if rlt is not None:
+                return rlt
+
+            if self._chunksize:
+                partial = Partial(value_cols, how, time_bin)
+                for data in self.gen_of_cols(value_cols + [time_col], val_filter=filters, format_time=True,
+                                             chunksize=self._chunksize):
+                    with stats.timed('aggregate'):
+                        partial.update(data)
+                with stats.timed('aggregate'):
+                    return partial.result()
+
+            rlt = self.get_data_of_cols(value_cols + [time_col], val_filter=filters, format_time=True)
+            with stats.timed('aggregate'):
+                rlt = rlt[value_cols + [time_col]].set_index(time_col)
+                return rlt.resample(str(time_bin)+'S').apply(how)
 
     def mean_of_cols(self, cols, time_bin=1, filters=None):
         '''按照时间粒度计算指定列的平均值
@@ -394,14 +1198,7 @@ class NrFile(object):
                 time_bin：时间粒度（s)
                 filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
         '''
-
-        time_col = 'LocalTime'
-        if time_col not in cols:
-            cols.append(time_col) 
-        rlt = self.get_data_of_cols(cols, val_filter=filters, format_time=True)
-        rlt = rlt[cols].set_index(rlt[time_col]).drop(time_col)
-        rlt = rlt.resample(str(time_bin)+'S').apply('mean')  
-        return rlt
+        return self._resample_of_cols(cols, 'mean', time_bin, filters)
 
     def sum_of_cols(self, cols, time_bin=1, filters=None):
         '''按照时间粒度计算指定列的总和
@@ -411,13 +1208,7 @@ class NrFile(object):
                 time_bin：时间粒度（s)
                 filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
         '''
-        time_col = 'LocalTime'
-        if time_col not in cols:
-            cols.append(time_col) 
-        rlt = self.get_data_of_cols(cols, val_filter=filters, format_time=True)
-        rlt = rlt[cols].set_index(time_col)
-        rlt = rlt.resample(str(time_bin)+'S').apply('sum') 
-        return rlt
+        return self._resample_of_cols(cols, 'sum', time_bin, filters)
         
     def min_of_cols(self, cols, time_bin=1, filters=None):
         '''按照时间粒度计算指定列的最小值
@@ -426,15 +1217,8 @@ class NrFile(object):
                 cols:待汇总的列名
                 time_bin：时间粒度（s)
                 filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
-                time_col: 聚合的时间列名，默认‘AirTime’
         '''
-        time_col = 'LocalTime'
-        if time_col not in cols:
-            cols.append(time_col) 
-        rlt = self.get_data_of_cols(cols, val_filter=filters, format_time=True)
-        rlt = rlt[cols].set_index(time_col)
-        rlt = rlt.resample(str(time_bin)+'S').apply('min') 
-        return rlt
+        return self._resample_of_cols(cols, 'min', time_bin, filters)
         
     def max_of_cols(self, cols, time_bin=1, filters=None):
         '''按照时间粒度计算指定列的最大值
@@ -443,15 +1227,8 @@ class NrFile(object):
                 cols:待汇总的列名
                 time_bin：时间粒度（s)
                 filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
-                time_col: 聚合的时间列名，默认‘AirTime’
         '''
-        time_col = 'LocalTime'
-        if time_col not in cols:
-            cols.append(time_col) 
-        rlt = self.get_data_of_cols(cols, val_filter=filters, format_time=True)
-        rlt = rlt[cols].set_index(time_col)
-        rlt = rlt.resample(str(time_bin)+'S').apply('max') 
-        return rlt
+        return self._resample_of_cols(cols, 'max', time_bin, filters)
 
     def cnt_of_cols(self, cols, time_bin, filters=None):
         '''按照时间粒度计算指定列的次数
@@ -460,13 +1237,41 @@ class NrFile(object):
                 time_bin：时间粒度（s), 0表示不区分时间粒度
                 filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
         '''
-        time_col = 'LocalTime'
-        if time_col not in cols:
-            cols.append(time_col) 
-        rlt = self.get_data_of_cols(cols, val_filter=filters, format_time=True)
-        rlt = rlt[cols].set_index(time_col)
-        rlt = rlt.resample(str(time_bin)+'S').apply('count') 
-        return rlt
+        return self._resample_of_cols(cols, 'count', time_bin, filters)
+
+    def count_of_values(self, col, time_bin=1, filters=None):
+        '''按照时间粒度统计指定列各取值的出现次数
+
+            时间粒度编号与取值编号组合后一次bincount完成计数，不对每个时间粒度调用Python函数，
+            指定了chunksize时分块读取后累加
+            Args:
+                col: 列名
+                time_bin：时间粒度（s)
+                filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
+            Returns:
+                DataFrame，行为时间粒度，没有数据的时间粒度为0，列为升序的取值
+        '''
+        cols = [col, 'LocalTime']
+        with self._query('count_of_values', [col]) as stats:
+            rlt = self._from_rollup('value_counts', [col], time_bin, filters, stats)
+            if rlt is not None:
+                return rlt
+
+            if not self._chunksize:
+                data = self.get_data_of_cols(cols, val_filter=filters, format_time=True)
+                with stats.timed('aggregate'):
+                    return count_by_time(data[cols[1]].values, data[cols[0]].values, time_bin)
+
+            rlt = None
+            for data in self.gen_of_cols(cols, val_filter=filters, format_time=True, chunksize=self._chunksize):
+                with stats.timed('aggregate'):
+                    part = count_by_time(data[cols[1]].values, data[cols[0]].values, time_bin)
+                    rlt = part if rlt is None else rlt.add(part, fill_value=0)
+            with stats.timed('aggregate'):
+                if rlt is None or not len(rlt.index):
+                    return count_by_time(np.array([], dtype='datetime64[ns]'), [], time_bin)
+                index = pd.date_range(rlt.index[0], rlt.index[-1], freq=str(time_bin)+'S', name=cols[1])
+                return rlt.reindex(index).fillna(0).sort_index(axis=1).astype(np.int64)
 
     def value_count_of_col(self, col, time_bin=1, ratio=False, filters=None):
         '''按照时间粒度计算指定列的直方图数据
@@ -475,16 +1280,10 @@ class NrFile(object):
             time_bin：时间粒度（s)
             filters：滤波条件，字典格式{‘列名0’：值， ‘列名1’：值...}
         '''
-        time_col = 'LocalTime'
         col_name = col[0]
-        if time_col not in col:
-            col.append(time_col) 
-        rlt = self.get_data_of_cols(col, val_filter=filters, format_time=True)
-        rlt = rlt.set_index(time_col)
-        rlt = rlt[col_name]
-        rlt = rlt.resample(str(time_bin)+'S').apply(lambda x: x.value_counts()).unstack()
+        rlt = sparse_counts(self.count_of_values(col_name, time_bin, filters))
         if ratio:
-            rlt = rlt.apply(lambda x: x/x.sum(), axis=1)
+            rlt = rlt.div(rlt.sum(axis=1), axis=0)
         rlt.columns.name = col_name
         return rlt
 
@@ -0,0 +1,173 @@
+# coding=utf-8
+'''UE驻留区间
+
+   按文件读取LocalTime、CellId、UEGID，排序后向量化地切分为在线区间：同一(UEGID, CellId)
+   相邻两行的时间间隔超过gap时认为中间离开过。各文件(包括上下行)的区间合并为一张区间表，
+   之后按小区、UE查询首末出现时间、中断以及小区间切换时不需要重新扫描Log。
+'''
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+COLS = ['LocalTime', 'CellId', 'UEGID']
+INTERVAL_COLS = ['UEGID', 'CellId', 'start', 'end', 'rows']
+
+
+def intervals_of(times, cellids, uegids, gap):
+    '''计算一批行的在线区间
+
+        Args:
+            times: datetime64数组
+            cellids, uegids: 与times等长的数组
+            gap: 允许的最大间隔(s)，超过时切分为两个区间
+        Returns:
+            DataFrame，列为UEGID、CellId、start、end、rows，按(UEGID, CellId, start)排序
+    '''
+    times = np.asarray(times, dtype='datetime64[ns]')
+    valid = ~np.isnat(times) & pd.notna(cellids) & pd.notna(uegids)
+    times, cellids, uegids = times[valid].astype(np.int64), np.asarray(cellids)[valid], np.asarray(uegids)[valid]
+    order = np.lexsort((times, cellids, uegids))
+    times, cellids, uegids = times[order], cellids[order], uegids[order]
+
+    new = np.ones(len(times), dtype=bool)
+    new[1:] = (uegids[1:] != uegids[:-1]) | (cellids[1:] != cellids[:-1]) | (np.diff(times) > gap * 1e9)
+    starts = np.flatnonzero(new)
+    stops = np.append(starts[1:], len(times))
+    return pd.DataFrame({'UEGID': uegids[starts], 'CellId': cellids[starts],
+                         'start': times[starts].astype('datetime64[ns]'),
+                         'end': times[stops - 1].astype('datetime64[ns]'), 'rows': stops - starts},
+                        columns=INTERVAL_COLS)
+
+
+def merge_intervals(intervals, gap):
+    '''合并重叠或间隔不超过gap的区间，例如上下行Log、相邻文件中的区间'''
+    if intervals.empty:
+        return intervals.reset_index(drop=True)
+    data = intervals.sort_values(['UEGID', 'CellId', 'start'], kind='mergesort').reset_index(drop=True)
+    keys = [data['UEGID'], data['CellId']]
+    # 同一(UEGID, CellId)此前所有区间的最晚结束时间
+    reach = data['end'].groupby(keys).cummax().groupby(keys).shift()
+    new = reach.isna() | ((data['start'] - reach) > pd.Timedelta(seconds=gap))
+    data['interval'] = new.cumsum()
+    rlt = data.groupby('interval').agg({'UEGID': 'first', 'CellId': 'first', 'start': 'min', 'end': 'max',
+                                        'rows': 'sum'})
+    return rlt.reset_index(drop=True)
+
+
+def build(logfiles, gap=1):
+    '''由多个Log文件实例(例如上下行)逐个文件扫描生成驻留区间表
+
+        Args:
+            logfiles: NrFile列表，None跳过
+            gap: 允许的最大间隔(s)
+        Returns:
+            Residency
+    '''
+    parts = []
+    for logfile in logfiles:
+        if logfile is None:
+            continue
+        for data in logfile.gen_of_cols(COLS, format_time=True):
+            parts.append(intervals_of(data[COLS[0]].values, data[COLS[1]].values, data[COLS[2]].values, gap))
+    intervals = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=INTERVAL_COLS)
+    return Residency(merge_intervals(intervals, gap), gap)
+
+
+class Residency(object):
+    '''UE驻留区间表，每行为UE在某小区的一段连续在线时间'''
+
+    def __init__(self, intervals, gap):
+        self._intervals = intervals.sort_values(['start', 'UEGID', 'CellId'], kind='mergesort').reset_index(drop=True)
+        self._gap = gap
+
+    @property
+    def gap(self):
+        return self._gap
+
+    @property
+    def intervals(self):
+        '''区间表，列为UEGID、CellId、start、end、rows以及duration(s)，按开始时间排序'''
+        rlt = self._intervals.copy()
+        rlt['duration'] = (rlt['end'] - rlt['start']).dt.total_seconds()
+        return rlt
+
+    def _select(self, uegid=None, cellid=None):
+        data = self._intervals
+        if uegid is not None:
+            data = data[data['UEGID'] == uegid]
+        if cellid is not None:
+            data = data[data['CellId'] == cellid]
+        return data
+
+    def of_ue(self, uegid):
+        '''UE在各小区的区间，按开始时间排序'''
+        return Residency(self._select(uegid=uegid), self._gap)
+
+    def of_cell(self, cellid):
+        '''小区中所有UE的区间，按开始时间排序'''
+        return Residency(self._select(cellid=cellid), self._gap)
+
+    def at(self, time):
+        '''某一时刻在线的UE及所在小区'''
+        time = pd.Timestamp(time)
+        data = self._intervals
+        return data[(data['start'] <= time) & (data['end'] >= time)][['UEGID', 'CellId']].reset_index(drop=True)
+
+    def lifetime(self, by_cell=True):
+        '''UE的首末出现时间
+
+            Args:
+                by_cell: 为True时按(UEGID, CellId)统计，否则按UEGID统计
+            Returns:
+                DataFrame，列为first_seen、last_seen、intervals(区间数)、online(在线时长s)、rows(行数)
+        '''
+        data = self.intervals
+        keys = ['UEGID', 'CellId'] if by_cell else ['UEGID']
+        rlt = data.groupby(keys).agg(first_seen=('start', 'min'), last_seen=('end', 'max'),
+                                     intervals=('start', 'size'), online=('duration', 'sum'), rows=('rows', 'sum'))
+        return rlt
+
+    def gaps(self, min_gap=None):
+        '''UE在同一小区中的中断，即同一(UEGID, CellId)相邻两个区间之间的时间
+
+            Args:
+                min_gap: 只保留不短于min_gap(s)的中断，None表示全部
+            Returns:
+                DataFrame，列为UEGID、CellId、start(中断开始)、end(恢复)、duration(s)
+        '''
+        data = self._intervals.sort_values(['UEGID', 'CellId', 'start'], kind='mergesort')
+        resumed = data.groupby(['UEGID', 'CellId'])['start'].shift(-1)
+        rlt = pd.DataFrame({'UEGID': data['UEGID'], 'CellId': data['CellId'], 'start': data['end'],
+                            'end': resumed})[resumed.notna()]
+        rlt['duration'] = (rlt['end'] - rlt['start']).dt.total_seconds()
+        if min_gap is not None:
+            rlt = rlt[rlt['duration'] >= min_gap]
+        return rlt.sort_values('start', kind='mergesort').reset_index(drop=True)
+
+    def handovers(self):
+        '''UE在小区间的切换：按开始时间排列UE的区间，相邻区间的小区不同时为一次切换
+
+            Returns:
+                DataFrame，列为UEGID、time(进入新小区)、from_cell、to_cell、interruption(离开原小区到进入新小区的时间s)，
+                两个小区的区间有重叠时interruption为负
+        '''
+        data = self._intervals.sort_values(['UEGID', 'start'], kind='mergesort')
+        grouped = data.groupby('UEGID')
+        prev_cell, prev_end = grouped['CellId'].shift(), grouped['end'].shift()
+        changed = prev_cell.notna() & (prev_cell != data['CellId'])
+        rlt = pd.DataFrame({'UEGID': data['UEGID'], 'time': data['start'], 'from_cell': prev_cell,
+                            'to_cell': data['CellId']})[changed]
+        rlt['from_cell'] = rlt['from_cell'].astype(data['CellId'].dtype)
+        rlt['interruption'] = (rlt['time'] - prev_end[changed]).dt.total_seconds()
+        return rlt.sort_values('time', kind='mergesort').reset_index(drop=True)
+
+    def plot(self, by='CellId', ax=None, title=None):
+        '''画出各区间，纵轴为CellId或UEGID，横轴为时间'''
+        if ax is None:
+            _, ax = plt.subplots(1, 1, figsize=(10, 5))
+        data = self._intervals
+        ax.hlines(data[by], data['start'], data['end'], linewidth=6)
+        ax.plot(data['start'], data[by], '|')
+        ax.set_ylabel(by)
+        ax.set_title(title or 'Ue_Alive_time')
+        return ax
@@ -0,0 +1,6 @@
+# coding=utf-8
+import os
+import sys
+
+# 模块位于仓库根目录(nrlog、aggregate等)及util包中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
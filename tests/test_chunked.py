@@ -0,0 +1,61 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+import pytest
+from aggregate import Partial
+from util import colstore
+
+
+@pytest.fixture
+def csvfile(tmp_path):
+    '''空值、小数及字符串只出现在后面的块中，整列类型与第一块不同'''
+    n = 1000
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        'CellId': np.repeat([1, 2], n // 2),
+        'SCHD.u16RbNum': rng.integers(0, 273, n).astype(object),
+        'SCHD.u32TbSize': rng.integers(0, 100000, n).astype(object),
+        'AMC.s16InnerSinr': rng.integers(-20, 30, n).astype(object),
+        'Text': np.array(['abc'] * n, dtype=object),
+    })
+    data.loc[900:, 'SCHD.u16RbNum'] = '-'
+    data.loc[950, 'SCHD.u32TbSize'] = '1.5'
+    data.loc[999, 'Text'] = '-'
+    data.loc[998, 'Text'] = 'a much longer string'
+    filename = tmp_path / 'CMAC_dlUeTtiInfo_20210323213700.csv'
+    data.to_csv(filename, index=False)
+    return str(filename)
+
+
+def test_chunked_cache_matches_whole_file(csvfile):
+    chunks = list(colstore.iter_csv(csvfile, 128, cache=True))
+    assert len(chunks) == 8
+    pd.testing.assert_frame_equal(pd.concat(chunks), colstore.read_csv(csvfile, cache=False))
+    for compact in (False, True):
+        pd.testing.assert_frame_equal(colstore.read_csv(csvfile, cache=True, compact=compact),
+                                      colstore.read_csv(csvfile, cache=False, compact=compact))
+
+
+def test_chunked_cache_entries_match_whole_file(csvfile, tmp_path):
+    list(colstore.iter_csv(csvfile, 128, cache=True))
+    chunked = dict(colstore.ColStore(csvfile).meta['columns'])
+    other = tmp_path / 'whole'
+    other.mkdir()
+    whole_file = other / 'CMAC_dlUeTtiInfo_20210323213700.csv'
+    whole_file.write_bytes(open(csvfile, 'rb').read())
+    colstore.read_csv(str(whole_file), cache=True)
+    assert colstore.ColStore(str(whole_file)).meta['columns'] == chunked
+
+
+def test_partial_matches_resample():
+    rng = np.random.default_rng(1)
+    times = pd.Timestamp('2021-03-23 21:37:00') + pd.to_timedelta(np.sort(rng.integers(0, 60000, 5000)), 'ms')
+    data = pd.DataFrame({'LocalTime': times, 'v': rng.integers(0, 100, 5000)})
+    expected = data.set_index('LocalTime')[['v']].resample('1S')
+    for how in ('sum', 'mean', 'min', 'max', 'count'):
+        partial = Partial(['v'], how, 1)
+        for start in range(0, len(data), 300):
+            partial.update(data.iloc[start:start + 300])
+        pd.testing.assert_frame_equal(partial.result(), expected.apply(how), check_freq=False)
+        # 合并后只保留一份，重复取结果不再重新合并
+        assert all(len(parts) == 1 for parts in partial._parts.values())
@@ -0,0 +1,42 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+import pytest
+from util import dcibits_prase
+
+DL = ['0xc0884680e80e00', '0xc0884672c82e00', '0xc0886660888e00']
+
+
+def test_null_payloads_give_null_fields():
+    payloads = pd.Series([DL[0], np.nan, '-', DL[1], None, '', DL[0], DL[2]], index=list('abcdefgh'))
+    rlt = dcibits_prase.parse_dcis(payloads, '1_1')
+    expected = dcibits_prase.parse_dcis(payloads[['a', 'd', 'g', 'h']], '1_1')
+    assert list(rlt.index) == list(payloads.index)
+    assert rlt.loc[['b', 'c', 'e', 'f']].isna().all().all()
+    assert rlt.notna().loc[['a', 'd', 'g', 'h']].all().all()
+    assert isinstance(rlt['dl_mcs'].dtype, pd.UInt8Dtype) and rlt['dl_Prbnum'].dtype == pd.Int16Dtype()
+    pd.testing.assert_frame_equal(rlt.loc[expected.index].astype(np.int64), expected.astype(np.int64))
+    for name, payload in zip('adh', [DL[0], DL[1], DL[2]]):
+        pd.testing.assert_series_equal(rlt.loc[name].astype(np.int64),
+                                       dcibits_prase.parse_dci_1_1(payload).astype(np.int64), check_names=False)
+
+
+def test_all_null_payloads():
+    rlt = dcibits_prase.parse_dcis(['-', np.nan], '0_0')
+    assert len(rlt.index) == 2 and rlt.isna().all().all()
+
+
+def test_too_short_payload_names_row():
+    payloads = pd.Series([DL[0], '0xc088'], index=['183/12', '183/16'])
+    with pytest.raises(ValueError, match='183/16'):
+        dcibits_prase.parse_dcis(payloads, '1_1')
+
+
+def test_payload_over_64_bits_names_row():
+    with pytest.raises(ValueError, match='64.*2'):
+        dcibits_prase.parse_dcis([DL[0], DL[1], '0x' + 'f' * 17], '1_1')
+
+
+def test_non_hex_payload_names_row():
+    with pytest.raises(ValueError, match="行1 '0x1g'"):
+        dcibits_prase.hex2uint(['0x12', '0x1g'])
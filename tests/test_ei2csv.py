@@ -0,0 +1,85 @@
+# coding=utf-8
+import os
+import pandas as pd
+import pytest
+from util import ei2csv
+
+
+class FakeConverter(ei2csv.Converter):
+    '''记录转换过的文件，名字中含有bad的文件转换失败'''
+
+    name = 'fake'
+
+    def __init__(self):
+        self.converted = []
+
+    def convert(self, eifile, csvfile):
+        name = os.path.basename(eifile)
+        if 'bad' in name:
+            raise ValueError('corrupted: %s' % name)
+        self.converted.append(name)
+        return pd.DataFrame({'CellId': [1, 2], 'UEGID': [3.0, None]})
+
+
+@pytest.fixture
+def eidir(tmp_path):
+    for name in ('a.ei', 'b.ei', 'bad.ei'):
+        (tmp_path / name).write_bytes(b'\0' * 16)
+    return str(tmp_path)
+
+
+def _convert(directory, converter, **kwargs):
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.ei'))
+    return ei2csv.convert(directory, names, converter=converter, executor='thread', max_workers=2, verbose=False,
+                          **kwargs)
+
+
+def test_converter_is_abstract():
+    with pytest.raises(TypeError):
+        ei2csv.Converter()
+
+
+def test_convert_reports_failures(eidir):
+    converter = FakeConverter()
+    rlt = _convert(eidir, converter)
+    assert rlt.loc[['a.ei', 'b.ei'], 'status'].tolist() == ['converted', 'converted']
+    assert rlt.loc['bad.ei', 'status'] == 'failed'
+    assert 'corrupted: bad.ei' in rlt.loc['bad.ei', 'error']
+    assert sorted(converter.converted) == ['a.ei', 'b.ei']
+    data = pd.read_csv(os.path.join(eidir, 'a.csv'), na_values='-')
+    assert data['UEGID'].isna().tolist() == [False, True]
+
+
+def test_unchanged_files_are_skipped(eidir):
+    _convert(eidir, FakeConverter())
+    converter = FakeConverter()
+    rlt = _convert(eidir, converter)
+    assert rlt.loc[['a.ei', 'b.ei'], 'status'].tolist() == ['skipped', 'skipped']
+    assert rlt.loc['bad.ei', 'status'] == 'failed'
+    assert converter.converted == []
+
+    # EI文件更新后重新转换
+    path = os.path.join(eidir, 'b.ei')
+    st = os.stat(os.path.join(eidir, 'b.csv'))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    rlt = _convert(eidir, converter)
+    assert rlt.loc['b.ei', 'status'] == 'converted'
+    assert converter.converted == ['b.ei']
+    rlt = _convert(eidir, converter, force=True)
+    assert sorted(converter.converted) == ['a.ei', 'b.ei', 'b.ei']
+
+
+def test_failed_write_is_not_taken_as_converted(eidir, monkeypatch):
+    def to_csv(self, path, **kwargs):
+        with open(path, 'w') as f:
+            f.write('CellId,UEGID\n1,')
+        raise OSError('disk full')
+
+    monkeypatch.setattr(pd.DataFrame, 'to_csv', to_csv)
+    rlt = _convert(eidir, FakeConverter())
+    assert rlt['status'].tolist() == ['failed'] * 3
+    assert sorted(os.listdir(eidir)) == ['a.ei', 'b.ei', 'bad.ei']
+
+    monkeypatch.undo()
+    rlt = _convert(eidir, FakeConverter())
+    assert rlt.loc[['a.ei', 'b.ei'], 'status'].tolist() == ['converted', 'converted']
@@ -0,0 +1,70 @@
+# coding=utf-8
+import functools
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import const
+from nrlog import NrLog
+from util import ei2csv, eireader, gen_ttilog
+
+
+@pytest.fixture
+def layouts():
+    return eireader.load_layouts(eireader.LAYOUTS_DIR)
+
+
+def _generate(directory, ei):
+    return gen_ttilog.generate(directory, files=2, rows=2000, filetypes=[const.NR_FILE_DLSCHD], seed=3, ei=ei)
+
+
+def test_shipped_layouts_cover_generated_columns(layouts):
+    for filetype in (const.NR_FILE_DLSCHD, const.NR_FILE_ULSCHD):
+        data = gen_ttilog.make_frame(filetype, pd.Timestamp('2021-03-23 21:37:00'), 10,
+                                     rng=np.random.default_rng(0))
+        assert layouts[filetype].columns == list(data.columns)
+
+
+def test_round_trip(tmp_path, layouts):
+    csvdir, eidir = str(tmp_path / 'csv'), str(tmp_path / 'ei')
+    names = _generate(csvdir, ei=False)[const.NR_FILE_DLSCHD]
+    eifiles = _generate(eidir, ei=True)[const.NR_FILE_DLSCHD]
+    for name, eifile in zip(names, eifiles):
+        expected = pd.read_csv(os.path.join(csvdir, name), na_values='-')
+        ei = eireader.EiFile(os.path.join(eidir, eifile), layouts[const.NR_FILE_DLSCHD])
+        assert ei.contiguous and not ei.column('CellId').flags.owndata
+        pd.testing.assert_frame_equal(ei.to_frame(), expected)
+        pd.testing.assert_frame_equal(ei.to_frame(['UEGID', 'LocalTime']), expected[['LocalTime', 'UEGID']])
+        ei.close()
+
+
+def test_skips_garbage_between_records(tmp_path, layouts):
+    layout = layouts[const.NR_FILE_DLSCHD]
+    csvdir = str(tmp_path / 'csv')
+    name = _generate(csvdir, ei=False)[const.NR_FILE_DLSCHD][0]
+    expected = pd.read_csv(os.path.join(csvdir, name), na_values='-')
+    raw = layout.pack(expected).tobytes()
+    size = layout.itemsize
+    # 开头有垃圾数据，第10条记录只写了一半且后跟垃圾数据，结尾截断半条记录
+    data = (b'\x01\x02\x03' + raw[:10 * size] + raw[10 * size:10 * size + size // 2] + b'\x00' * 7 +
+            raw[11 * size:] + raw[:size // 2])
+    expected = expected.drop(10).reset_index(drop=True)
+    filename = str(tmp_path / 'garbage.ei')
+    with open(filename, 'wb') as f:
+        f.write(data)
+    ei = eireader.EiFile(filename, layout)
+    assert not ei.contiguous and len(ei) == len(expected.index)
+    pd.testing.assert_frame_equal(ei.to_frame(), expected)
+    ei.close()
+
+
+def test_nrlog_reads_converted_ei_files(tmp_path, layouts):
+    csvdir, eidir = str(tmp_path / 'csv'), str(tmp_path / 'ei')
+    _generate(csvdir, ei=False)
+    _generate(eidir, ei=True)
+    reader = functools.partial(eireader.read, layout=layouts[const.NR_FILE_DLSCHD])
+    cols = ['LocalTime', 'CellId', 'UEGID', 'SCHD.u32TbSize', 'ACK.u8AckInfo']
+    expected = NrLog(csvdir).get_dlschd_logfile().get_data_of_cols(cols, format_time=True)
+    data = NrLog(eidir, converter=ei2csv.ReaderConverter(reader)).get_dlschd_logfile().get_data_of_cols(
+        cols, format_time=True)
+    pd.testing.assert_frame_equal(data, expected)
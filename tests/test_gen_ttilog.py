@@ -0,0 +1,15 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+import const
+from util import gen_ttilog
+
+
+def test_uegids_are_global_and_non_zero():
+    data = gen_ttilog.make_frame(const.NR_FILE_ULSCHD, pd.Timestamp('2021-03-23 21:37:00'), 5000, seconds=20,
+                                 cells=3, ues=8, rng=np.random.default_rng(0))
+    assert len(data.index) == 5000
+    assert data['UEGID'].between(1, 24).all()
+    assert (data.groupby('UEGID')['CellId'].nunique() == 1).all()
+    assert ((data['UEGID'] - 1) // 8 + 1 == data['CellId']).all()
+    assert data['LocalTime'].is_monotonic_increasing
@@ -0,0 +1,12 @@
+# coding=utf-8
+import const
+from nrlog import NrLog
+from util import gen_ttilog
+
+
+def test_uegid_zero_is_filtered(tmp_path):
+    gen_ttilog.generate(str(tmp_path), files=1, rows=200, filetypes=[const.NR_FILE_DLSCHD])
+    log = NrLog(str(tmp_path))
+    assert log.get_dlschd_logfile(uegid=0).id_filter == {'UEGID': [0]}
+    assert log.get_dlschd_logfile(cellid=0).id_filter == {'CellId': [0]}
+    assert log.get_dlschd_logfile(uegid=0).lines == 0
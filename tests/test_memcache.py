@@ -0,0 +1,31 @@
+# coding=utf-8
+import numpy as np
+from util.memcache import ColumnCache, nbytes_of
+
+
+def test_object_column_counts_string_sizes():
+    values = np.array(['21:37:00:123'] * 1000, dtype=object)
+    assert nbytes_of(values) > values.nbytes * 5
+
+
+def test_budget_applies_to_object_columns():
+    cache = ColumnCache(budget=50000)
+    cache.put('strings', np.array(['21:37:00:123'] * 1000, dtype=object))
+    assert cache.get('strings') is None
+    assert cache.nbytes == 0
+
+    cache.put('ints', np.arange(1000))
+    assert cache.get('ints') is not None
+    assert cache.nbytes == 8000
+
+
+def test_lru_eviction_uses_recorded_sizes():
+    cache = ColumnCache(budget=20000)
+    cache.put('a', np.arange(1000))
+    cache.put('b', np.arange(1000))
+    cache.get('a')
+    cache.put('c', np.arange(1000))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.nbytes == 16000
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,101 @@
+# coding=utf-8
+import os
+import shutil
+import pandas as pd
+import pytest
+import const
+import multilog
+from multilog import MultiLog
+from nrlog import NrLog
+from ulschd import UlSchd
+from dlschd import DlSchd
+from util import gen_ttilog
+
+
+@pytest.fixture(scope='module')
+def logdirs(tmp_path_factory):
+    '''两天的Log分别在两个目录中，all目录包含全部文件'''
+    root = tmp_path_factory.mktemp('multi')
+    alldir = root / 'all'
+    alldir.mkdir()
+    for i, start in enumerate(['2021-03-23 21:37:00', '2021-03-24 21:37:00']):
+        directory = str(root / ('d%d' % i))
+        names = gen_ttilog.generate(directory, files=2, rows=3000, start=start, seed=i)
+        for name in sum(names.values(), []):
+            shutil.copy(os.path.join(directory, name), str(alldir))
+    return str(root / 'd*'), str(alldir)
+
+
+@pytest.fixture
+def multi(logdirs):
+    with MultiLog(logdirs[0], executor='thread', max_workers=2) as log:
+        yield log
+
+
+def _expected(alldir, filetype, name, metric, time_bin=1, cellid=1):
+    cell = NrLog(alldir).get_cell(cellid)
+    schd = cell.dl if filetype == const.NR_FILE_DLSCHD else cell.ul
+    return schd.compute([(name, metric)], time_bin)[name]
+
+
+def _assert_equal(rlt, expected):
+    '''首尾没有数据的时间粒度可能不同，只比较共同的时间范围'''
+    expected = expected.reindex(columns=rlt.columns).astype(float)
+    rlt = rlt.astype(float)
+    index = rlt.index.intersection(expected.index)
+    for data in (rlt, expected):
+        assert (data.drop(index).fillna(0) == 0).all().all()
+    pd.testing.assert_frame_equal(rlt.loc[index], expected.loc[index], check_names=False, check_freq=False,
+                                  check_column_type=False)
+
+
+def test_metric_arguments_are_forwarded(multi, logdirs):
+    ul, dl = multi.get_cell(1).ul, multi.get_cell(1).dl
+    metric = UlSchd.METRICS['rpt_maxbsr'].replace(filters={'BSR.u32LchGrpId': [3]})
+    expected = _expected(logdirs[1], const.NR_FILE_ULSCHD, 'rpt_maxbsr', metric, 10)
+    _assert_equal(ul.rpt_maxbsr(lchgrp=3, time_bin=10), expected)
+    _assert_equal(ul.rpt_maxbsr(3, 10), expected)
+    assert not ul.rpt_maxbsr(time_bin=10).equals(ul.rpt_maxbsr(lchgrp=3, time_bin=10))
+
+    metric = DlSchd.METRICS['bler_of_slot'].replace(slot=4)
+    _assert_equal(dl.bler_of_slot(slot=4), _expected(logdirs[1], const.NR_FILE_DLSCHD, 'bler_of_slot', metric))
+    _assert_equal(dl.bler_of_slot(1, 4), _expected(logdirs[1], const.NR_FILE_DLSCHD, 'bler_of_slot', metric))
+
+
+def test_metric_without_method(multi, logdirs):
+    ul = multi.get_cell(1).ul
+    metric = UlSchd.METRICS['schdfail_rsn_by_time']
+    _assert_equal(ul.schdfail_rsn_by_time(time_bin=5),
+                  _expected(logdirs[1], const.NR_FILE_ULSCHD, 'schdfail_rsn_by_time', metric, 5))
+    for directory, rlt in ul.schdfail_reasons().items():
+        counts = NrLog(directory).get_cell(1).ul.compute(['schdfail_rsn_by_time'])['schdfail_rsn_by_time'].sum()
+        assert rlt.to_dict() == {const.NR_SCHD_FAIL_RSNS[int(code)]: n for code, n in counts.items() if n}
+
+
+def test_unsupported_arguments_raise(multi):
+    with pytest.raises(TypeError):
+        multi.get_cell(1).ul.pathloss(ax='figure')
+    with pytest.raises(TypeError):
+        multi.get_cell(1).ul.rpt_maxbsr(unknown=1)
+    with pytest.raises(AttributeError):
+        multi.get_cell(1).ul.not_a_method
+
+
+def test_other_methods_run_per_directory(multi, logdirs):
+    rlt = multi.get_cell(1).ul.ue_summary()
+    assert list(rlt) == multi.directories
+    for directory, summary in rlt.items():
+        pd.testing.assert_frame_equal(summary, NrLog(directory).get_cell(1).ul.ue_summary())
+
+
+def test_pool_and_logs_are_kept(logdirs):
+    log = MultiLog(logdirs[0], executor='thread', max_workers=2)
+    pool = log._pool
+    directory = log.directories[0]
+    instance = log.log(directory)
+    log.get_cell(1).dl.throuput()
+    log.get_cell(1).ul.compute(['throuput', 'schd_mcs'])
+    assert log._pool is pool and log.log(directory) is instance
+    log.close()
+    assert log._pool is None
+    assert not [key for key in multilog._logs if key[0] in log.directories]
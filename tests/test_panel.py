@@ -0,0 +1,36 @@
+# coding=utf-8
+import pandas as pd
+import pytest
+from aggregate import available
+from nrlog import NrLog
+from util import gen_ttilog
+
+
+@pytest.fixture(scope='module')
+def log(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('panel'))
+    gen_ttilog.generate(directory, cells=2, ues=6, files=2, rows=3000, seconds=20, seed=4)
+    return NrLog(directory)
+
+
+@pytest.mark.parametrize('link', ['dl', 'ul'])
+@pytest.mark.parametrize('time_bin', [1, 5])
+def test_panel_matches_per_ue_compute(log, link, time_bin):
+    cell = log.get_cell(2)
+    schd = getattr(cell, link)
+    metrics = available(schd.UE_METRICS, schd.METRICS, schd.log.header)
+    rlt = schd.ue_panel(time_bin=time_bin)
+    assert sorted(set(rlt.columns.get_level_values(2))) == sorted(cell.uegids)
+    for uegid in sorted(cell.uegids):
+        expected = getattr(cell.get_ue(uegid), link).compute(metrics, time_bin)
+        got = rlt.xs(uegid, axis=1, level=2).loc[expected.index[0]:expected.index[-1], expected.columns]
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False, check_freq=False, check_names=False)
+
+
+def test_summary_totals_match_compute(log):
+    cell = log.get_cell(1)
+    summary = cell.ul.ue_summary(['throuput', 'schd_mcs'], time_bin=1)
+    for uegid in sorted(cell.uegids):
+        expected = cell.get_ue(uegid).ul.compute(['throuput'], 1)['throuput']
+        assert summary.loc[uegid, ('throuput', 'TB.u16TbSize', 'total')] == expected['TB.u16TbSize'].sum()
+    assert ('schd_mcs', 'TB.u8Mcs', 'total') not in summary.columns
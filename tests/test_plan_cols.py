@@ -0,0 +1,41 @@
+# coding=utf-8
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import const
+from nrlog import NrLog
+from util import gen_ttilog
+
+
+@pytest.fixture
+def logdir(tmp_path):
+    '''第二个文件新增了一列，例如版本升级后的Log'''
+    names = gen_ttilog.generate(str(tmp_path), files=2, rows=500, filetypes=[const.NR_FILE_DLSCHD], seed=1)
+    filename = os.path.join(str(tmp_path), names[const.NR_FILE_DLSCHD][1])
+    data = pd.read_csv(filename)
+    data['EXTRA.u8Added'] = 7
+    data.to_csv(filename, index=False, na_rep='-')
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize('cache', [True, False])
+def test_unknown_column_raises_key_error(logdir, cache):
+    logfile = NrLog(logdir, cache=cache).get_dlschd_logfile()
+    with pytest.raises(KeyError, match='NOT.uExist'):
+        logfile.get_data_of_cols(['CellId', 'NOT.uExist'])
+
+
+@pytest.mark.parametrize('cache', [True, False])
+def test_column_of_later_file_is_read(logdir, cache):
+    logfile = NrLog(logdir, cache=cache).get_dlschd_logfile()
+    assert logfile.header[-1] == 'EXTRA.u8Added'
+    data = logfile.get_data_of_cols(['CellId', 'EXTRA.u8Added'])
+    assert list(data.columns) == ['CellId', 'EXTRA.u8Added']
+    assert len(data.index) == 1000
+    assert data['EXTRA.u8Added'].iloc[:500].isna().all()
+    assert (data['EXTRA.u8Added'].iloc[500:] == 7).all()
+    chunks = list(logfile.gen_of_cols(['CellId', 'EXTRA.u8Added'], chunksize=128))
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), data.reset_index(drop=True))
+    counts = logfile.get_data_of_cols(['EXTRA.u8Added'], val_filter={'EXTRA.u8Added': [7]})
+    assert np.array_equal(counts['EXTRA.u8Added'].values, np.full(500, 7.0))
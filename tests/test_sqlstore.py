@@ -0,0 +1,79 @@
+# coding=utf-8
+import pandas as pd
+import pytest
+import const
+from nrlog import NrLog
+from util import gen_ttilog, sqlstore
+
+QUERIES = [
+    'SELECT UEGID, COUNT(*) AS cnt, SUM("TB.u16TbSize") AS tb FROM CMAC_ulUeTtiInfo '
+    'WHERE CellId = 1 AND UEGID IN (3, 5, 7) GROUP BY UEGID ORDER BY UEGID',
+    "SELECT * FROM CMAC_ulUeTtiInfo WHERE (CellId = 2) AND LocalTime >= '2021-03-23 21:37:50' "
+    "AND LocalTime < '2021-03-23 21:38:05' ORDER BY LocalTime, UEGID",
+    "SELECT CellId, COUNT(*) AS cnt FROM CMAC_ulUeTtiInfo "
+    "WHERE LocalTime BETWEEN '2021-03-23 21:37:10' AND '2021-03-23 21:37:12.500' GROUP BY CellId",
+    'SELECT CellId, COUNT(*) AS cnt FROM CMAC_ulUeTtiInfo WHERE CellId = 1 OR UEGID = 40 GROUP BY CellId',
+]
+
+
+@pytest.fixture(scope='module')
+def logdir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('sql'))
+    gen_ttilog.generate(directory, files=3, rows=2000, filetypes=[const.NR_FILE_ULSCHD], seed=2)
+    return directory
+
+
+def _rows(log):
+    return log._sqlstore._conn.execute('SELECT COUNT(*) FROM CMAC_ulUeTtiInfo').fetchone()[0]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_pushdown_matches_full_load(logdir, query, monkeypatch):
+    log = NrLog(logdir)
+    rlt = log.sql(query)
+    loaded = _rows(log)
+    monkeypatch.setattr(sqlstore, 'pushdown', lambda query: (None, None))
+    full = NrLog(logdir)
+    expected = full.sql(query)
+    pd.testing.assert_frame_equal(rlt, expected)
+    assert len(rlt.index) > 0
+    if ' OR ' in query:
+        assert loaded == _rows(full)
+    else:
+        assert loaded < _rows(full)
+
+
+def test_pushdown_terms():
+    id_filter, interval = sqlstore.pushdown(
+        "SELECT * FROM t WHERE t.CellId IN (1, 2) AND cellid = 2 AND \"UEGID\" = 3 "
+        "AND LocalTime > '2021-03-23 21:37:10' AND LocalTime <= '2021-03-23 21:38'")
+    assert id_filter == {'CellId': [2], 'UEGID': [3]}
+    assert interval == [pd.Timestamp('2021-03-23 21:37:10'), pd.Timestamp('2021-03-23 21:38')]
+    for query in ['SELECT * FROM t a JOIN t b ON a.UEGID = b.UEGID WHERE a.CellId = 1',
+                  'SELECT * FROM t a, t b WHERE a.CellId = 1',
+                  'SELECT * FROM t WHERE UEGID IN (SELECT UEGID FROM t WHERE CellId = 1)',
+                  'SELECT * FROM t WHERE NOT CellId = 1',
+                  'SELECT * FROM t WHERE CellId = 1 + UEGID']:
+        assert sqlstore.pushdown(query) == (None, None)
+    # 只有时分秒的时间不下推
+    assert sqlstore.pushdown("SELECT * FROM t WHERE CellId = 1 AND LocalTime >= '21:37:10'") == ({'CellId': [1]}, None)
+    assert sqlstore.pushdown("SELECT * FROM t WHERE LocalTime BETWEEN '21:37:10' AND '2021-03-23 21:38'") == \
+        (None, [pd.Timestamp.min, pd.Timestamp('2021-03-23 21:38')])
+    assert sqlstore.pushdown("SELECT * FROM t WHERE LocalTime >= '12:00:01'") == (None, None)
+
+
+def test_columns_matched_case_insensitively(logdir):
+    log = NrLog(logdir)
+    rlt = log.sql('select uegid, sum("tb.u16tbsize") as tb from CMAC_ulUeTtiInfo where cellid = 1 group by uegid')
+    assert 'TB.u16TbSize' in log._sqlstore.tables[const.NR_FILE_ULSCHD]
+    assert 'PHR.u16PathLoss' not in log._sqlstore.tables[const.NR_FILE_ULSCHD]
+    assert len(rlt.index) > 0
+
+
+def test_unfiltered_select_star_rejected_on_large_log(logdir, monkeypatch):
+    monkeypatch.setattr(sqlstore, 'MAX_STAR_ROWS', 1000)
+    log = NrLog(logdir)
+    with pytest.raises(ValueError, match='CMAC_ulUeTtiInfo'):
+        log.sql('SELECT * FROM CMAC_ulUeTtiInfo LIMIT 5')
+    assert len(log.sql('SELECT * FROM CMAC_ulUeTtiInfo WHERE CellId = 1 LIMIT 5').index) == 5
+    assert len(log.sql('SELECT UEGID FROM CMAC_ulUeTtiInfo LIMIT 5').index) == 5
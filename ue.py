@@ -3,10 +3,13 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import const
+import residency
 from dlschd import DlSchdUe
 from ulschd import UlSchdUe
+from util.querystats import traced
 
 
+@traced
 class Ue(object):
     def __init__(self, ullog, dllog, cell, uegid):
         self._uegid = uegid
@@ -30,33 +33,26 @@ class Ue(object):
     def ul(self):
         return getattr(self, '_ul', None)
     
-    def show_livetime(self):
-        '''
-            画出UE在各小区存在的时间
+    def residency(self, gap=1):
+        '''UE的驻留区间表(residency.Residency)，由本UE的上下行Log一次扫描得到，结果按gap缓存
+
+            Args:
+                gap: 同一小区中相邻两次出现的间隔超过gap(s)时认为中间离开过
         '''
-        logs = []
-        if hasattr(self, '_dl'):
-            logs.append(self.dl.log)
-        if hasattr(self, '_ul'):
-            logs.append(self.ul.log)
+        if not hasattr(self, '_residencies'):
+            self._residencies = {}
+        if gap not in self._residencies:
+            logs = [self.dl.log if self.dl else None, self.ul.log if self.ul else None]
+            self._residencies[gap] = residency.build(logs, gap)
+        return self._residencies[gap]
 
-        if 0 == len(logs):
+    def show_livetime(self, gap=1):
+        '''
+            画出UE在各小区存在的时间，返回驻留区间
+        '''
+        if self.dl is None and self.ul is None:
             return
 
-        rlt = pd.DataFrame()
-        cols = ['LocalTime', 'CellId']
-        for log in logs:
-            data = self.dl.log.get_data_of_cols(cols)
-            group_data = data[cols[1]].groupby(data[cols[0]]).apply(lambda x: x.value_counts())
-            if 0 == group_data.size:
-                continue
-            group_data = group_data.unstack(level=1, fill_value=0)
-            rlt = rlt.add(group_data, fill_value=0)
-        
-        rlt[rlt==0]=None
-        rlt.columns.name = 'CellId'
-        rlt.index.name = 'Time'
-        fig, ax = plt.subplots(1, 1)
-        rlt.plot(ax=ax, kind='line', title='Ue_Alive_time',figsize=(10,5))
-        
-        return
\ No newline at end of file
+        rlt = self.residency(gap)
+        rlt.plot(title='Ue_Alive_time')
+        return rlt.intervals
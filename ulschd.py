@@ -3,11 +3,34 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import const
+from aggregate import Metric, MetricsMixin, UePanelMixin, bler_of_counts, count_by_time
+from util.querystats import traced
 
 
-class UlSchd():
+@traced
+class UlSchd(MetricsMixin):
     '''上行调度Log分析类'''
 
+    # 可批量计算的指标，与同名方法的统计口径一致，没有同名方法的指标均按时间粒度统计
+    METRICS = {
+        'throuput': Metric(['TB.u16TbSize'], 'sum'),
+        'schd_rbnum': Metric(['GRANT.u16RbNum'], 'mean'),
+        'schd_uecnt': Metric(['GRANT.u8HarqId'], 'count'),
+        'schd_mcs': Metric(['TB.u8Mcs'], 'mean'),
+        'harqfail_cnt': Metric(['CRCI.u8IsHarqFail'], 'count'),
+        'pathloss': Metric(['PHR.u16PathLoss'], 'mean'),
+        'singlerbsinr': Metric(['PUSCH_SINR.s16SingleRbSINR'], 'mean'),
+        'show_amc': Metric(['PUSCH_SINR.s16SingleRbSINR', 'AMC.s16DeltaMcs', 'AMC.u8StdMcs'], 'mean'),
+        'rpt_minbsr': Metric(['BSR.u32LchGrpBsr'], 'min', filters={'BSR.u32LchGrpId': [7]}),
+        'rpt_maxbsr': Metric(['BSR.u32LchGrpBsr'], 'max', filters={'BSR.u32LchGrpId': [7]}),
+        'bler_of_slot': Metric(['CRCI.u8AckInfo', 'CRCI.u32DemTime'], 'bler', dropna=True),
+        # schdfail_reasons()汇总整个Log并换成原因名，这里是按时间粒度统计的原因编号
+        'schdfail_rsn_by_time': Metric(['SCHD_FAIL_RSN.u32UeSchdFailRsn'], 'value_counts'),
+    }
+
+    # 方法参数对应的指标过滤列，联合Log计算指标时把参数转换为过滤条件
+    METRIC_FILTERS = {'lchgrp': 'BSR.u32LchGrpId'}
+
     def __init__(self, log, cell=None, uegid=None):
         self._type = const.NR_FILE_ULSCHD
         self._log = log
@@ -16,7 +39,7 @@ class UlSchd():
         
         if cell:
             self._id_filter['CellId'] = [cell.cellid]
-        if uegid:
+        if uegid is not None:
             self._id_filter['UEGID'] = [uegid]
 
     @property
@@ -26,7 +49,7 @@ class UlSchd():
     @property
     def log(self):
         return self._log
-                        
+
     def harqfail_cnt(self, time_bin=1):
         '''画图描述指定粒度下的harqfail次数
 
@@ -176,22 +199,14 @@ class UlSchd():
         '''
         
         ack_cols = ['LocalTime', 'CRCI.u8AckInfo', 'CRCI.u32DemTime']
-        rlt = pd.DataFrame()
-        data = self._log.get_data_of_cols(ack_cols, format_time=True)
-        data = data.dropna(how='any')
-        rlt = pd.concat([rlt, data])
-
-        rlt = rlt.set_index(ack_cols[0]).astype(int)
-        rlt = rlt[rlt[ack_cols[2]]%256 == slot] if slot < 20 else rlt
-        rlt = rlt[ack_cols[1]]
+        rlt = self._log.get_data_of_cols(ack_cols, format_time=True).dropna(how='any')
+        times, ack = rlt[ack_cols[0]].values, rlt[ack_cols[1]].values.astype(int)
+        if slot < 20:
+            selected = rlt[ack_cols[2]].values.astype(int) % 256 == slot
+            times, ack = times[selected], ack[selected]
+        rlt = bler_of_counts(count_by_time(times, ack, time_bin))
         rlt.name = 'bler_of_slot'
-
-        def bler(data):
-            vc = data.value_counts().reindex([0,1,2],fill_value=0)
-            total = vc[0] + vc[1] + vc[2]
-            return (vc[0] + vc[2]) * 100 / total if total != 0 else (vc[0] + vc[2]) * 100 / (total + 1)
-
-        return rlt.resample(str(time_bin)+'S').apply(bler)
+        return rlt
 
     def find_selfmaintain(self):
         '''查找是否存在自维护, 并输出相关信息'''
@@ -207,12 +222,17 @@ class UlSchd():
         data = self._log.get_data_of_cols(cols)
         return data[data[cols[3]] == 1]
 
-class UlSchdCell(UlSchd):
+@traced
+class UlSchdCell(UlSchd, UePanelMixin):
     '''上行调度Log分析类'''
 
+    UE_METRICS = ['throuput', 'schd_rbnum', 'schd_mcs', 'bler_of_slot', 'pathloss', 'singlerbsinr', 'rpt_maxbsr']
+
     def __init__(self, log, cell):
         super(UlSchdCell, self).__init__(log, cell)
 
+
+@traced
 class UlSchdUe(UlSchd):
     '''上行调度UE分析类'''
 
@@ -0,0 +1,634 @@
+# coding=utf-8
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+import numpy as np
+import pandas as pd
+from util import schema
+
+# 缓存目录名，位于Log目录下
+CACHE_DIR = '.svinsight'
+
+# 缓存格式版本，版本不一致的缓存视为失效
+CACHE_VERSION = 2
+
+# 按行号读取的行数低于该比例时，不把整列加载到内存缓存中，例如单个UE
+SPARSE_RATIO = 0.1
+
+_meta_lock = threading.Lock()
+
+
+class ParseStats(object):
+    '''一次查询的读取统计
+
+       计数：解析的文件数、列数、文件字节数，直接从缓存读取的列数，内存缓存命中的列数，
+       读取的文件数、读取的行数以及过滤后保留的行数；
+       耗时(s)：各阶段的累计耗时，键为"阶段_s"，阶段见STAGES；并行加载时为各文件耗时之和，可能超过查询的总耗时
+    '''
+
+    FIELDS = ('files', 'columns', 'bytes', 'cached_columns', 'memcache_hits', 'files_read', 'rows_read', 'rows_kept')
+
+    # parse: 解析CSV，convert: 列转换(时间转换、紧凑格式)，cache_write: 写入列缓存，cache_read: 读取列缓存，
+    # filter: 按时间、ID过滤，concat: 合并各文件的数据，aggregate: 按时间聚合，rollup: 由预聚合结果计算
+    STAGES = ('parse', 'convert', 'cache_write', 'cache_read', 'filter', 'concat', 'aggregate', 'rollup')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+        self._counts.update(dict.fromkeys([stage + '_s' for stage in self.STAGES], 0.0))
+
+    def __getstate__(self):
+        return self._counts
+
+    def __setstate__(self, counts):
+        self.__init__()
+        self._counts.update(counts)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                self._counts[name] = self._counts[name] + count
+
+    def merge(self, other):
+        '''合并其他ParseStats，例如子进程中的统计'''
+        self.add(**other._counts)
+
+    def parsed(self, filename, cols):
+        '''记录一次CSV解析，pandas即使只转换部分列也需要扫描整个文件'''
+        self.add(files=1, columns=len(cols), bytes=os.path.getsize(filename))
+
+    @contextmanager
+    def timed(self, stage):
+        '''累计with块的耗时到stage阶段'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(**{stage + '_s': time.perf_counter() - start})
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def to_series(self):
+        return pd.Series(self.to_dict(), name='parse_stats')
+
+
+def timed(stats, stage):
+    '''stats为None时不计时'''
+    return stats.timed(stage) if stats is not None else nullcontext()
+
+
+class ColStore(object):
+    '''CSV文件的列式缓存
+
+       每个CSV文件在缓存目录下对应一个子目录，每列保存为一个npy文件，
+       meta.json记录源文件的大小、修改时间、表头以及已缓存的列，
+       源文件大小或修改时间变化后缓存自动失效。
+       整数列按字段名前缀保存为最窄的类型，空值单独保存掩码。
+    '''
+
+    def __init__(self, filename):
+        '''初始化缓存实例
+
+           Args:
+               filename: CSV文件全路径
+        '''
+        self._filename = filename
+        directory, name = os.path.split(filename)
+        self._path = os.path.join(directory, CACHE_DIR, name)
+        self._meta = None
+
+    @property
+    def path(self):
+        return self._path
+
+    def _stat(self):
+        st = os.stat(self._filename)
+        return {'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+    def _load_meta(self):
+        '''读取并校验meta，源文件变化时返回新的空meta'''
+        stat = self._stat()
+        try:
+            with open(os.path.join(self._path, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+            if (meta['size'], meta['mtime'], meta.get('version')) == (stat['size'], stat['mtime'], CACHE_VERSION):
+                return meta
+        except (OSError, ValueError, KeyError):
+            pass
+        stat.update({'version': CACHE_VERSION, 'header': None, 'columns': {}, 'arrays': {}, 'tables': {}})
+        return stat
+
+    def _save_meta(self):
+        tmpname = os.path.join(self._path, 'meta.json.%d.tmp' % threading.get_ident())
+        with open(tmpname, 'w') as f:
+            json.dump(self._meta, f)
+        os.replace(tmpname, os.path.join(self._path, 'meta.json'))
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            self._meta = self._load_meta()
+        return self._meta
+
+    @property
+    def header(self):
+        '''CSV文件的所有列名'''
+        if self.meta['header'] is None:
+            self.meta['header'] = list(pd.read_csv(self._filename, nrows=0).columns)
+        return self.meta['header']
+
+    def _colfile(self, key):
+        col, _, tag = key.partition('@')
+        return os.path.join(self._path, 'c%d' % self.header.index(col) + ('@' + tag if tag else ''))
+
+    def _save_col(self, key, values):
+        '''保存一列数据，字符串列保存为定长unicode，可空整数列保存数值，空值单独保存掩码'''
+        colfile = self._colfile(key)
+        if isinstance(values, pd.api.extensions.ExtensionArray):
+            np.save(colfile + '.na.npy', np.asarray(values.isna()))
+            values = values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0)
+            np.save(colfile + '.npy', values)
+            return {'dtype': values.dtype.str, 'na': True}
+
+        values = np.asarray(values)
+        entry = {'dtype': values.dtype.str, 'na': False}
+        if values.dtype == object:
+            na = pd.isna(values)
+            if na.any():
+                np.save(colfile + '.na.npy', na)
+                entry['na'] = True
+            values = np.where(na, '', values).astype(str)
+        np.save(colfile + '.npy', values)
+        return entry
+
+    def _load_col(self, key, rows=None):
+        colfile = self._colfile(key)
+        entry = self.meta['columns'][key]
+        values = np.load(colfile + '.npy', mmap_mode='r')
+        values = np.array(values if rows is None else values[rows])
+        if entry['dtype'] != '|O' and entry['na']:
+            na = np.load(colfile + '.na.npy', mmap_mode='r')
+            return pd.arrays.IntegerArray(values, np.array(na if rows is None else na[rows]))
+        if entry['dtype'] == '|O':
+            values = values.astype(object)
+            if entry['na']:
+                na = np.load(colfile + '.na.npy', mmap_mode='r')
+                values[na if rows is None else na[rows]] = np.nan
+        return values
+
+    def _update(self, cols, na_values, converters, stats=None):
+        '''从CSV中解析尚未缓存的列，转换后写入缓存'''
+        with timed(stats, 'parse'):
+            data = pd.read_csv(self._filename, na_values=na_values, usecols=cols)
+        if stats is not None:
+            stats.parsed(self._filename, cols)
+        values = {}
+        with timed(stats, 'convert'):
+            for col in cols:
+                values[col] = converters[col][1](data[col]) if col in converters else schema.compact(data[col].values, col)
+        try:
+            with timed(stats, 'cache_write'):
+                os.makedirs(self._path, exist_ok=True)
+                entries = {_key(col, converters): self._save_col(_key(col, converters), values[col]) for col in cols}
+                self._commit('columns', entries)
+        except OSError:
+            # 目录只读等情况下仅跳过缓存
+            pass
+        return values
+
+    def update_chunked(self, cols, na_values, converters, chunksize, stats=None):
+        '''分块解析尚未缓存的列并写入缓存，内存占用与chunksize成正比
+
+           各块转换后先写入临时文件，同时统计整列的类型、空值、取值范围；全部解析后按整列的统计
+           确定与_update一致的保存格式，再逐块写入预先分配的内存映射数组。
+           整数块与字符串块混合的列按字符串保存，数值转换为字符串
+           Args:
+               cols: 列名列表
+               其他参数同read
+           Returns:
+               所有列是否均已缓存，目录不可写等情况下为False
+        '''
+        converters = converters or {}
+        cols = [col for col in cols if _key(col, converters) not in self.meta['columns']]
+        if not cols:
+            return True
+        try:
+            os.makedirs(self._path, exist_ok=True)
+            tmpdir = tempfile.mkdtemp(dir=self._path)
+        except OSError:
+            return False
+        try:
+            columns = {col: _ChunkedColumn(os.path.join(tmpdir, 'c%d' % i)) for i, col in enumerate(cols)}
+            reader = pd.read_csv(self._filename, na_values=na_values, usecols=cols, chunksize=chunksize)
+            for i in itertools.count():
+                with timed(stats, 'parse'):
+                    data = next(reader, None)
+                if data is None:
+                    break
+                if i == 0 and stats is not None:
+                    stats.parsed(self._filename, cols)
+                with timed(stats, 'convert'):
+                    for col in cols:
+                        values = converters[col][1](data[col]) if col in converters else data[col].values
+                        columns[col].append(values)
+            if not all(column.chunks for column in columns.values()):
+                # 没有数据行，整列解析的代价可以忽略
+                shutil.rmtree(tmpdir, ignore_errors=True)
+                self._update(cols, na_values, converters, stats)
+                return all(_key(col, converters) in self.meta['columns'] for col in cols)
+            with timed(stats, 'cache_write'):
+                entries = {_key(col, converters): columns[col].save(self._colfile(_key(col, converters)), col)
+                           for col in cols}
+                self._commit('columns', entries)
+        except OSError:
+            return False
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        return True
+
+    def _commit(self, kind, entries):
+        '''把新缓存的列或数组合并到meta中，其他线程同时写入的条目不会丢失'''
+        with _meta_lock:
+            meta = self._load_meta()
+            if meta['mtime'] == self.meta['mtime']:
+                meta['header'] = self.header
+                for name in ('columns', 'arrays', 'tables'):
+                    meta.setdefault(name, {}).update(self.meta.get(name, {}))
+            meta.setdefault(kind, {}).update(entries)
+            self._meta = meta
+            self._save_meta()
+
+    def write(self, data):
+        '''把已解析的整个文件写入缓存，例如由EI文件直接解析得到的数据，之后读取时无需再解析CSV
+
+           Args:
+               data: DataFrame，与pd.read_csv(filename, na_values='-')的结果一致
+        '''
+        self.meta['header'] = list(data.columns)
+        try:
+            os.makedirs(self._path, exist_ok=True)
+            entries = {col: self._save_col(col, schema.compact(data[col].values, col)) for col in data.columns}
+            self._commit('columns', entries)
+        except OSError:
+            pass
+
+    def save_array(self, name, values):
+        '''保存与该文件相关的辅助数组，例如行索引，随源文件变化一起失效'''
+        try:
+            os.makedirs(self._path, exist_ok=True)
+            np.save(os.path.join(self._path, name + '.npy'), values)
+            self._commit('arrays', {name: np.asarray(values).dtype.str})
+        except OSError:
+            pass
+
+    def load_array(self, name):
+        '''读取辅助数组，返回只读的内存映射，不存在时返回None'''
+        if name not in self.meta.get('arrays', {}):
+            return None
+        try:
+            return np.load(os.path.join(self._path, name + '.npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def save_table(self, name, data):
+        '''保存与该文件相关的辅助表格，例如预聚合结果，数值统一保存为float64，随源文件变化一起失效'''
+        try:
+            os.makedirs(self._path, exist_ok=True)
+            np.save(os.path.join(self._path, name + '.npy'), data.values.astype(np.float64))
+            self._commit('tables', {name: [str(col) for col in data.columns]})
+        except OSError:
+            pass
+
+    def load_table(self, name):
+        '''读取辅助表格，不存在时返回None'''
+        columns = self.meta.get('tables', {}).get(name)
+        if columns is None:
+            return None
+        try:
+            values = np.load(os.path.join(self._path, name + '.npy'))
+        except (OSError, ValueError):
+            return None
+        return pd.DataFrame(values.reshape(-1, len(columns)), columns=columns)
+
+    def column(self, col, na_values='-', converters=None):
+        '''获取单列的内存映射数组，用于二分查找等只访问少量数据的场景
+
+           Args:
+               col: 列名
+               na_values: 空值字符
+               converters: 列转换，字典格式{列名: (转换标识, 函数)}
+           Returns:
+               numpy数组，缓存可用时为只读的内存映射
+        '''
+        converters = converters or {}
+        key = _key(col, converters)
+        if key not in self.meta['columns']:
+            values = self._update([col], na_values, converters)[col]
+            if key not in self.meta['columns']:
+                return values
+        return np.load(self._colfile(key) + '.npy', mmap_mode='r')
+
+    def read(self, usecols=None, na_values='-', converters=None, rows=None, memcache=None, compact=False,
+             stats=None):
+        '''读取指定列，与pd.read_csv(filename, na_values, usecols)结果一致
+
+           Args:
+               usecols: 列名列表，None表示全部列
+               na_values: 空值字符
+               converters: 列转换，字典格式{列名: (转换标识, 函数)}，转换结果按标识缓存
+               rows: 行范围slice(start, stop)或升序行号数组，None表示全部行，只从缓存中读取这些行
+               memcache: 共享的内存列缓存(ColumnCache)，未命中时加载整列，只读取少量行时除外，
+                         其中的整数列为紧凑格式
+               compact: 是否返回紧凑格式，为False时整数列还原为int64，含空值的列为float64
+               stats: ParseStats，记录解析及从缓存读取的列数、读取的行数及耗时
+           Returns:
+               数据，DataFrame格式，列顺序与文件中一致，索引为行号
+        '''
+        converters = converters or {}
+        header = self.header
+        cols = header if usecols is None else [col for col in header if col in set(usecols)]
+        if usecols is not None and len(cols) != len(set(usecols)):
+            # 交由pandas给出列不存在的异常
+            return pd.read_csv(self._filename, na_values=na_values, usecols=usecols)
+
+        data = {}
+        if memcache is not None:
+            for col in cols:
+                values = memcache.get(self._memkey(col, converters))
+                if values is not None:
+                    data[col] = values if rows is None else values[rows]
+
+        missing = [col for col in cols if col not in data and _key(col, converters) not in self.meta['columns']]
+        parsed = self._update(missing, na_values, converters, stats) if missing else {}
+        with timed(stats, 'cache_read'):
+            if stats is not None:
+                stats.add(cached_columns=len(cols) - len(missing), memcache_hits=len(data))
+            for col in cols:
+                if col in data:
+                    continue
+                if col in parsed:
+                    values = parsed[col]
+                elif memcache is not None and not self._sparse(_key(col, converters), rows):
+                    values = self._load_col(_key(col, converters))
+                else:
+                    data[col] = self._load_col(_key(col, converters), rows)
+                    continue
+                if memcache is not None:
+                    memcache.put(self._memkey(col, converters), values)
+                data[col] = values if rows is None else values[rows]
+
+        with timed(stats, 'convert'):
+            for col in cols:
+                if not compact:
+                    data[col] = schema.expand(data[col])
+                elif isinstance(data[col], pd.api.extensions.ExtensionArray) and rows is None:
+                    # 内存缓存中的可空整数数组无法设为只读，返回副本
+                    data[col] = data[col].copy()
+        data = pd.DataFrame(data, columns=cols, index=_index(rows))
+        if stats is not None:
+            stats.add(rows_read=len(data.index))
+        return data
+
+    def _sparse(self, key, rows):
+        '''是否只读取了很少一部分行，此时直接按行读取，不把整列加载到内存缓存中'''
+        if rows is None or isinstance(rows, slice):
+            return False
+        length = np.load(self._colfile(key) + '.npy', mmap_mode='r').shape[0]
+        return len(rows) < length * SPARSE_RATIO
+
+    def _memkey(self, col, converters):
+        '''内存缓存的键，包含源文件修改时间，文件变化后自动不再命中'''
+        return (self._filename, self.meta['mtime'], _key(col, converters))
+
+
+class _ChunkedColumn(object):
+    '''分块写入的一列：各块保存在临时文件中，同时累计整列的类型、空值及取值范围'''
+
+    def __init__(self, prefix):
+        self._prefix = prefix
+        self._chunks = []
+        self._kinds = set()
+        self._na = False
+        self._integral = True
+        self._min, self._max = None, None
+        self._width = 1
+
+    @property
+    def chunks(self):
+        return len(self._chunks)
+
+    def append(self, values):
+        values = np.asarray(values)
+        kind = values.dtype.kind
+        self._kinds.add(kind)
+        if kind == 'f':
+            na = np.isnan(values)
+            self._na = self._na or bool(na.any())
+            valid = values[~na]
+            self._integral = self._integral and bool((valid == np.round(valid)).all())
+        elif kind in 'iu':
+            valid = values
+        else:
+            valid = None
+            if kind == 'O':
+                na = pd.isna(values)
+                self._na = self._na or bool(na.any())
+                if (~na).any():
+                    self._width = max(self._width, int(np.char.str_len(values[~na].astype(str)).max()))
+        if valid is not None and len(valid):
+            low, high = valid.min(), valid.max()
+            self._min = low if self._min is None else min(self._min, low)
+            self._max = high if self._max is None else max(self._max, high)
+        filename = '%s_%d.npy' % (self._prefix, len(self._chunks))
+        np.save(filename, values, allow_pickle=True)
+        self._chunks.append((filename, len(values)))
+
+    def _dtype(self):
+        '''与整列解析一致的类型'''
+        kinds = self._kinds
+        if 'O' in kinds or len(kinds - {'i', 'u', 'f'}) and len(kinds) > 1:
+            return np.dtype(object)
+        if kinds <= {'i', 'u'}:
+            return np.dtype(np.int64)
+        if kinds <= {'i', 'u', 'f'}:
+            return np.dtype(np.float64)
+        return np.load(self._chunks[0][0], mmap_mode='r').dtype
+
+    def _compact_dtype(self, dtype, col):
+        '''按schema.compact的规则确定紧凑类型，不能转换时返回None'''
+        target = schema.dtype_of(col)
+        if target is None or dtype.kind not in 'iuf' or self._min is None:
+            return None
+        if dtype.kind == 'f' and (not self._na or not self._integral):
+            return None
+        low, high = (min(self._min, 0), max(self._max, 0)) if self._na else (self._min, self._max)
+        info = np.iinfo(target)
+        if low < info.min or high > info.max:
+            return None
+        return target
+
+    def save(self, colfile, col):
+        '''按整列的格式逐块写入colfile，返回缓存条目，与ColStore._save_col一致'''
+        dtype = self._dtype()
+        target = self._compact_dtype(dtype, col)
+        length = sum(n for _, n in self._chunks)
+        if target is not None:
+            values = np.lib.format.open_memmap(colfile + '.npy', mode='w+', dtype=target, shape=(length,))
+            na = np.lib.format.open_memmap(colfile + '.na.npy', mode='w+', dtype=bool, shape=(length,)) \
+                if self._na else None
+            entry = {'dtype': values.dtype.str, 'na': self._na}
+        elif dtype == object:
+            values = np.lib.format.open_memmap(colfile + '.npy', mode='w+', dtype='<U%d' % self._width,
+                                               shape=(length,))
+            na = np.lib.format.open_memmap(colfile + '.na.npy', mode='w+', dtype=bool, shape=(length,)) \
+                if self._na else None
+            entry = {'dtype': '|O', 'na': self._na}
+        else:
+            values = np.lib.format.open_memmap(colfile + '.npy', mode='w+', dtype=dtype, shape=(length,))
+            na = None
+            entry = {'dtype': values.dtype.str, 'na': False}
+
+        start = 0
+        for filename, n in self._chunks:
+            chunk = np.load(filename, allow_pickle=True)
+            chunk_na = pd.isna(chunk) if chunk.dtype.kind in 'fO' else np.zeros(n, dtype=bool)
+            if dtype == object and target is None:
+                chunk = np.where(chunk_na, '', chunk.astype(object)).astype(str)
+            elif target is not None:
+                chunk = np.where(chunk_na, 0, chunk)
+            values[start:start + n] = chunk
+            if na is not None:
+                na[start:start + n] = chunk_na
+            start += n
+        values.flush()
+        if na is not None:
+            na.flush()
+        del values, na
+        return entry
+
+
+def _index(rows):
+    '''读取部分行时结果的索引，与pd.read_csv后按行过滤的索引一致'''
+    if rows is None:
+        return None
+    if isinstance(rows, slice):
+        return pd.RangeIndex(rows.start, rows.stop)
+    return pd.Index(rows)
+
+
+def _key(col, converters):
+    '''列在缓存中的名称，转换后的列以"列名@转换标识"命名'''
+    return '%s@%s' % (col, converters[col][0]) if col in converters else col
+
+
+def _chunks(rows, length, chunksize):
+    '''把行选择按chunksize切分，slice切分为多个slice，行号数组切分为多段'''
+    if rows is None:
+        rows = slice(0, length)
+    if isinstance(rows, slice):
+        for start in range(rows.start, rows.stop, chunksize):
+            yield slice(start, min(start + chunksize, rows.stop))
+    else:
+        for start in range(0, len(rows), chunksize):
+            yield rows[start:start + chunksize]
+
+
+def iter_csv(filename, chunksize, usecols=None, na_values='-', cache=True, converters=None, rows=None,
+             compact=False, stats=None):
+    '''分块读取CSV文件，每块最多chunksize行，各块合并后与read_csv结果一致
+
+       使用缓存时各块从列缓存中按行读取，首次读取时由ColStore.update_chunked分块写入缓存，
+       不会把整列解析到内存中；不使用缓存或缓存不可写时由pandas分块解析
+       Args:
+           chunksize: 每块的行数
+           其他参数同read_csv
+       Yields:
+           数据，DataFrame格式，索引为行号
+    '''
+    if stats is not None:
+        stats.add(files_read=1)
+    if cache:
+        store = ColStore(filename)
+        cols = [col for col in store.header if usecols is None or col in set(usecols)]
+        if not cols or (usecols is not None and len(cols) != len(set(usecols))):
+            yield store.read(usecols, na_values, converters, rows, compact=compact, stats=stats)
+            return
+        if store.update_chunked(cols, na_values, converters, chunksize, stats):
+            length = None
+            if rows is None:
+                length = len(store.column(cols[0], na_values, converters))
+            for chunk in _chunks(rows, length, chunksize):
+                yield store.read(usecols, na_values, converters, chunk, compact=compact, stats=stats)
+            return
+
+    skiprows, nrows, start = None, None, 0
+    if isinstance(rows, slice):
+        skiprows, nrows, start = range(1, rows.start + 1), rows.stop - rows.start, rows.start
+    reader = pd.read_csv(filename, na_values=na_values, usecols=usecols, skiprows=skiprows, nrows=nrows,
+                         chunksize=chunksize)
+    for i in itertools.count():
+        with timed(stats, 'parse'):
+            data = next(reader, None)
+        if data is None:
+            break
+        if i == 0 and stats is not None:
+            stats.parsed(filename, data.columns)
+        data.index = data.index + start
+        if rows is not None and not isinstance(rows, slice):
+            data = data.loc[data.index.intersection(rows)]
+        with timed(stats, 'convert'):
+            for col, (_, func) in (converters or {}).items():
+                if col in data:
+                    data[col] = func(data[col])
+            data = schema.compact_frame(data) if compact else data
+        if stats is not None:
+            stats.add(rows_read=len(data.index))
+        yield data
+
+
+def read_csv(filename, usecols=None, na_values='-', cache=True, converters=None, rows=None, memcache=None,
+             compact=False, stats=None):
+    '''带列式缓存的CSV读取接口
+
+       Args:
+           filename: CSV文件全路径
+           usecols: 列名列表，None表示全部列
+           na_values: 空值字符
+           cache: 是否使用缓存
+           converters: 列转换，字典格式{列名: (转换标识, 函数)}
+           rows: 行范围slice(start, stop)或升序行号数组，None表示全部行
+           memcache: 共享的内存列缓存，只在使用列式缓存时生效
+           compact: 是否按字段名前缀把整数列转换为紧凑格式(最窄的整数类型，含空值时为可空整数类型)
+           stats: ParseStats，记录解析的文件数、列数、字节数、读取的行数及耗时
+       Returns:
+           数据，DataFrame格式
+    '''
+    if stats is not None:
+        stats.add(files_read=1)
+    if cache:
+        return ColStore(filename).read(usecols, na_values, converters, rows, memcache, compact, stats)
+
+    with timed(stats, 'parse'):
+        if rows is None:
+            data = pd.read_csv(filename, na_values=na_values, usecols=usecols)
+        elif isinstance(rows, slice):
+            data = pd.read_csv(filename, na_values=na_values, usecols=usecols,
+                               skiprows=range(1, rows.start + 1), nrows=rows.stop - rows.start)
+            data.index = pd.RangeIndex(rows.start, rows.start + len(data.index))
+        else:
+            data = pd.read_csv(filename, na_values=na_values, usecols=usecols).take(rows)
+    if stats is not None:
+        stats.parsed(filename, data.columns)
+        stats.add(rows_read=len(data.index))
+    with timed(stats, 'convert'):
+        for col, (_, func) in (converters or {}).items():
+            if col in data:
+                data[col] = func(data[col])
+        return schema.compact_frame(data) if compact else data
@@ -1,6 +1,44 @@
-import bitstring
+import sys
+import numpy as np
 import pandas as pd
 
+# DCI格式的字段表：字段按比特流中的顺序给出(名称, 比特数)，名称为riv的字段解析为startPrb和Prbnum；
+# 增加新的DCI格式只需在表中增加一项
+DCI_FORMATS = {
+    '1_1': {
+        'prefix': 'dl_',
+        'bwp_rbnum': 273,
+        'fields': [('fmt', 1), ('bwpid', 1), ('riv', 16), ('timealloc', 3), ('mcs', 5), ('ndi', 1), ('rv', 2),
+                   ('harqid', 4), ('dai', 2), ('tpc', 2), ('pucch_res', 3), ('K1', 3), ('antenna_port', 4),
+                   ('srs', 2), ('dmrs', 1)],
+    },
+    '0_1': {
+        'prefix': 'ul_',
+        'bwp_rbnum': 273,
+        'fields': [('fmt', 1), ('bwpid', 1), ('riv', 16), ('timealloc', 2), ('mcs', 5), ('ndi', 1), ('rv', 2),
+                   ('harqid', 4), ('dai', 2), ('tpc', 2), ('antenna_port', 3), ('srs', 2), ('aprd_csi', 1),
+                   ('beta_uci', 2), ('dmrs', 1), ('data', 1)],
+    },
+    '0_0': {
+        'prefix': 'ul_',
+        'bwp_rbnum': 51,
+        'fields': [('fmt', 1), ('riv', 16), ('timealloc', 2), ('hop', 1), ('mcs', 5), ('ndi', 1), ('rv', 2),
+                   ('harqid', 4), ('tpc', 2)],
+    },
+}
+
+# 十六进制字符到数值的查找表，以及是否为十六进制字符
+_HEX = np.zeros(256, dtype=np.uint64)
+_IS_HEX = np.zeros(256, dtype=bool)
+for _i, _c in enumerate(b'0123456789abcdef'):
+    _HEX[_c] = _i
+    _HEX[ord(chr(_c).upper())] = _i
+    _IS_HEX[_c] = _IS_HEX[ord(chr(_c).upper())] = True
+
+# 表示DCI为空的取值，NaN/None同样为空
+NA_VALUES = ['-', '']
+
+
 def riv2startandlen(riv, bwp_rbnum=273):
     N = bwp_rbnum
     a = int(riv / N)+1
@@ -14,66 +52,131 @@ def riv2startandlen(riv, bwp_rbnum=273):
         s = b
     return s, l
 
+
+def riv2startandlen_array(riv, bwp_rbnum=273):
+    '''riv2startandlen的向量化版本
+
+        Args:
+            riv: RIV数组
+            bwp_rbnum: BWP的RB数
+        Returns:
+            (start, length)，int16数组，RIV超出BWP范围时与riv2startandlen一样可能为负数
+    '''
+    riv = np.asarray(riv, dtype=np.int64)
+    a, b = riv // bwp_rbnum + 1, riv % bwp_rbnum
+    wrap = a + b > bwp_rbnum
+    start = np.where(wrap, bwp_rbnum - 1 - b, b)
+    length = np.where(wrap, bwp_rbnum + 2 - a, a)
+    return start.astype(np.int16), length.astype(np.int16)
+
+
+def _check_rows(payloads, bad, message):
+    '''有不合法的DCI时抛出ValueError，指出第一个不合法的行(Series为索引标签，否则为位置)'''
+    if bad.any():
+        pos = int(np.flatnonzero(bad)[0])
+        label = payloads.index[pos] if isinstance(payloads, pd.Series) else pos
+        raise ValueError('%s: 行%s %r' % (message, label, np.asarray(payloads, dtype=object)[pos]))
+
+
+def hex2uint(payloads):
+    '''把十六进制字符串('0x'开头可选)批量转换为uint64
+
+        相同的DCI很多，只转换去重后的字符串；字符串左对齐后按字符位置查表累加，再右移去掉补齐的比特
+        Args:
+            payloads: 字符串数组或Series，最多16个十六进制字符，NaN、'-'、空字符串表示没有DCI
+        Returns:
+            (values, nbits)，values为uint64数组，nbits为每个字符串的比特数，没有DCI的行均为0
+        Raises:
+            ValueError: 含有非十六进制字符或超过64比特
+    '''
+    objs = np.asarray(payloads, dtype=object)
+    missing = (pd.isna(objs) | pd.Series(objs).isin(NA_VALUES)).values
+    codes, uniques = pd.factorize(objs[~missing])
+    raw = np.asarray(uniques, dtype='S')
+    raw = raw.view(np.uint8).reshape(len(raw), raw.dtype.itemsize)
+    chars = np.zeros((len(raw), max(raw.shape[1], 18)), dtype=np.uint8)
+    chars[:, :raw.shape[1]] = raw
+    # 去掉'0x'前缀
+    prefixed = (chars[:, 0] == ord('0')) & ((chars[:, 1] | 0x20) == ord('x'))
+    chars[prefixed, :-2] = chars[prefixed, 2:]
+    chars[prefixed, -2:] = 0
+
+    def rows_of(bad):
+        rlt = np.zeros(len(objs), dtype=bool)
+        rlt[~missing] = bad[codes]
+        return rlt
+    _check_rows(payloads, rows_of(((chars != 0) & ~_IS_HEX[chars]).any(axis=1)), 'DCI含有非十六进制字符')
+    _check_rows(payloads, rows_of(chars[:, 16:].any(axis=1)), 'DCI超过64比特')
+
+    chars = chars[:, :16]
+    nbits = (chars != 0).sum(axis=1).astype(np.int64) * 4
+    values = np.zeros(len(chars), dtype=np.uint64)
+    for pos in range(16):
+        values |= _HEX[chars[:, pos]] << np.uint64(60 - 4 * pos)
+    values >>= (64 - nbits).astype(np.uint64)
+    rlt_values, rlt_nbits = np.zeros(len(objs), dtype=np.uint64), np.zeros(len(objs), dtype=np.int64)
+    rlt_values[~missing], rlt_nbits[~missing] = values[codes], nbits[codes]
+    return rlt_values, rlt_nbits
+
+
+def _dtype_of_bits(bits):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if bits <= np.iinfo(dtype).bits:
+            return dtype
+    return np.uint64
+
+
+def parse_dcis(payloads, fmt, bwp_rbnum=None):
+    '''批量解析同一格式的DCI，按字段表逐字段移位取值，不逐个DCI解析
+
+        Args:
+            payloads: 十六进制字符串的数组或Series，格式与parse_dci_1_1等的输入一致
+            fmt: DCI格式，DCI_FORMATS中的键，例如'1_1'
+            bwp_rbnum: BWP的RB数，默认取字段表中的值
+        Returns:
+            DataFrame，每行一个DCI，列名与parse_dci_1_1等的结果一致，类型为能容纳字段比特数的最窄无符号整数(startPrb、Prbnum为int16)；
+            有空DCI(NaN、'-'、空字符串)时为对应的可空整数类型，这些行的字段为空；payloads为Series时索引保持一致
+        Raises:
+            ValueError: DCI含有非十六进制字符、超过64比特或短于字段表的总长度，信息中指出第一个不合法的行
+    '''
+    assert(fmt in DCI_FORMATS), '不支持的DCI格式: %s' % fmt
+    layout = DCI_FORMATS[fmt]
+    prefix = layout['prefix']
+    bwp_rbnum = bwp_rbnum or layout['bwp_rbnum']
+    index = payloads.index if isinstance(payloads, pd.Series) else None
+    values, nbits = hex2uint(payloads)
+    missing = nbits == 0
+    total = sum(bits for _, bits in layout['fields'])
+    _check_rows(payloads, ~missing & (nbits < total), 'DCI短于%s格式的%d比特' % (fmt, total))
+
+    def masked(field):
+        return pd.arrays.IntegerArray(field, missing) if missing.any() else field
+
+    rlt = {}
+    offset = 0
+    for name, bits in layout['fields']:
+        # 比特流从最高位开始读取，字段在整数中的位置由DCI长度决定
+        shift = np.where(missing, 0, nbits - offset - bits)
+        field = (values >> shift.astype(np.uint64)) & np.uint64((1 << bits) - 1)
+        if name == 'riv':
+            start, length = riv2startandlen_array(field, bwp_rbnum)
+            rlt[prefix + 'startPrb'], rlt[prefix + 'Prbnum'] = masked(start), masked(length)
+        else:
+            rlt[prefix + name] = masked(field.astype(_dtype_of_bits(bits)))
+        offset += bits
+    return pd.DataFrame(rlt, index=index)
+
+
 def parse_dci_1_1(dci_hex_bytes):
-    dci = pd.Series()
-    bit_stream = bitstring.BitStream(dci_hex_bytes)
-    dci['dl_fmt'] = bit_stream.read('uint:1')
-    dci['dl_bwpid'] = bit_stream.read('uint:1')
-    #dci['rballoc_type'] = bit_stream.read('uint:1')
-    #dci['riv'] = bit_stream.read('uint:16')
-    dci['dl_startPrb'], dci['dl_Prbnum'] =  riv2startandlen(bit_stream.read('uint:16'))
-    dci['dl_timealloc'] = bit_stream.read('uint:3')
-    dci['dl_mcs'] = bit_stream.read('uint:5')
-    dci['dl_ndi'] = bit_stream.read('uint:1')
-    dci['dl_rv'] = bit_stream.read('uint:2')
-    dci['dl_harqid'] = bit_stream.read('uint:4')
-    dci['dl_dai'] = bit_stream.read('uint:2')
-    dci['dl_tpc'] = bit_stream.read('uint:2')
-    dci['dl_pucch_res'] = bit_stream.read('uint:3')
-    dci['dl_K1'] = bit_stream.read('uint:3')
-    dci['dl_antenna_port'] = bit_stream.read('uint:4')
-    dci['dl_srs'] = bit_stream.read('uint:2')
-    dci['dl_dmrs'] = bit_stream.read('uint:1')
-    return dci
+    return parse_dcis([dci_hex_bytes], '1_1').iloc[0]
+
 
 def parse_dci_0_1(dci_hex_bytes):
-    dci = pd.Series()
-    bit_stream = bitstring.BitStream(dci_hex_bytes)
-    dci['ul_fmt'] = bit_stream.read('uint:1')
-    dci['ul_bwpid'] = bit_stream.read('uint:1')
-    #dci['rballoc_type'] = bit_stream.read('uint:1')
-    #dci['riv'] = bit_stream.read('uint:16')
-    dci['ul_startPrb'], dci['ul_Prbnum'] =  riv2startandlen(bit_stream.read('uint:16'))
-    dci['ul_timealloc'] = bit_stream.read('uint:2')
-    dci['ul_mcs'] = bit_stream.read('uint:5')
-    dci['ul_ndi'] = bit_stream.read('uint:1')
-    dci['ul_rv'] = bit_stream.read('uint:2')
-    dci['ul_harqid'] = bit_stream.read('uint:4')
-    dci['ul_dai'] = bit_stream.read('uint:2')
-    dci['ul_tpc'] = bit_stream.read('uint:2')
-    dci['ul_antenna_port'] = bit_stream.read('uint:3')
-    dci['ul_srs'] = bit_stream.read('uint:2')
-    dci['ul_aprd_csi'] = bit_stream.read('uint:1')
-    dci['ul_beta_uci'] = bit_stream.read('uint:2')
-    dci['ul_dmrs'] = bit_stream.read('uint:1')
-    dci['ul_data'] = bit_stream.read('uint:1')
-    return dci
+    return parse_dcis([dci_hex_bytes], '0_1').iloc[0]
+
 
 def parse_dci_0_0(dci_hex_bytes):
-    dci = pd.Series()
-    bit_stream = bitstring.BitStream(dci_hex_bytes)
-    dci['ul_fmt'] = bit_stream.read('uint:1')
-    #dci['rballoc_type'] = bit_stream.read('uint:1')
-    #dci['riv'] = bit_stream.read('uint:16')
-    dci['ul_startPrb'], dci['ul_Prbnum'] =  riv2startandlen(bit_stream.read('uint:16'), bwp_rbnum=51)
-    dci['ul_timealloc'] = bit_stream.read('uint:2')
-    dci['ul_hop'] = bit_stream.read('uint:1')
-    dci['ul_mcs'] = bit_stream.read('uint:5')
-    dci['ul_ndi'] = bit_stream.read('uint:1')
-    dci['ul_rv'] = bit_stream.read('uint:2')
-    dci['ul_harqid'] = bit_stream.read('uint:4')
-    dci['ul_tpc'] = bit_stream.read('uint:2')
-    return dci
+    return parse_dcis([dci_hex_bytes], '0_0').iloc[0]
 
 
 if __name__ == '__main__':
@@ -96,13 +199,12 @@ if __name__ == '__main__':
              '187/14':'0x41de69e6d42000', 
            }
 
-    dldata = pd.DataFrame()
-    for time in dldci.keys():
-        dldata[time] = parse_dci_1_1(dldci[time])
+    dldata = parse_dcis(pd.Series(dldci), '1_1').T
+    uldata = parse_dcis(pd.Series(uldci), '0_0').T
 
-    uldata = pd.DataFrame()
-    for time in uldci.keys():
-        uldata[time] = parse_dci_0_0(uldci[time])
-    
+    # 用法: python -m util.dcibits_prase [输出的CSV文件]，不指定文件时打印结果
     data = pd.concat([dldata, uldata])
-    data.to_csv('D:\dci.csv', na_rep='-')
\ No newline at end of file
+    if len(sys.argv) > 1:
+        data.to_csv(sys.argv[1], na_rep='-')
+    else:
+        print(data.to_string(na_rep='-'))
@@ -1,37 +1,220 @@
 #!/usr/bin/env python3
-from ctypes import *
+# coding=utf-8
+'''EI文件转换
+
+   转换方式可插拔：EI_FileProc.dll(Windows)、外部命令、或者直接读取EI文件得到DataFrame的Python读取函数。
+   文件由进程池逐个分配给空闲进程转换，已转换的文件自动跳过；
+   读取函数得到的数据在写出CSV的同时直接写入列式缓存，分析时无需再解析CSV。
+'''
+import abc
+from ctypes import CDLL, create_string_buffer
 import os
 import os.path
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import pandas as pd
-import numpy as np
-import threading
-
-dll = CDLL(r'D:\svinsight\util\EI_FileProc.dll')
-
-def __ei2csv(filename):
-    dll.ConvertFile(create_string_buffer(
-        bytes(filename, encoding='utf8')), dll.InitEnbMonitorThreadHandle())
-
-def ei2csv(directory, eifiles):
-    max_thread = 8
-    complete = 0
-    for i in np.arange(0, len(eifiles), max_thread):
-        threadlist = []
-        for eifile in eifiles[i:i+max_thread]:
-            thread = threading.Thread(target=__ei2csv, args=(directory + '\\' + eifile, ))
-            threadlist.append(thread)
-            thread.start()
-                
-        for thread in threadlist:
-            thread.join()
-            complete = complete + 1
-            print('processed %d of total %d files' %(complete, len(eifiles)))
+from util import eireader
+from util.colstore import ColStore
+
+# DLL路径，默认与本文件在同一目录，可通过环境变量SVINSIGHT_EI_DLL指定
+DLL_ENV = 'SVINSIGHT_EI_DLL'
+# 外部转换命令，例如"ei2csv {input} {output}"，设置后作为默认转换方式
+COMMAND_ENV = 'SVINSIGHT_EI_COMMAND'
+
+
+class Converter(abc.ABC):
+    '''EI文件转换接口
+
+       子类必须实现convert，把EI文件转换为同名CSV文件；
+       能直接解析EI文件的子类返回DataFrame，由转换流程写出CSV并写入列式缓存。
+       实例需要可以pickle，以便在子进程中使用。
+    '''
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def convert(self, eifile, csvfile):
+        '''转换单个文件
+
+            Args:
+                eifile: EI文件全路径
+                csvfile: 输出的CSV文件全路径
+            Returns:
+                解析得到的DataFrame，转换器自行写出CSV时返回None
+        '''
+
+
+class DllConverter(Converter):
+    '''通过EI_FileProc.dll转换，DLL在第一次转换时才加载，只能在Windows上使用'''
+
+    name = 'dll'
+
+    def __init__(self, dllpath=None):
+        self._dllpath = dllpath or os.environ.get(DLL_ENV) or os.path.join(os.path.dirname(__file__),
+                                                                             'EI_FileProc.dll')
+        self._dll = None
+
+    def __getstate__(self):
+        # DLL句柄不能跨进程传递，子进程中重新加载
+        return {'_dllpath': self._dllpath, '_dll': None}
+
+    @property
+    def dll(self):
+        if self._dll is None:
+            self._dll = CDLL(self._dllpath)
+        return self._dll
+
+    def convert(self, eifile, csvfile):
+        # DLL在EI文件所在目录生成同名CSV文件
+        dll = self.dll
+        dll.ConvertFile(create_string_buffer(bytes(eifile, encoding='utf8')), dll.InitEnbMonitorThreadHandle())
+        return None
+
+
+class CommandConverter(Converter):
+    '''调用外部命令转换，命令中的{input}、{output}分别替换为EI文件和CSV文件路径'''
+
+    name = 'command'
+
+    def __init__(self, command):
+        self._command = command
+
+    def convert(self, eifile, csvfile):
+        args = [arg.format(input=eifile, output=csvfile) for arg in self._command.split()]
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+        return None
+
+
+class ReaderConverter(Converter):
+    '''用Python读取函数直接解析EI文件
+
+       reader(eifile)返回DataFrame，数值列为数值类型，空值为NaN，与pd.read_csv(na_values='-')读取CSV的结果一致；
+       使用进程池时reader需为模块级函数
+    '''
+
+    name = 'reader'
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    def convert(self, eifile, csvfile):
+        return self._reader(eifile)
+
+
+def default_converter():
+    '''默认转换方式：设置了外部命令时使用外部命令，其次是设置了记录格式目录时直接读取EI文件，否则使用DLL'''
+    command = os.environ.get(COMMAND_ENV)
+    if command:
+        return CommandConverter(command)
+    if os.environ.get(eireader.LAYOUTS_ENV):
+        return ReaderConverter(eireader.read)
+    return DllConverter()
+
+
+def csv_name(eifile):
+    '''EI文件对应的CSV文件名'''
+    return eifile.rsplit('.', 1)[0] + '.csv'
+
+
+def is_converted(eifile, csvfile):
+    '''CSV文件存在、非空且不早于EI文件时认为已转换'''
+    if not os.path.exists(csvfile):
+        return False
+    st = os.stat(csvfile)
+    return st.st_size > 0 and st.st_mtime_ns >= os.stat(eifile).st_mtime_ns
+
+
+def _convert_file(converter, eifile, cache=True):
+    '''转换单个文件，在子进程中执行
+
+        Returns:
+            转换结果，字典格式
+    '''
+    csvfile = csv_name(eifile)
+    size = os.path.getsize(eifile)
+    start = time.perf_counter()
+    data = converter.convert(eifile, csvfile)
+    rows = None
+    if data is not None:
+        # 先写临时文件，写完再改名，中途失败不会留下被当成已转换的残缺CSV
+        tmpfile = csvfile + '.tmp'
+        try:
+            # 含空值的整数列为浮点类型，按%g写出，避免整数写成'1.0'
+            data.to_csv(tmpfile, index=False, na_rep='-', float_format='%.15g')
+        except BaseException:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            raise
+        os.replace(tmpfile, csvfile)
+        rows = len(data.index)
+        if cache:
+            ColStore(csvfile).write(data)
+    seconds = time.perf_counter() - start
+    return {'file': os.path.basename(eifile), 'status': 'converted', 'bytes': size, 'rows': rows,
+            'seconds': seconds, 'MBps': size / 1e6 / seconds if seconds else None}
+
+
+def convert(directory, eifiles, converter=None, max_workers=None, executor='process', cache=True, force=False,
+            verbose=True):
+    '''并行转换EI文件
+
+        每个进程转换完一个文件后立即领取下一个，不会等待同一批中最慢的文件
+        Args:
+            directory: EI文件所在目录
+            eifiles: EI文件名列表
+            converter: Converter实例，默认由default_converter()决定
+            max_workers: 同时转换的最大文件数，默认为CPU核数
+            executor: 'process'进程池，'thread'线程池
+            cache: 读取函数得到的数据是否直接写入列式缓存
+            force: 是否重新转换已转换的文件
+            verbose: 是否打印进度
+        Returns:
+            每个文件的转换结果，DataFrame格式，列为status, bytes, rows, seconds, MBps，
+            status为converted, skipped或failed
+    '''
+    assert(executor in ('thread', 'process'))
+    converter = converter or default_converter()
+    rlt = []
+    pending = []
+    for eifile in eifiles:
+        path = os.path.join(directory, eifile)
+        if not force and is_converted(path, csv_name(path)):
+            rlt.append({'file': eifile, 'status': 'skipped', 'bytes': os.path.getsize(path)})
+        else:
+            pending.append(path)
+
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with pool_class(max_workers=max_workers or os.cpu_count()) as pool:
+        futures = {pool.submit(_convert_file, converter, path, cache): path for path in pending}
+        for complete, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                rlt.append(future.result())
+            except Exception as e:
+                rlt.append({'file': os.path.basename(path), 'status': 'failed', 'bytes': os.path.getsize(path),
+                            'error': str(e)})
+            if verbose:
+                entry = rlt[-1]
+                speed = ', %.1f MB/s' % entry['MBps'] if entry.get('MBps') else ''
+                print('processed %d of total %d files: %s %s%s' % (complete, len(pending), entry['file'],
+                                                                   entry['status'], speed))
+
+    columns = ['status', 'bytes', 'rows', 'seconds', 'MBps', 'error']
+    rlt = pd.DataFrame(rlt, columns=['file'] + columns).set_index('file')
+    return rlt.dropna(axis=1, how='all')
+
 
+def ei2csv(directory, eifiles, converter=None, max_workers=None):
+    '''把EI文件转换为CSV文件，接口与原来一致'''
+    rlt = convert(directory, eifiles, converter=converter, max_workers=max_workers)
     print("!!Done!!")
+    return rlt
 
 
 if __name__ == '__main__':
-    directory = r"D:\svlog\20210513150953"
-    files = pd.Series(os.listdir(directory))
-    eifiles = list(files[files.apply(lambda x: x.endswith(r'.ei') and x.rsplit('.')[0]+r'.csv' not in files)])  
-    ei2csv(directory, eifiles)  
+    # 用法: python -m util.ei2csv [目录]
+    directory = sys.argv[1] if len(sys.argv) > 1 else '.'
+    eifiles = sorted(name for name in os.listdir(directory) if name.endswith('.ei'))
+    print(ei2csv(directory, eifiles))
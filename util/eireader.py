@@ -0,0 +1,293 @@
+# coding=utf-8
+'''直接读取EI文件
+
+   EI文件由定长记录组成，每条记录以同步字0xAFAFAFAF开始。记录格式由RecordLayout声明，
+   文件以内存映射方式打开，记录连续时整个文件即为一个numpy结构化数组，每列都是文件上的视图，不复制数据；
+   记录间有损坏或多余字节时按同步字重新定位记录。
+   记录格式可保存为JSON文件，放在环境变量SVINSIGHT_EI_LAYOUTS指定的目录中，按文件类型自动选择：
+       {"filetype": "CMAC_dlUeTtiInfo",
+        "time": ["u8Hour", "u8Minute", "u8Second", "u16MilliSec"],
+        "fields": [["CellId", "<u2"], ["UEGID", "<u2"], ["_reserved", "V4"],
+                   ["SCHD.u8Layers", "u1", 255], ...]}
+   fields按记录中的顺序给出(不含同步字)，每项为[列名, numpy类型]或[列名, numpy类型, 空值]，
+   以'_'开头的字段不输出；time为组成LocalTime(hh:mm:ss:ms)的四个字段。
+   layouts目录中随附util.gen_ttilog生成的模拟EI文件的记录格式，可作为示例，也用于验证读取结果。
+   EiFile.column返回文件上的视图；to_frame生成DataFrame时会复制数据，由util.ei2csv写出CSV及列式缓存，
+   NrLog的查询读取CSV的列式缓存，不直接访问EI文件。
+'''
+import glob
+import json
+import mmap
+import os
+import numpy as np
+import pandas as pd
+
+MAGIC = 0xAFAFAFAF
+# 记录格式JSON文件所在目录
+LAYOUTS_ENV = 'SVINSIGHT_EI_LAYOUTS'
+# 按同步字查找记录时每次扫描的字节数
+SCAN_BLOCK = 1 << 26
+# 随附的记录格式所在目录
+LAYOUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+
+
+def format_local_time(ms):
+    '''当天的毫秒数转换为CSV中的LocalTime字符串(hh:mm:ss:ms，数字右对齐)，同一毫秒只格式化一次'''
+    codes, uniques = pd.factorize(ms)
+    hour, rest = np.divmod(uniques, 3600000)
+    minute, rest = np.divmod(rest, 60000)
+    second, milli = np.divmod(rest, 1000)
+    text = ['%2d:%2d:%2d:%3d' % parts for parts in zip(hour, minute, second, milli)]
+    return np.array(text, dtype=object)[codes]
+
+
+class RecordLayout(object):
+    '''EI文件的记录格式'''
+
+    def __init__(self, filetype, fields, time=None):
+        '''初始化记录格式
+
+            Args:
+                filetype: 文件类型，即文件名中的'CMAC_dlUeTtiInfo'等
+                fields: 记录中同步字之后的字段，[(列名, numpy类型[, 空值]), ]
+                time: 组成LocalTime的(时, 分, 秒, 毫秒)字段名，None表示没有LocalTime列
+        '''
+        self._filetype = filetype
+        self._fields = [tuple(field) for field in fields]
+        self._time = list(time) if time else None
+        self._na = {field[0]: field[2] for field in self._fields if len(field) > 2}
+        self._dtype = np.dtype([('_magic', '<u4')] + [(field[0], field[1]) for field in self._fields])
+        names = set(self._dtype.names)
+        assert(not self._time or (len(self._time) == 4 and set(self._time) <= names))
+
+    @classmethod
+    def from_json(cls, filename):
+        with open(filename, 'r', encoding='utf8') as f:
+            spec = json.load(f)
+        return cls(spec['filetype'], spec['fields'], spec.get('time'))
+
+    @property
+    def filetype(self):
+        return self._filetype
+
+    @property
+    def dtype(self):
+        '''记录对应的numpy结构化类型，第一个字段为同步字'''
+        return self._dtype
+
+    @property
+    def itemsize(self):
+        return self._dtype.itemsize
+
+    @property
+    def columns(self):
+        '''输出的列名，与转换得到的CSV文件的表头一致'''
+        cols = ['LocalTime'] if self._time else []
+        return cols + [field[0] for field in self._fields
+                       if not field[0].startswith('_') and field[0] not in (self._time or [])]
+
+    def na_value(self, col):
+        return self._na.get(col)
+
+    @property
+    def time(self):
+        return self._time
+
+    def pack(self, data):
+        '''把DataFrame打包为记录数组，是EiFile.to_frame的逆过程，用于生成EI文件
+
+            Args:
+                data: DataFrame，包含columns中的所有列，空值为NaN
+            Returns:
+                numpy结构化数组
+        '''
+        records = np.zeros(len(data.index), dtype=self._dtype)
+        records['_magic'] = MAGIC
+        if self._time:
+            parts = data['LocalTime'].str.split(':', expand=True).astype(np.int64)
+            for i, name in enumerate(self._time):
+                records[name] = parts[i].values
+        for col in self.columns:
+            if col == 'LocalTime':
+                continue
+            values = data[col]
+            if self._dtype[col].kind == 'S':
+                records[col] = values.fillna('').str.encode('utf8').values
+            else:
+                na = self.na_value(col)
+                records[col] = (values.fillna(na) if na is not None else values).values
+        return records
+
+
+def load_layouts(directory):
+    '''读取目录中的所有记录格式，按文件类型索引'''
+    rlt = {}
+    for filename in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        layout = RecordLayout.from_json(filename)
+        rlt[layout.filetype] = layout
+    return rlt
+
+
+_layouts = None
+
+
+def layouts():
+    '''环境变量指定目录中的所有记录格式，按文件类型索引'''
+    global _layouts
+    if _layouts is None:
+        directory = os.environ.get(LAYOUTS_ENV)
+        _layouts = load_layouts(directory) if directory else {}
+    return _layouts
+
+
+def register(layout):
+    '''注册记录格式，同一文件类型后注册的生效'''
+    layouts()[layout.filetype] = layout
+
+
+def layout_of(filename):
+    '''按文件名中的文件类型查找记录格式，没有时返回None'''
+    name = os.path.basename(filename)
+    for filetype, layout in layouts().items():
+        if -1 != name.find(filetype):
+            return layout
+    return None
+
+
+def find_records(buf, itemsize, magic=MAGIC):
+    '''按同步字定位记录
+
+        先检查记录是否从文件开头连续排列，是则直接返回；否则分块扫描同步字，
+        只保留一个记录长度之后仍是同步字(或文件结尾)的位置，再依次取不与前一条记录重叠的位置，
+        以跳过损坏的数据以及记录内容中偶然出现的同步字
+        Args:
+            buf: 文件内容，bytes或mmap
+            itemsize: 记录长度
+        Returns:
+            (offsets, contiguous)，offsets为每条记录的起始位置，contiguous表示记录是否从开头连续排列
+    '''
+    data = np.frombuffer(buf, dtype=np.uint8)
+    count = len(data) // itemsize
+    if count and len(data) == count * itemsize:
+        words = np.ndarray(shape=(count,), dtype='<u4', buffer=buf, strides=(itemsize,))
+        if (words == magic).all():
+            return np.arange(count, dtype=np.int64) * itemsize, True
+
+    word = np.frombuffer(np.array(magic, dtype='<u4').tobytes(), dtype=np.uint8)
+    candidates = []
+    for start in range(0, max(len(data) - 3, 0), SCAN_BLOCK):
+        block = data[start:start + SCAN_BLOCK + 3]
+        size = len(block) - 3
+        hit = block[:size] == word[0]
+        for i in range(1, 4):
+            hit &= block[i:i + size] == word[i]
+        candidates.append(np.flatnonzero(hit) + start)
+    candidates = np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int64)
+    ends = candidates + itemsize
+    candidates = candidates[(ends == len(data)) | np.isin(ends, candidates)]
+
+    offsets = []
+    end = 0
+    for offset in candidates.tolist():
+        if offset >= end:
+            offsets.append(offset)
+            end = offset + itemsize
+    return np.array(offsets, dtype=np.int64), False
+
+
+class EiFile(object):
+    '''以内存映射方式打开的EI文件'''
+
+    def __init__(self, filename, layout=None):
+        '''打开EI文件
+
+            Args:
+                filename: EI文件全路径
+                layout: RecordLayout实例，默认按文件名中的文件类型查找
+        '''
+        self._filename = filename
+        self._layout = layout or layout_of(filename)
+        assert(self._layout is not None), '没有%s的记录格式' % os.path.basename(filename)
+        self._records = None
+        self._contiguous = None
+        with open(filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    @property
+    def layout(self):
+        return self._layout
+
+    @property
+    def contiguous(self):
+        '''记录是否连续排列，连续时各列均为文件上的视图'''
+        self.records
+        return self._contiguous
+
+    @property
+    def records(self):
+        '''全部记录，numpy结构化数组'''
+        if self._records is None:
+            offsets, self._contiguous = find_records(self._buf, self._layout.itemsize)
+            if self._contiguous:
+                self._records = np.ndarray(shape=(len(offsets),), dtype=self._layout.dtype, buffer=self._buf)
+            else:
+                # 记录不连续，按连续段逐段拷贝，额外内存只有记录本身
+                self._records = np.empty(len(offsets), dtype=self._layout.dtype)
+                bounds = np.flatnonzero(np.diff(offsets) != self._layout.itemsize) + 1
+                for start, stop in zip([0] + bounds.tolist(), bounds.tolist() + [len(offsets)]):
+                    self._records[start:stop] = np.ndarray(shape=(stop - start,), dtype=self._layout.dtype,
+                                                           buffer=self._buf, offset=int(offsets[start]))
+        return self._records
+
+    def __len__(self):
+        return len(self.records)
+
+    def column(self, col):
+        '''原始类型的一列，记录连续时不复制数据'''
+        return self.records[col]
+
+    def to_frame(self, usecols=None):
+        '''转换为DataFrame，类型与pd.read_csv(CSV文件, na_values='-')一致
+
+            Args:
+                usecols: 需要的列，None表示全部
+            Returns:
+                DataFrame，列顺序与记录格式一致
+        '''
+        cols = self._layout.columns if usecols is None else [col for col in self._layout.columns if col in usecols]
+        data = {}
+        for col in cols:
+            data[col] = self._local_time() if col == 'LocalTime' else self._values(col)
+        return pd.DataFrame(data, columns=cols)
+
+    def _values(self, col):
+        values = self.records[col]
+        if values.dtype.kind == 'S':
+            return np.char.decode(np.char.rstrip(values, b'\0'), 'utf8').astype(object)
+        na = self._layout.na_value(col)
+        if na is not None:
+            isna = values == na
+            if isna.any():
+                return np.where(isna, np.nan, values.astype(np.float64))
+        return values.astype(np.float64) if values.dtype.kind == 'f' else values.astype(np.int64)
+
+    def _local_time(self):
+        '''按CSV中的格式生成LocalTime字符串'''
+        fields = [self.records[name].astype(np.int64) for name in self._layout.time]
+        return format_local_time(((fields[0] * 60 + fields[1]) * 60 + fields[2]) * 1000 + fields[3])
+
+    def close(self):
+        self._records = None
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+
+def read(filename, usecols=None, layout=None):
+    '''读取EI文件为DataFrame，可作为util.ei2csv.ReaderConverter的读取函数'''
+    return EiFile(filename, layout).to_frame(usecols)
+
+
+def write(filename, data, layout):
+    '''按记录格式把DataFrame写为EI文件，记录连续排列'''
+    layout.pack(data).tofile(filename)
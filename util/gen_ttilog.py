@@ -0,0 +1,171 @@
+# coding=utf-8
+'''生成模拟的TTI Log
+
+   生成与EI转换结果格式一致的CMAC_dlUeTtiInfo_*.csv、CMAC_ulUeTtiInfo_*.csv文件：
+   LocalTime为hh:mm:ss:ms格式(数字右对齐)，空值为'-'，文件名中的时间为文件的起始时间。
+   每个UE属于一个小区，只在一段时间内出现；同一消息(字段名中'.'之前的部分)的字段同时为空。
+   用法: python -m util.gen_ttilog 目录 [--cells 2] [--ues 32] [--files 3] [--rows 20000] [--ei]
+'''
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import const
+from util import eireader
+
+# 各字段的取值范围[low, high)
+DL_FIELDS = {
+    'SCHD.u8HarqId': (0, 16),
+    'SCHD.u16RbNum': (1, 274),
+    'SCHD.u32TbSize': (0, 160000),
+    'SCHD.u8Layers': (1, 5),
+    'SCHD.u8Tac': (27, 36),
+    'ACK.u8AckInfo': None,
+    'ACK.u32DemTime': None,
+    'ACK.u8IsHarqFail': (0, 2),
+    'ACK.u8IsSelfMainTain': (0, 2),
+    'CSI.u8RptRI': (1, 5),
+    'CSI.u8RptWideCqi': (0, 16),
+    'AMC.s16InnerSinr': (-100, 300),
+    'AMC.s16DeltaSinr': (-50, 50),
+    'AMC.u8SchdMcs': (0, 28),
+    'SCHD_FAIL_RSN.u32UeSchdFailRsn': (0, len(const.NR_SCHD_FAIL_RSNS)),
+    'LCH_SCHD.u32RlcRptBsr': (0, 1000000),
+    'LCH_SCHD.u32SchdBsr': (0, 1000000),
+}
+
+UL_FIELDS = {
+    'GRANT.u8HarqId': (0, 16),
+    'GRANT.u16RbNum': (1, 274),
+    'TB.u8Mcs': (0, 28),
+    'TB.u16TbSize': (0, 60000),
+    'CRCI.u8AckInfo': None,
+    'CRCI.u32DemTime': None,
+    'CRCI.u8HarqId': (0, 16),
+    'CRCI.u8IsHarqFail': (0, 2),
+    'CRCI.u8IsSelfMainTain': (0, 2),
+    'PHR.u16PathLoss': (60, 160),
+    'PUSCH_SINR.s16SingleRbSINR': (-100, 300),
+    'AMC.s16DeltaMcs': (-10, 10),
+    'AMC.u8StdMcs': (0, 28),
+    'BSR.u32LchGrpId': (0, 8),
+    'BSR.u32LchGrpBsr': (0, 1000000),
+    'SCHD_FAIL_RSN.u32UeSchdFailRsn': (0, len(const.NR_SCHD_FAIL_RSNS)),
+}
+
+FIELDS = {const.NR_FILE_DLSCHD: DL_FIELDS, const.NR_FILE_ULSCHD: UL_FIELDS}
+
+# 各消息在一行中出现的概率，未列出的为0.5
+PRESENCE = {'SCHD': 0.8, 'GRANT': 0.8, 'TB': 0.8, 'ACK': 0.7, 'CRCI': 0.7, 'SCHD_FAIL_RSN': 0.1}
+
+# AckInfo取值0(NACK)、1(ACK)、2(DTX)的概率
+ACK_PROBS = (0.08, 0.9, 0.02)
+
+
+def make_frame(filetype, start, rows, seconds=40, cells=2, ues=32, null_ratio=None, rng=None):
+    '''生成一个文件的数据
+
+        Args:
+            filetype: 文件类型，const.NR_FILE_DLSCHD或const.NR_FILE_ULSCHD
+            start: 起始时间，pd.Timestamp
+            rows: 行数
+            seconds: 文件覆盖的时长(s)
+            cells: 小区数，CellId为1..cells
+            ues: 每个小区的UE数，UEGID全局唯一且从1开始，小区c的UE为(c-1)*ues+1..c*ues
+            null_ratio: 各消息为空的比例，None表示使用PRESENCE中的比例
+            rng: numpy随机数发生器
+        Returns:
+            DataFrame，数值列为浮点数或整数，空值为NaN
+    '''
+    rng = rng if rng is not None else np.random.default_rng()
+    day_ms = (start - start.normalize()) // pd.Timedelta(milliseconds=1)
+
+    # UE在一段时间内出现：每个UE取文件内的一个时间段，随机生成的行只保留该时刻UE在线的，直到满rows行
+    life = rng.uniform(0.3, 1.0, (cells + 1, ues)) * seconds * 1000
+    begin = rng.uniform(0, 1, (cells + 1, ues)) * (seconds * 1000 - life)
+    parts, count = [], 0
+    while count < rows:
+        ms = rng.integers(0, seconds * 1000, rows)
+        cellid = rng.integers(1, cells + 1, rows)
+        ue = rng.integers(0, ues, rows)
+        online = (ms >= begin[cellid, ue]) & (ms <= begin[cellid, ue] + life[cellid, ue])
+        parts.append((ms[online], cellid[online], ue[online]))
+        count += online.sum()
+    ms, cellid, ue = [np.concatenate(values)[:rows] for values in zip(*parts)]
+    order = np.argsort(ms, kind='stable')
+    ms, cellid, ue = ms[order], cellid[order], ue[order]
+
+    slot = ms * 2 % 20
+    times = day_ms + ms
+    data = pd.DataFrame({'LocalTime': eireader.format_local_time(times), 'AirTime': times % 10240})
+    data['CellId'] = cellid
+    data['UEGID'] = (cellid - 1) * ues + ue + 1
+
+    groups = {}
+    for col, bounds in FIELDS[filetype].items():
+        group = col.split('.')[0]
+        if group not in groups:
+            ratio = null_ratio if null_ratio is not None else 1 - PRESENCE.get(group, 0.5)
+            groups[group] = rng.random(rows) < ratio
+        if col.endswith('AckInfo'):
+            values = rng.choice(len(ACK_PROBS), rows, p=ACK_PROBS)
+        elif col.endswith('DemTime'):
+            values = (ms // 10 % 1024) * 256 + slot
+        else:
+            values = rng.integers(bounds[0], bounds[1], rows)
+        data[col] = np.where(groups[group], np.nan, values) if groups[group].any() else values
+    return data
+
+
+def generate(directory, cells=2, ues=32, files=3, rows=20000, start='2021-03-23 21:37:00', seconds=40,
+             filetypes=const.NR_FILE_TYPES, null_ratio=None, seed=0, ei=False):
+    '''在目录中生成模拟的TTI Log
+
+        Args:
+            directory: 输出目录，不存在时创建
+            cells: 小区数
+            ues: 每个小区的UE数
+            files: 每种类型的文件数
+            rows: 每个文件的行数
+            start: 第一个文件的起始时间
+            seconds: 每个文件覆盖的时长(s)，文件之间首尾相接
+            filetypes: 生成的文件类型
+            null_ratio: 各消息为空的比例，None表示使用默认比例
+            seed: 随机数种子，相同参数生成相同的文件
+            ei: 为True时按util/layouts中的记录格式写出EI文件，而不是CSV文件
+        Returns:
+            {文件类型: [文件名, ]}
+    '''
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    layouts = eireader.load_layouts(eireader.LAYOUTS_DIR) if ei else None
+    names = {}
+    for filetype in filetypes:
+        names[filetype] = []
+        for i in range(files):
+            begin = start + pd.Timedelta(seconds=seconds * i)
+            data = make_frame(filetype, begin, rows, seconds, cells, ues, null_ratio, rng)
+            name = '%s_%s.%s' % (filetype, begin.strftime('%Y%m%d%H%M%S'), 'ei' if ei else 'csv')
+            if ei:
+                eireader.write(os.path.join(directory, name), data, layouts[filetype])
+            else:
+                data.to_csv(os.path.join(directory, name), index=False, na_rep='-', float_format='%.15g')
+            names[filetype].append(name)
+    return names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='生成模拟的TTI Log')
+    parser.add_argument('directory')
+    parser.add_argument('--cells', type=int, default=2)
+    parser.add_argument('--ues', type=int, default=32)
+    parser.add_argument('--files', type=int, default=3)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--start', default='2021-03-23 21:37:00')
+    parser.add_argument('--seconds', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ei', action='store_true', help='写出EI文件而不是CSV文件')
+    args = parser.parse_args()
+    generate(args.directory, args.cells, args.ues, args.files, args.rows, args.start, args.seconds, seed=args.seed,
+             ei=args.ei)
@@ -0,0 +1,118 @@
+# coding=utf-8
+import json
+import os
+import threading
+import numpy as np
+from util.colstore import CACHE_DIR
+
+
+class Manifest(object):
+    '''Log目录清单
+
+       保存在Log目录下的.svinsight/manifest.json中，记录每个CSV文件的
+       大小、修改时间、行数、时间范围、CellId、UEGID以及(CellId, UEGID)组合，
+       文件大小或修改时间变化后对应条目失效，只需重新扫描新增或变化的文件。
+    '''
+
+    def __init__(self, directory, persist=True):
+        '''初始化清单实例
+
+           Args:
+               directory: Log所在目录
+               persist: 是否保存到磁盘
+        '''
+        self._directory = directory
+        self._persist = persist
+        self._filename = os.path.join(directory, CACHE_DIR, 'manifest.json')
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        if persist:
+            try:
+                with open(self._filename, 'r') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def _stat(self, name):
+        st = os.stat(os.path.join(self._directory, name))
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, name):
+        '''获取文件条目，条目不存在或已过期时返回None'''
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        if (entry['size'], entry['mtime']) != self._stat(name):
+            return None
+        return entry
+
+    def update(self, name, entry):
+        '''更新文件条目，entry由make_entry生成'''
+        entry = dict(entry)
+        entry['size'], entry['mtime'] = self._stat(name)
+        with self._lock:
+            self._entries[name] = entry
+            self._dirty = True
+        return entry
+
+    def save(self):
+        '''把更新后的清单写回磁盘'''
+        if not self._persist or not self._dirty:
+            return
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self._filename), exist_ok=True)
+                tmpname = self._filename + '.%d.tmp' % os.getpid()
+                with open(tmpname, 'w') as f:
+                    json.dump(self._entries, f)
+                os.replace(tmpname, self._filename)
+                self._dirty = False
+            except OSError:
+                pass
+
+
+def make_entry(data):
+    '''根据文件的LocalTime(已格式化), CellId, UEGID三列生成清单条目
+
+        Args:
+            data: DataFrame, 列为LocalTime, CellId, UEGID，按文件中的行顺序排列
+        Returns:
+            条目，字典格式，sorted表示LocalTime是否按时间顺序排列，
+            pairs中每项为[CellId, UEGID, 行数, 首次出现时间, 最后出现时间]，时间单位ns
+    '''
+    entry = {'rows': len(data.index), 'first': None, 'last': None, 'tmin': None, 'tmax': None,
+             'sorted': True, 'cellids': [], 'uegids': [], 'pairs': []}
+    if not len(data.index):
+        return entry
+
+    times = data['LocalTime'].values.astype(np.int64)
+    entry['first'], entry['last'] = int(times[0]), int(times[-1])
+    entry['tmin'], entry['tmax'] = int(times.min()), int(times.max())
+    entry['sorted'] = bool((np.diff(times) >= 0).all())
+    entry['cellids'] = data['CellId'].drop_duplicates().tolist()
+    entry['uegids'] = data['UEGID'].drop_duplicates().tolist()
+
+    grouped = data.assign(LocalTime=times).groupby(['CellId', 'UEGID'], sort=False, dropna=False)['LocalTime']
+    pairs = grouped.agg(['size', 'first', 'last']).reset_index()
+    entry['pairs'] = [list(pair) for pair in zip(*[pairs[col].tolist() for col in pairs.columns])]
+    return entry
+
+
+def make_rowindex(data):
+    '''生成按(CellId, UEGID)分组的行索引
+
+        组的顺序与make_entry生成的pairs一致，组内行号升序，
+        第i组的行号为rowindex[sum(rows[:i]):sum(rows[:i+1])]
+        Args:
+            data: DataFrame, 至少包含CellId, UEGID两列，按文件中的行顺序排列
+        Returns:
+            行号数组
+    '''
+    codes = data.groupby(['CellId', 'UEGID'], sort=False, dropna=False).ngroup().values
+    rowindex = np.argsort(codes, kind='stable')
+    return rowindex.astype(np.int32) if len(rowindex) < np.iinfo(np.int32).max else rowindex
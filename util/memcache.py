@@ -0,0 +1,90 @@
+# coding=utf-8
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# 默认内存预算，单位字节
+DEFAULT_BUDGET = 1 << 30
+
+
+def nbytes_of(values):
+    '''列数据实际占用的内存，字符串等对象列包含各对象本身的大小，而不只是指针'''
+    if isinstance(values, np.ndarray) and values.dtype == object:
+        return int(pd.Series(values, copy=False).memory_usage(deep=True, index=False))
+    return int(values.nbytes)
+
+
+class ColumnCache(object):
+    '''进程内共享的列缓存
+
+       以(文件, 列)为键保存整列数据，按LRU策略在内存预算内淘汰，
+       同一Log下的所有NrFile共用一个实例，各自从整列中取出需要的行。
+    '''
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        '''初始化列缓存
+
+           Args:
+               budget: 内存预算，单位字节，0表示不缓存
+        '''
+        self._budget = budget
+        # {键: (列数据, 占用字节数)}
+        self._items = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def get(self, key):
+        '''获取缓存的列，未命中返回None'''
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self._misses = self._misses + 1
+                return None
+            self._items.move_to_end(key)
+            self._hits = self._hits + 1
+            return item[0]
+
+    def put(self, key, values):
+        '''缓存一列数据，超出预算时淘汰最久未使用的列
+
+           缓存的numpy数组设为只读，防止调用者修改后影响其他NrFile；
+           占用按nbytes_of计算，字符串列按各字符串对象的实际大小计入预算
+        '''
+        nbytes = nbytes_of(values)
+        if nbytes > self._budget:
+            return
+        if isinstance(values, np.ndarray):
+            values.setflags(write=False)
+        with self._lock:
+            if key in self._items:
+                self._nbytes = self._nbytes - self._items.pop(key)[1]
+            self._items[key] = (values, nbytes)
+            self._nbytes = self._nbytes + nbytes
+            while self._nbytes > self._budget:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._nbytes = self._nbytes - evicted
+                self._evictions = self._evictions + 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        '''命中、未命中、淘汰次数以及当前占用，Series格式'''
+        with self._lock:
+            return pd.Series({'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions,
+                              'items': len(self._items), 'nbytes': self._nbytes, 'budget': self._budget},
+                             name='column_cache')
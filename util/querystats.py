@@ -0,0 +1,145 @@
+# coding=utf-8
+'''查询统计
+
+   NrFile的每次查询记录一条：总耗时、各阶段耗时(解析、时间转换、读取缓存、过滤、合并、聚合)、
+   读取及保留的行数、解析的文件数及字节数、缓存命中等，并记录发起查询的分析方法，例如DlSchdCell.throuput。
+   记录保存在NrLog共用的QueryLog中(NrLog.stats())，也可以用Profiler收集一段代码中的所有查询：
+       with Profiler('stats.jsonl') as profiler:
+           cell.dl.throuput()
+       profiler.to_frame()
+'''
+import datetime
+import functools
+import json
+import threading
+from collections import deque
+import pandas as pd
+
+_local = threading.local()
+_profilers = []
+_profilers_lock = threading.Lock()
+
+
+def caller():
+    '''当前线程中最外层的分析方法名，没有时返回None'''
+    stack = getattr(_local, 'stack', None)
+    return stack[0] if stack else None
+
+
+def traced(cls):
+    '''类装饰器：记录类中公共方法的调用，期间的查询以"类名.方法名"标记来源'''
+    for name, func in list(vars(cls).items()):
+        if name.startswith('_') or not callable(func) or isinstance(func, (staticmethod, classmethod)):
+            continue
+        setattr(cls, name, _trace(func))
+    return cls
+
+
+def _trace(func):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append('%s.%s' % (type(self).__name__, func.__name__))
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            stack.pop()
+    return wrapper
+
+
+class QueryLog(object):
+    '''查询记录，最多保留maxlen条'''
+
+    def __init__(self, maxlen=10000):
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=maxlen)
+
+    def record(self, entry):
+        '''加入一条查询记录，同时交给当前所有的Profiler'''
+        entry = dict(entry, time=datetime.datetime.now().isoformat(timespec='milliseconds'), caller=caller())
+        with self._lock:
+            self._entries.append(entry)
+        with _profilers_lock:
+            profilers = list(_profilers)
+        for profiler in profilers:
+            profiler.add(entry)
+
+    @property
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def to_frame(self):
+        return to_frame(self.entries)
+
+    def dump(self, filename):
+        dump(self.entries, filename)
+
+
+class Profiler(object):
+    '''上下文管理器，收集期间所有NrLog、NrFile的查询记录
+
+       Args:
+           filename: 退出时以JSON lines格式追加写入的文件，None表示不写文件
+    '''
+
+    def __init__(self, filename=None):
+        self._filename = filename
+        self._lock = threading.Lock()
+        self._entries = []
+
+    def __enter__(self):
+        with _profilers_lock:
+            _profilers.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        with _profilers_lock:
+            _profilers.remove(self)
+        if self._filename:
+            dump(self.entries, self._filename)
+        return False
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    @property
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+    def to_frame(self):
+        return to_frame(self.entries)
+
+    def summary(self):
+        return summary(self.entries)
+
+
+def to_frame(entries):
+    '''查询记录转换为DataFrame，每条记录一行，各阶段耗时为"阶段_s"列'''
+    return pd.DataFrame(entries)
+
+
+def summary(entries):
+    '''按(来源方法, 查询)汇总次数、耗时及读取量，按总耗时降序排列，用于查找热点'''
+    data = to_frame(entries)
+    if data.empty:
+        return data
+    data['caller'] = data['caller'].fillna('-')
+    rlt = data.groupby(['caller', 'query']).sum(numeric_only=True)
+    rlt.insert(0, 'count', data.groupby(['caller', 'query']).size())
+    return rlt.sort_values('seconds', ascending=False)
+
+
+def dump(entries, filename):
+    '''以JSON lines格式追加写入查询记录'''
+    with open(filename, 'a', encoding='utf8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
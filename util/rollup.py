@@ -0,0 +1,210 @@
+# coding=utf-8
+'''标准指标的多粒度预聚合
+
+   每个文件按(时间粒度, CellId, UEGID)分组：数值列保存sum、count、min、max，取值列保存各取值的次数，
+   按100ms、1s、10s、1min四级粒度保存在列式缓存中，随源文件变化一起失效。
+   时间粒度为某一级整数倍的mean/sum/min/max/cnt_of_cols及count_of_values直接由预聚合结果计算，
+   更细的粒度或其他列仍读取原始数据。
+'''
+import numpy as np
+import pandas as pd
+import const
+
+# 预聚合的时间粒度(s)，由细到粗，粗粒度由100ms的结果合并得到
+LEVELS = (0.1, 1, 10, 60)
+
+# 各类型Log预聚合的列：values为数值列，categories为取值列，文件中不存在的列跳过
+COLUMNS = {
+    const.NR_FILE_DLSCHD: {
+        'values': ['SCHD.u32TbSize', 'SCHD.u16RbNum', 'SCHD.u8HarqId', 'AMC.u8SchdMcs'],
+        'categories': ['ACK.u8AckInfo', 'ACK.u8IsHarqFail', 'ACK.u8IsSelfMainTain', 'SCHD_FAIL_RSN.u32UeSchdFailRsn',
+                       'SCHD.u8Layers'],
+    },
+    const.NR_FILE_ULSCHD: {
+        'values': ['TB.u16TbSize', 'GRANT.u16RbNum', 'GRANT.u8HarqId', 'TB.u8Mcs', 'PHR.u16PathLoss',
+                   'PUSCH_SINR.s16SingleRbSINR', 'AMC.s16DeltaMcs', 'AMC.u8StdMcs'],
+        'categories': ['CRCI.u8AckInfo', 'CRCI.u8IsHarqFail', 'SCHD_FAIL_RSN.u32UeSchdFailRsn'],
+    },
+}
+
+STATS = ('sum', 'count', 'min', 'max')
+KEYS = ['bin', 'CellId', 'UEGID']
+DAY_NS = 86400 * 10**9
+
+
+def table_name(level):
+    '''预聚合结果在列式缓存中的表名'''
+    return 'rollup_%dms' % int(round(level * 1000))
+
+
+def columns_of(filetype, header):
+    '''该类型文件中需要预聚合的列，(数值列, 取值列)'''
+    spec = COLUMNS.get(filetype, {})
+    return ([col for col in spec.get('values', []) if col in header],
+            [col for col in spec.get('categories', []) if col in header])
+
+
+def level_of(time_bin):
+    '''能整除time_bin的最粗一级粒度，没有时返回None'''
+    for level in reversed(LEVELS):
+        ratio = time_bin / level
+        if ratio > 1 - 1e-9 and abs(ratio - round(ratio)) < 1e-9:
+            return level
+    return None
+
+
+def _label(col, value):
+    value = float(value)
+    return '%s=%s' % (col, int(value) if value.is_integer() else repr(value))
+
+
+def categories_of(table, col):
+    '''表中某取值列的{取值: 表列名}，取值升序'''
+    prefix = col + '='
+    rlt = {float(name[len(prefix):]): name for name in table.columns if name.startswith(prefix)}
+    return dict(sorted(rlt.items()))
+
+
+def build(data, filetype):
+    '''计算一个文件各级粒度的预聚合结果
+
+        Args:
+            data: DataFrame，包含已转换的LocalTime、CellId、UEGID以及需要预聚合的列
+            filetype: Log类型
+        Returns:
+            {粒度: DataFrame}，列为bin(绝对时间//粒度)、CellId、UEGID、rows(行数)、
+            "列名|统计量"以及"列名=取值"
+    '''
+    values, categories = columns_of(filetype, data.columns)
+    times = data['LocalTime'].values.astype('datetime64[ns]')
+    valid = ~np.isnat(times)
+    data = data[valid]
+    keys = [times[valid].astype(np.int64) // int(round(LEVELS[0] * 1e9)), data['CellId'].values, data['UEGID'].values]
+
+    parts = [data.groupby(keys, dropna=False).size().rename('rows')]
+    if values:
+        grouped = data[values].groupby(keys, dropna=False)
+        for stat in STATS:
+            part = grouped.agg(stat)
+            part.columns = ['%s|%s' % (col, stat) for col in values]
+            parts.append(part)
+    for col in categories:
+        part = data[col].groupby(keys, dropna=False).value_counts().unstack()
+        part.columns = [_label(col, value) for value in part.columns]
+        parts.append(part)
+    table = pd.concat(parts, axis=1)
+    counts = [name for name in table.columns if '=' in name]
+    table[counts] = table[counts].fillna(0)
+    table.index.names = KEYS
+    table = table.reset_index().astype(np.float64)
+
+    tables = {LEVELS[0]: table}
+    for level in LEVELS[1:]:
+        tables[level] = _coarsen(table, int(round(level / LEVELS[0])))
+    return tables
+
+
+def _coarsen(table, factor):
+    '''把细粒度的预聚合结果合并为factor倍的粒度'''
+    table = table.copy()
+    table['bin'] = table['bin'] // factor
+    how = {}
+    for name in table.columns[len(KEYS):]:
+        how[name] = name.rpartition('|')[2] if name.endswith(('|min', '|max')) else 'sum'
+    return table.groupby(KEYS, dropna=False, sort=True).agg(how).reset_index()
+
+
+def select(tables, id_filter):
+    '''合并各文件的预聚合结果并按id_filter选择分组，各文件中缺少的取值计为0'''
+    table = pd.concat(tables, ignore_index=True)
+    counts = [name for name in table.columns if '=' in name]
+    table[counts] = table[counts].fillna(0)
+    for col, vals in (id_filter or {}).items():
+        table = table[table[col].isin(vals)]
+    return table
+
+
+def _bins(table, level, time_bin):
+    '''与aggregate.time_bins一致的时间粒度：返回各分组的粒度编号及时间索引'''
+    level_ns, bin_ns = int(round(level * 1e9)), int(round(time_bin * 1e9))
+    start = table['bin'].values.astype(np.int64) * level_ns
+    origin = start.min() // DAY_NS * DAY_NS
+    codes = (start - origin) // bin_ns
+    first = codes.min()
+    index = pd.date_range(pd.Timestamp(origin + first * bin_ns), periods=codes.max() - first + 1,
+                          freq=pd.Timedelta(bin_ns, unit='ns'), name='LocalTime')
+    return codes - first, index
+
+
+def _aggregate(table, names, how, codes, index):
+    '''按时间粒度编号聚合表中的列，结果按完整的时间索引排列'''
+    rlt = table[names].groupby(codes).agg(how)
+    rlt = rlt.reindex(np.arange(len(index)))
+    rlt.index = index
+    return rlt
+
+
+def resample(table, level, time_bin, how, cols, int_cols, counted=None):
+    '''由预聚合结果计算与NrFile._resample_of_cols一致的结果
+
+        Args:
+            table: select得到的预聚合结果
+            level: 预聚合粒度
+            time_bin: 时间粒度(s)，为level的整数倍
+            how: 'mean', 'sum', 'min', 'max', 'count'
+            cols: 列名列表
+            int_cols: 原始数据中为int64的列
+            counted: how为'count'时，{列名: 计入的取值}，由取值次数统计，取值为None表示全部取值
+        Returns:
+            DataFrame，行为时间粒度，列为cols，没有数据时返回None
+    '''
+    if counted:
+        counts = pd.DataFrame(index=table.index)
+        for col in cols:
+            categories = categories_of(table, col)
+            vals = counted[col]
+            names = [name for value, name in categories.items() if vals is None or value in vals]
+            counts[col] = table[names].sum(axis=1)
+        if any(vals is not None for vals in counted.values()):
+            # 有取值条件时只有满足条件的行参与计算
+            selected = (counts > 0).any(axis=1).values
+            table, counts = table[selected], counts[selected]
+        if table.empty:
+            return None
+        codes, index = _bins(table, level, time_bin)
+        return _aggregate(counts, cols, 'sum', codes, index).fillna(0).astype(np.int64)
+
+    if table.empty:
+        return None
+    codes, index = _bins(table, level, time_bin)
+    if how == 'mean':
+        sums = _aggregate(table, ['%s|sum' % col for col in cols], 'sum', codes, index).fillna(0)
+        counts = _aggregate(table, ['%s|count' % col for col in cols], 'sum', codes, index).fillna(0)
+        rlt = pd.DataFrame(sums.values / np.where(counts.values > 0, counts.values, np.nan), index=index,
+                           columns=cols)
+        return rlt
+    stat = 'sum' if how == 'count' else how
+    rlt = _aggregate(table, ['%s|%s' % (col, how) for col in cols], stat, codes, index)
+    rlt.columns = cols
+    if how in ('sum', 'count'):
+        rlt = rlt.fillna(0)
+    for col in cols:
+        if how == 'count' or (col in int_cols and not rlt[col].isna().any()):
+            rlt[col] = rlt[col].astype(np.int64)
+    return rlt
+
+
+def count_of_values(table, level, time_bin, col, integral):
+    '''由预聚合结果计算与NrFile.count_of_values一致的结果，没有数据时返回None
+
+        Args:
+            integral: 原始数据中该列是否为int64，决定结果列标签的类型
+    '''
+    if table.empty:
+        return None
+    categories = categories_of(table, col)
+    codes, index = _bins(table, level, time_bin)
+    rlt = _aggregate(table, list(categories.values()), 'sum', codes, index).fillna(0).astype(np.int64)
+    rlt.columns = np.array(list(categories), dtype=np.int64 if integral else np.float64)
+    rlt = rlt.loc[:, rlt.sum() > 0]
+    return rlt
@@ -0,0 +1,88 @@
+# coding=utf-8
+import re
+import numpy as np
+import pandas as pd
+
+# 字段名中表示位宽的前缀，例如SCHD.u8Layers, AMC.s16InnerSinr
+_PREFIX = re.compile(r'(?:^|\.)([us])(8|16|32)[A-Z]')
+
+# 不带前缀的标识列
+ID_DTYPES = {'CellId': np.dtype(np.uint16), 'UEGID': np.dtype(np.uint16)}
+
+
+def dtype_of(col):
+    '''根据字段名推断最窄的numpy整数类型
+
+        Args:
+            col: 列名，例如'SCHD.u16RbNum'
+        Returns:
+            numpy dtype，无法推断时返回None
+    '''
+    if col in ID_DTYPES:
+        return ID_DTYPES[col]
+    match = _PREFIX.search(col)
+    if match is None:
+        return None
+    return np.dtype(('uint' if match.group(1) == 'u' else 'int') + match.group(2))
+
+
+def compact(values, col):
+    '''把按默认类型解析的一列转换为紧凑格式
+
+        没有空值时为最窄的numpy整数数组，有空值时为pandas可空整数数组(数值+掩码)；
+        列名无法推断类型、取值超出范围或不是整数时保持原样
+        Args:
+            values: numpy数组
+            col: 列名
+        Returns:
+            紧凑格式的数组
+    '''
+    dtype = dtype_of(col)
+    values = np.asarray(values)
+    if dtype is None or not len(values) or values.dtype.kind not in 'iuf':
+        return values
+    na = np.isnan(values) if values.dtype.kind == 'f' else None
+    if na is not None and not na.any():
+        # 没有空值的浮点列，原始数据不是整数格式
+        return values
+    data = values if na is None else np.where(na, 0, values)
+    if na is not None and (data != np.round(data)).any():
+        return values
+    info = np.iinfo(dtype)
+    if data.min() < info.min or data.max() > info.max:
+        return values
+    data = data.astype(dtype)
+    return pd.arrays.IntegerArray(data, na) if na is not None else data
+
+
+def expand(values):
+    '''把紧凑格式还原为pd.read_csv(na_values='-')的默认类型
+
+        可空整数数组对应整列含有空值，还原为float64；numpy整数数组还原为int64，
+        按行读取的部分数据与整列的类型保持一致
+    '''
+    if isinstance(values, pd.api.extensions.ExtensionArray):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    if values.dtype.kind in 'iu' and values.dtype != np.int64:
+        return values.astype(np.int64)
+    return values
+
+
+def compact_frame(data):
+    '''把DataFrame中可以推断类型的列逐列转换为紧凑格式，在解析后立即调用
+
+        pandas直接按可空整数类型解析字符串比默认解析慢一个数量级，
+        因此先按默认类型解析，再逐列转换，转换失败的列保持原样
+    '''
+    for col in data.columns:
+        if dtype_of(col) is not None:
+            data[col] = compact(data[col].values, col)
+    return data
+
+
+def expand_frame(data):
+    '''把DataFrame中的紧凑格式列还原为默认类型'''
+    for col in data.columns:
+        if isinstance(data[col].values, pd.api.extensions.ExtensionArray) or data[col].dtype.kind in 'iu':
+            data[col] = expand(data[col].values)
+    return data
@@ -0,0 +1,192 @@
+# coding=utf-8
+'''Log的SQL查询
+
+   每类Log作为一张表，表名为文件类型，例如CMAC_dlUeTtiInfo，保存在进程内的sqlite3数据库中，
+   LocalTime、CellId、UEGID建有索引，过滤、分组、连接均由sqlite完成，不需要在pandas中展开全部数据。
+   表中只加载查询中出现的列，之后的查询用到其他列时重新加载该表；Log加入新文件后同样重新加载。
+   列名中含有'.'，需要加双引号，例如：
+       SELECT UEGID, COUNT(*) AS cnt FROM CMAC_ulUeTtiInfo
+       WHERE "PUSCH_SINR.s16SingleRbSINR" < -5 AND "TB.u8Mcs" > 20 GROUP BY UEGID
+   LocalTime保存为'yyyy-mm-dd hh:mm:ss.fff'格式的字符串，可以直接按字符串比较时间范围。
+
+   加载一张表需要把选中的行全部读入内存再写入sqlite，代价与行数×列数成正比。只查询一张表且WHERE中
+   只有AND连接的条件时，CellId、UEGID的=/IN条件以及LocalTime与字符串常量的比较、BETWEEN条件在加载前
+   用于选择文件和行(与Log的id_filter、time_interval相同)，只加载匹配的行，其余条件仍由sqlite计算；
+   没有这类条件的SELECT *在行数超过MAX_STAR_ROWS时拒绝执行，需要加上条件或只查询用到的列。
+'''
+import re
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+
+# 建索引的列
+INDEXED = ['LocalTime', 'CellId', 'UEGID']
+
+# 查询全部列的写法，例如SELECT *、SELECT t.*
+_STAR = re.compile(r'(select|,)\s*(distinct\s+)?(\w+\.)?\*', re.I)
+
+# 没有可下推的条件时SELECT *允许加载的最大行数
+MAX_STAR_ROWS = 5000000
+
+# 可下推的条件
+_WHERE = re.compile(r'\bwhere\b(.*?)(?:\bgroup\s+by\b|\border\s+by\b|\blimit\b|\bhaving\b|\bwindow\b|$)',
+                    re.I | re.S)
+_COL = r'(?:\w+\.)?"?%s"?'
+_IDS = re.compile(r'%s\s*(?:==?\s*(-?\d+)|in\s*\(\s*(-?\d+(?:\s*,\s*-?\d+)*)\s*\))' % (_COL % r'(CellId|UEGID)'),
+                  re.I)
+_TIME = re.compile(r"%s\s*(>=|>|<=|<|==?)\s*'([^']*)'" % (_COL % 'LocalTime'), re.I)
+_BETWEEN = re.compile(r"%s\s+between\s+'([^']*)'\s+and\s+'([^']*)'" % (_COL % 'LocalTime'), re.I)
+# 只下推含完整日期的时间，只有时分秒的字符串交给sqlite按字符串比较
+_DATE = re.compile(r'\s*\d{4}-\d{1,2}-\d{1,2}')
+
+
+def _timestamp(text):
+    if not _DATE.match(text):
+        return None
+    try:
+        return pd.Timestamp(text)
+    except ValueError:
+        return None
+
+
+def pushdown(query):
+    '''提取可以在加载前用于选择行的条件
+
+        只处理只有一个SELECT、没有JOIN且FROM中只有一张表、WHERE中只有AND连接的查询，
+        这时每个条件都必须满足，按条件加载的行是结果所需行的超集
+        Returns:
+            (id_filter, time_interval)，没有对应的条件时为None
+    '''
+    if len(re.findall(r'\bselect\b', query, re.I)) != 1 or re.search(r'\b(join|union)\b', query, re.I):
+        return None, None
+    where = _WHERE.search(query)
+    if where is None or re.search(r'\b(or|not|case)\b', where.group(1), re.I):
+        return None, None
+    source = re.search(r'\bfrom\b(.*?)\bwhere\b', query, re.I | re.S)
+    if source is None or ',' in source.group(1):
+        return None, None
+
+    id_filter, bounds = {}, [None, None]
+
+    def narrow(start, end):
+        if start is not None and (bounds[0] is None or start > bounds[0]):
+            bounds[0] = start
+        if end is not None and (bounds[1] is None or end < bounds[1]):
+            bounds[1] = end
+
+    text = where.group(1)
+    for start, end in _BETWEEN.findall(text):
+        narrow(_timestamp(start), _timestamp(end))
+    for term in re.split(r'\band\b', _BETWEEN.sub('', text), flags=re.I):
+        term = term.strip()
+        while term.startswith('(') and term.endswith(')'):
+            term = term[1:-1].strip()
+        matched = _IDS.fullmatch(term)
+        if matched:
+            col = next(name for name in ('CellId', 'UEGID') if name.lower() == matched.group(1).lower())
+            vals = [int(val) for val in (matched.group(2) or matched.group(3)).split(',')]
+            id_filter[col] = [val for val in id_filter.get(col, vals) if val in vals]
+            continue
+        matched = _TIME.fullmatch(term)
+        if matched:
+            op, value = matched.group(1), _timestamp(matched.group(2))
+            narrow(value if op[0] in '>=' else None, value if op[0] in '<=' else None)
+    interval = None
+    if bounds[0] is not None or bounds[1] is not None:
+        interval = [bounds[0] if bounds[0] is not None else pd.Timestamp.min,
+                    bounds[1] if bounds[1] is not None else pd.Timestamp.max]
+    return id_filter or None, interval
+
+
+class SqlStore(object):
+    '''Log的sqlite3数据库，按查询用到的表和列加载数据'''
+
+    def __init__(self, logfile_of, filetypes):
+        '''初始化数据库
+
+           Args:
+               logfile_of: 按类型获取Log文件实例(NrFile)的函数，没有该类型的Log时返回None
+               filetypes: 所有文件类型，即所有表名
+        '''
+        self._logfile_of = logfile_of
+        self._filetypes = filetypes
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._lock = threading.Lock()
+        # 已加载的表，{类型: (文件名, 列名, 选择条件)}，选择条件为None表示全部行
+        self._tables = {}
+
+    @property
+    def tables(self):
+        '''已加载的表及其中的列'''
+        return {filetype: list(cols) for filetype, (_, cols, _) in self._tables.items()}
+
+    def _referenced(self, query):
+        '''查询中用到的表，以及每张表需要加载的列：出现在查询中的列以及建索引的列'''
+        star = _STAR.search(query) is not None
+        rlt = {}
+        for filetype in self._filetypes:
+            if not re.search(r'\b%s\b' % re.escape(filetype), query, re.I):
+                continue
+            logfile = self._logfile_of(filetype)
+            if logfile is None:
+                continue
+            header = logfile.header
+            rlt[filetype] = (logfile, header if star else [col for col in header if col in INDEXED or
+                                                            re.search(r'\b%s\b' % re.escape(col), query, re.I)])
+        return rlt
+
+    def _load(self, filetype, logfile, cols, id_filter=None, time_interval=None):
+        '''加载一张表，表中已有需要的列和行且文件没有变化时跳过
+
+            Args:
+                id_filter, time_interval: 由查询条件得到的行选择，见pushdown
+        '''
+        files = tuple(logfile.files)
+        selection = None
+        if id_filter or time_interval is not None:
+            selection = (tuple(sorted((col, tuple(vals)) for col, vals in (id_filter or {}).items())),
+                         tuple(time_interval) if time_interval is not None else None)
+        loaded = self._tables.get(filetype)
+        if loaded is not None and loaded[0] == files and loaded[2] in (None, selection):
+            if set(cols) <= set(loaded[1]):
+                return
+            # 保留已加载的列，避免交替查询不同列时反复加载
+            cols = [col for col in logfile.header if col in set(cols) | set(loaded[1])]
+
+        if selection is not None:
+            logfile = logfile.select(id_filter, time_interval)
+        elif len(cols) == len(logfile.header) and logfile.lines > MAX_STAR_ROWS:
+            raise ValueError('%s共%d行，查询全部列时需要CellId、UEGID或LocalTime条件，或者只查询用到的列'
+                             % (filetype, logfile.lines))
+        data = logfile.get_data_of_cols(cols, format_time='LocalTime' in cols)
+        if 'LocalTime' in cols:
+            times = data['LocalTime'].values.astype('datetime64[ms]')
+            text = np.char.replace(np.datetime_as_string(times, unit='ms'), 'T', ' ').astype(object)
+            text[np.isnat(times)] = None
+            data['LocalTime'] = text
+        data.to_sql(filetype, self._conn, if_exists='replace', index=False)
+        for col in INDEXED:
+            if col in cols:
+                self._conn.execute('CREATE INDEX "%s_%s" ON "%s" ("%s")' % (filetype, col, filetype, col))
+        self._conn.commit()
+        self._tables[filetype] = (files, cols, selection)
+
+    def query(self, query, params=None):
+        '''执行SQL查询
+
+            Args:
+                query: SQL语句
+                params: 查询参数，对应语句中的?占位符
+            Returns:
+                DataFrame，名为LocalTime的结果列转换为datetime64
+        '''
+        with self._lock:
+            referenced = self._referenced(query)
+            id_filter, time_interval = pushdown(query) if len(referenced) == 1 else (None, None)
+            for filetype, (logfile, cols) in referenced.items():
+                self._load(filetype, logfile, cols, id_filter, time_interval)
+            rlt = pd.read_sql_query(query, self._conn, params=params)
+        if 'LocalTime' in rlt.columns and rlt['LocalTime'].dtype == object:
+            rlt['LocalTime'] = pd.to_datetime(rlt['LocalTime'])
+        return rlt